@@ -50,6 +50,7 @@ export const NewClaimWizard: React.FC = () => {
   const [daysToExpiry, setDaysToExpiry] = useState<number | null>(null);
   const [aiResult, setAiResult] = useState<any>(null);
   const [claimId, setClaimId] = useState<any>(null);
+  const [progress, setProgress] = useState<string[]>([]);
   const [insurers, setInsurers] = useState<string[]>([]);
 
   useEffect(() => {
@@ -186,13 +187,34 @@ export const NewClaimWizard: React.FC = () => {
         payload.append("files", p.file);
       });
 
-      // 2. Call Unified Process Endpoint
-      const result = await api.claims.process(payload);
+      // 2. Submit (returns immediately), then follow the pipeline's progress events
+      const submitted = await api.claims.submit(payload);
+      setProgress([`Claim #${submitted.claim_id} submitted`]);
+      let result: any = null;
+      let failure: string | null = null;
+      await api.claims.events(submitted.claim_id, (event, data) => {
+        if (event === "stage") {
+          setProgress((prev) => [...prev, stageLabel(data)]);
+        } else if (event === "done") {
+          result = data;
+        } else if (event === "failed") {
+          failure = data.error || "Processing failed";
+        } else if (event === "status" && data.status === "failed") {
+          // Claim not tracked by this server: only its stored state is known
+          failure = "Processing failed";
+        }
+      });
+      if (failure) throw new Error(failure);
+      if (!result) {
+        // Progress is not available here (e.g. handled by another server); show the claim page
+        navigate(`/dashboard/claims/${submitted.claim_id}`);
+        return;
+      }
 
       // Redirect using returned claim_id
       // navigate(`/dashboard/claims/${(result as any).claim_id}`);
-      setClaimId((result as any).claim_id);
-      setAiResult((result as any).ml_result);
+      setClaimId(submitted.claim_id);
+      setAiResult(result.ml_result);
     } catch (e) {
       console.error(e);
       alert("Error submitting claim");
@@ -201,6 +223,26 @@ export const NewClaimWizard: React.FC = () => {
     }
   };
 
+  const stageLabel = (data: any) => {
+    const failed = data.status !== "ok" ? ` (${data.status})` : "";
+    switch (data.stage) {
+      case "image":
+        return `Images analysed${failed}`;
+      case "keywords":
+        return `Description analysed${failed}`;
+      case "retrieval":
+        return `${data.clauses ?? 0} policy clauses retrieved${failed}`;
+      case "decision":
+        return `Decision: ${data.final_decision ?? "pending"}${failed}`;
+      case "explanation":
+        return `Explanation generated${failed}`;
+      case "survey":
+        return `Survey risk scored${failed}`;
+      default:
+        return `${data.stage}${failed}`;
+    }
+  };
+
   const Steps = () => (
     <div className="flex items-center justify-center mb-8">
       {[1, 2, 3, 4, 5].map((s) => (
@@ -587,7 +629,7 @@ export const NewClaimWizard: React.FC = () => {
                   <div>
                     <p className="font-semibold">AI Pre-Analysis Ready</p>
                     <p>
-                      Submitting will trigger our ML Damage Estimator and RAG Policy Checker. This may take 3-5 seconds.
+                      Submitting will trigger our ML Damage Estimator and RAG Policy Checker. Progress is shown below while the claim is processed.
                     </p>
                   </div>
                 </div>
@@ -600,6 +642,14 @@ export const NewClaimWizard: React.FC = () => {
                     Submit Claim
                   </Button>
                 </div>
+
+                {isSubmitting && progress.length > 0 && (
+                  <ul className="text-sm text-slate-600 space-y-1">
+                    {progress.map((p, i) => (
+                      <li key={i}>✓ {p}</li>
+                    ))}
+                  </ul>
+                )}
               </>
             ) : (
               // AI Result View
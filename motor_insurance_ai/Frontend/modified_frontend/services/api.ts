@@ -114,6 +114,53 @@ export const api = {
             return handleResponse(res);
         },
 
+        // Returns 202 with { claim_id, status_url, events_url } as soon as the claim is saved
+        submit: async (formData: FormData) => {
+            const res = await fetch(`${API_BASE}/claim/submit`, {
+                method: "POST",
+                headers: { "Authorization": getHeaders()["Authorization"] }, // No Content-Type for FormData
+                body: formData,
+            });
+            return handleResponse<{ claim_id: number; status_url: string; events_url: string }>(res);
+        },
+
+        status: async (id: string | number) => {
+            const res = await fetch(`${API_BASE}/claims/${id}/status`, { headers: getHeaders() });
+            return handleResponse<any>(res);
+        },
+
+        // Reads the server-sent progress events of a submitted claim until "done" / "failed".
+        // fetch is used instead of EventSource because the stream needs the Authorization header.
+        events: async (id: string | number, onEvent: (event: string, data: any) => void) => {
+            const res = await fetch(`${API_BASE}/claims/${id}/events`, {
+                headers: { "Authorization": getHeaders()["Authorization"] },
+            });
+            if (!res.ok || !res.body) {
+                await handleResponse(res);
+                return;
+            }
+            const reader = res.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = "";
+            while (true) {
+                const { done, value } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                let sep;
+                while ((sep = buffer.indexOf("\n\n")) >= 0) {
+                    const block = buffer.slice(0, sep);
+                    buffer = buffer.slice(sep + 2);
+                    let event = "message";
+                    let data = "";
+                    for (const line of block.split("\n")) {
+                        if (line.startsWith("event: ")) event = line.slice(7);
+                        else if (line.startsWith("data: ")) data += line.slice(6);
+                    }
+                    if (data) onEvent(event, JSON.parse(data));
+                }
+            }
+        },
+
         delete: async (id: string) => {
             const res = await fetch(`${API_BASE}/claims/${id}`, {
                 method: "DELETE",
@@ -0,0 +1,502 @@
+"""
+Bulk claim ingestion for partner backlog files.
+
+Streams a JSONL or CSV file of claims (with image references) and processes it
+in chunks. Within a chunk, model work is batched across its claims:
+
+- one predict_survey_batch call for the surveys that have no prediction yet,
+- one batched image inference pass (run_image_inference_many),
+- one batched embedding call for the retrieval queries.
+
+If the batched image pass fails, the chunk is not committed. A chunk that found
+the ML executor saturated is retried after BULK_BUSY_BACKOFF seconds; any other
+image failure stops the run, which resumes at that chunk when started again.
+LLM calls (--llm) run at most BULK_LLM_CONCURRENCY at a time.
+
+Each chunk is written with bulk inserts in one transaction that also advances
+the run's checkpoint (bulk_ingest_runs). An interrupted or failed run picks up
+after its last committed chunk when started again with the same run id. Once a
+chunk is committed, one report line per row (row, status, claim_id or error) is
+appended to the run's JSONL report.
+
+    python bulk_ingest.py claims.jsonl --run nightly-2026-10-17 [--images-dir DIR]
+        [--chunk-size 64] [--report claims.report.jsonl] [--llm] [--user-id N]
+
+POST /bulk/claims runs the same code on an uploaded file.
+
+Row fields: description, company, policy_type, survey_result (an object, or
+JSON text in CSV), images (a list, or ';'-separated in CSV; relative to the
+image directory) and an optional external_id echoed in the report. Keyword
+extraction and explanations use the LLM and are off unless --llm is given.
+"""
+import os
+import re
+import csv
+import json
+import logging
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from claim_processor import sanitize_for_json, _combine_clauses, _survey_model_input, _decision_fallback
+from claim_stages import StageRunner
+from decision_engine import final_decision
+from db import models
+from db.database import SessionLocal, init_db
+from llm import keyword_extractor
+from llm.explanation_gen import generate_explanation
+from ml.executor import call_ml, InferenceQueueTimeout
+from ml.image_model import run_image_inference_many, quality_gate, no_usable_images_result
+from ml.Claim_model.predict import predict_survey_batch
+from rag import retrieve
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BULK_CHUNK_SIZE = int(os.environ.get("BULK_CHUNK_SIZE", "64"))
+# Uploaded files and their reports (POST /bulk/claims)
+BULK_DIR = os.environ.get("BULK_DIR", os.path.join(BASE_DIR, "bulk"))
+# Image references of uploaded files must resolve inside this directory
+BULK_IMAGE_ROOT = os.environ.get("BULK_IMAGE_ROOT")
+# Runs executed at once by the API process
+BULK_MAX_RUNS = int(os.environ.get("BULK_MAX_RUNS", "1"))
+# Keyword / explanation LLM calls in flight at once (shared by all runs of this process)
+BULK_LLM_CONCURRENCY = int(os.environ.get("BULK_LLM_CONCURRENCY", "4"))
+# A chunk whose image pass found the ML executor saturated is retried this often, this many seconds apart
+BULK_BUSY_RETRIES = int(os.environ.get("BULK_BUSY_RETRIES", "5"))
+BULK_BUSY_BACKOFF = float(os.environ.get("BULK_BUSY_BACKOFF", "15"))
+
+REQUIRED_FIELDS = ("description", "company", "policy_type")
+RUN_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+_pool = ThreadPoolExecutor(max_workers=BULK_MAX_RUNS, thread_name_prefix="bulk-ingest")
+_llm_pool = ThreadPoolExecutor(max_workers=BULK_LLM_CONCURRENCY, thread_name_prefix="bulk-llm")
+_active_lock = threading.Lock()
+_active = set()
+
+
+class BulkRowError(ValueError):
+    """A row that cannot be ingested; it is reported and the run continues."""
+
+
+def detect_format(filename: str) -> str:
+    ext = os.path.splitext(filename or "")[1].lower()
+    if ext == ".csv":
+        return "csv"
+    if ext in (".jsonl", ".ndjson", ".json"):
+        return "jsonl"
+    raise ValueError("Bulk files must be .jsonl, .ndjson or .csv")
+
+
+def read_rows(path: str, fmt: str = None) -> Iterator[Tuple[int, Any]]:
+    """Yields (row number from 1, record) without loading the file; unparsable lines yield a BulkRowError."""
+    fmt = fmt or detect_format(path)
+    with open(path, newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            yield from enumerate(csv.DictReader(f), 1)
+            return
+        n = 0
+        for line in f:
+            if not line.strip():
+                continue
+            n += 1
+            try:
+                yield n, json.loads(line)
+            except ValueError as e:
+                yield n, BulkRowError(f"invalid JSON: {e}")
+
+
+def resolve_images(refs: List[Any], images_dir: Optional[str], confine: bool) -> List[str]:
+    root = os.path.realpath(images_dir) if images_dir else None
+    paths = []
+    for ref in refs:
+        if not isinstance(ref, str):
+            raise BulkRowError("image references must be strings")
+        path = os.path.realpath(os.path.join(root, ref) if root else ref)
+        if confine and (root is None or os.path.commonpath([root, path]) != root):
+            raise BulkRowError(f"image '{ref}' is outside the bulk image directory")
+        if not os.path.isfile(path):
+            raise BulkRowError(f"image '{ref}' not found")
+        paths.append(path)
+    return paths
+
+
+def parse_row(record: Any, images_dir: str = None, confine: bool = False, company: str = None) -> Dict[str, Any]:
+    """Validates one input record. `company` restricts rows to the submitting insurer's own claims."""
+    if isinstance(record, Exception):
+        raise record
+    if not isinstance(record, dict):
+        raise BulkRowError("row is not an object")
+    missing = [f for f in REQUIRED_FIELDS if not str(record.get(f) or "").strip()]
+    if missing:
+        raise BulkRowError(f"missing fields: {', '.join(missing)}")
+    if company and record["company"] != company:
+        raise BulkRowError(f"company '{record['company']}' does not match the submitting account")
+
+    survey = record.get("survey_result") or {}
+    if isinstance(survey, str):
+        try:
+            survey = json.loads(survey)
+        except ValueError:
+            raise BulkRowError("survey_result must be valid JSON")
+    if not isinstance(survey, dict):
+        raise BulkRowError("survey_result must be an object")
+
+    refs = record.get("images") or []
+    if isinstance(refs, str):
+        refs = [r.strip() for r in refs.split(";") if r.strip()]
+
+    return {
+        "description": str(record["description"]),
+        "company": str(record["company"]),
+        "policy_type": str(record["policy_type"]),
+        "survey_result": survey,
+        "images": resolve_images(refs, images_dir, confine),
+        "external_id": record.get("external_id"),
+    }
+
+
+def process_chunk(items: List[Dict[str, Any]], use_llm: bool = False) -> List[Dict[str, Any]]:
+    """
+    Runs the claim pipeline of process_claim on parsed rows, batching model calls
+    across them. Returns one outcome per item, in order; an outcome has "error"
+    set if that row could not be processed. A failed image pass raises: deciding
+    the chunk without its photos would be wrong.
+    """
+    for item in items:
+        _, item["image_quality"] = quality_gate(item["images"]) if item["images"] else ([], [])
+        item["usable"] = [p for p, q in zip(item["images"], item["image_quality"]) if q.get("passed")]
+
+    stages = StageRunner()
+
+    survey_inputs = [_survey_model_input(item["survey_result"]) for item in items]
+    survey_rows = [i for i, s in enumerate(survey_inputs) if s is not None]
+    if survey_rows:
+        stages.submit("bulk_survey", call_ml, predict_survey_batch, [survey_inputs[i] for i in survey_rows],
+                      fallback=lambda e: [{"error": str(e)}] * len(survey_rows))
+
+    image_rows = [i for i, item in enumerate(items) if item["usable"]]
+    if image_rows:
+        stages.submit("bulk_images", call_ml, run_image_inference_many, [items[i]["usable"] for i in image_rows],
+                      propagate=(Exception,))
+
+    # Keywords (LLM, per claim) run alongside the batched model calls
+    keyword_runners = []
+    for item in items:
+        runner = None
+        if use_llm:
+            runner = _llm_runner()
+            runner.submit("keywords", keyword_extractor.extract_keywords, item["description"], fallback=lambda e: {})
+        keyword_runners.append(runner)
+
+    queries = []
+    for item, runner in zip(items, keyword_runners):
+        kw = runner.result("keywords") if runner else {}
+        item["keywords"] = kw if isinstance(kw, dict) else {}
+        words = " ".join(item["keywords"].get("keywords", []))
+        queries.append(" ".join(filter(None, [item["description"], words])) or item["description"])
+
+    # Without batched embeddings every row embeds its own query
+    query_vecs = stages.run("bulk_embeddings", retrieve.encode_queries, queries,
+                            fallback=lambda e: [None] * len(queries))
+
+    image_results = {}
+    if image_rows:
+        image_results = dict(zip(image_rows, stages.result("bulk_images")))
+    survey_preds = {}
+    if survey_rows:
+        survey_preds = dict(zip(survey_rows, stages.result("bulk_survey")))
+
+    outcomes = []
+    explanation_runners = []
+    for i, item in enumerate(items):
+        try:
+            if i in image_results:
+                image_result = image_results[i]
+                image_result["quality"] = item["image_quality"]
+            elif item["images"]:
+                image_result = no_usable_images_result(item["image_quality"])
+            else:
+                image_result = {}
+
+            try:
+                primary, secondary = retrieve.get_reason_aware_clauses(
+                    queries[i], item["company"], item["policy_type"], query_vec=query_vecs[i])
+            except Exception as e:
+                logger.warning(f"Bulk row {item['row']}: retrieval failed: {e}")
+                primary, secondary = [], []
+
+            try:
+                decision = final_decision(item["survey_result"], image_result)
+            except Exception as e:
+                decision = _decision_fallback(e)
+
+            # Survey prediction is only stored with the claim, as in process_claim
+            survey_result = dict(item["survey_result"])
+            if isinstance(survey_preds.get(i), dict):
+                survey_result.update(survey_preds[i])
+
+            selected_clauses = _combine_clauses(primary, secondary)[:5]
+            runner = None
+            if use_llm:
+                runner = _llm_runner()
+                runner.submit("explanation", generate_explanation,
+                              company=item["company"], policy_type=item["policy_type"],
+                              reasons=decision.get("reason", []), clauses=selected_clauses,
+                              image_findings=image_result,
+                              fallback=lambda e: "Detailed explanation unavailable due to LLM service error.")
+            explanation_runners.append(runner)
+            outcomes.append(dict(item, survey_result=survey_result, image_result=image_result,
+                                 decision=decision, clauses=selected_clauses, explanation=None, error=None))
+        except Exception as e:
+            logger.error(f"Bulk row {item['row']} failed: {e}")
+            explanation_runners.append(None)
+            outcomes.append(dict(item, error=str(e)))
+
+    for outcome, runner in zip(outcomes, explanation_runners):
+        if runner:
+            outcome["explanation"] = runner.result("explanation")
+    return outcomes
+
+
+def _llm_runner() -> StageRunner:
+    # Bounded pool, and timeouts that only start once a call runs, so queued rows do not time out
+    return StageRunner(pool=_llm_pool, timeout_from_start=True)
+
+
+def _process_chunk_retrying(items: List[Dict[str, Any]], use_llm: bool) -> List[Dict[str, Any]]:
+    """process_chunk, retried with backoff while the ML executor is saturated."""
+    for attempt in range(1, BULK_BUSY_RETRIES + 2):
+        try:
+            return process_chunk(items, use_llm)
+        except InferenceQueueTimeout as e:
+            if attempt > BULK_BUSY_RETRIES:
+                raise
+            logger.warning(f"Bulk chunk from row {items[0]['row']}: ML executor busy, retrying in "
+                           f"{BULK_BUSY_BACKOFF:.0f}s: {e}")
+            time.sleep(BULK_BUSY_BACKOFF)
+
+
+def persist_chunk(db: Session, run: models.BulkIngestRun, outcomes: List[Dict[str, Any]],
+                  user_id: Optional[int], last_row: int, errors: int) -> List[int]:
+    """
+    Bulk inserts the claims of a chunk with their survey, image and explanation
+    rows and advances the run checkpoint, all in one transaction. Returns the
+    new claim ids in the order of `outcomes`.
+    """
+    claim_ids = []
+    if outcomes:
+        now = datetime.now(timezone.utc)
+        claim_ids = list(db.scalars(
+            insert(models.Claim).returning(models.Claim.id, sort_by_parameter_order=True),
+            [{
+                "user_id": user_id,
+                "company": o["company"],
+                "policy_type": o["policy_type"],
+                "description": o["description"],
+                "final_decision": o["decision"].get("final_decision"),
+                "risk_level": o["decision"].get("risk_level"),
+                "created_at": now,
+            } for o in outcomes],
+        ))
+
+        db.execute(insert(models.ClaimSurvey), [{
+            "claim_id": claim_id,
+            "survey_payload": sanitize_for_json(o["survey_result"]),
+            "survey_prediction": o["survey_result"].get("prediction"),
+            "survey_probability": o["survey_result"].get("probability"),
+        } for claim_id, o in zip(claim_ids, outcomes)])
+
+        image_rows = []
+        for claim_id, o in zip(claim_ids, outcomes):
+            result = sanitize_for_json(o["image_result"])
+            for path, quality in zip(o["images"], o["image_quality"]):
+                image_rows.append({
+                    "claim_id": claim_id,
+                    # Photos rejected by the quality gate were never analyzed
+                    "image_result": result if quality.get("passed") else {"excluded": "quality_gate"},
+                    "filename": os.path.basename(path),
+                    "quality": sanitize_for_json(quality),
+                })
+        if image_rows:
+            db.execute(insert(models.ClaimImage), image_rows)
+
+        db.execute(insert(models.ClaimExplanation), [{
+            "claim_id": claim_id,
+            "extracted_keywords": sanitize_for_json(o["keywords"]),
+            "clauses_used": sanitize_for_json(o["clauses"]),
+            "explanation_text": o["explanation"],
+        } for claim_id, o in zip(claim_ids, outcomes)])
+
+    run.rows_done = last_row
+    run.ok += len(outcomes)
+    run.errors += errors
+    run.updated_at = datetime.now(timezone.utc)
+    db.commit()
+    return claim_ids
+
+
+def open_run(db: Session, run_id: str, source: str = None, user_id: int = None) -> models.BulkIngestRun:
+    """Creates the run, or reopens an existing one so it resumes from its checkpoint."""
+    run = db.get(models.BulkIngestRun, run_id)
+    if run is None:
+        run = models.BulkIngestRun(id=run_id, user_id=user_id, source=source, status="running",
+                                   rows_done=0, ok=0, errors=0)
+        db.add(run)
+    elif run.status != "done":
+        run.status = "running"
+        run.last_error = None
+    run.updated_at = datetime.now(timezone.utc)
+    db.commit()
+    return run
+
+
+def run_summary(run: models.BulkIngestRun) -> Dict[str, Any]:
+    return {
+        "run_id": run.id,
+        "status": run.status,
+        "source": run.source,
+        "rows_done": run.rows_done,
+        "ok": run.ok,
+        "errors": run.errors,
+        "last_error": run.last_error,
+        "active": is_active(run.id),
+        "created_at": run.created_at.isoformat() if run.created_at else None,
+        "updated_at": run.updated_at.isoformat() if run.updated_at else None,
+    }
+
+
+def ingest(path: str, run_id: str, report_path: str, images_dir: str = None, confine: bool = False,
+           chunk_size: int = BULK_CHUNK_SIZE, use_llm: bool = False, user_id: int = None,
+           company: str = None, fmt: str = None) -> Dict[str, Any]:
+    """Ingests (or resumes ingesting) a file; returns the run summary."""
+    db = SessionLocal()
+    report = open(report_path, "a", encoding="utf-8")
+    try:
+        run = open_run(db, run_id, source=os.path.basename(path), user_id=user_id)
+        if run.status == "done":
+            logger.info(f"Bulk run {run_id} already finished")
+            return run_summary(run)
+        resume_after = run.rows_done
+        if resume_after:
+            logger.info(f"Bulk run {run_id}: resuming after row {resume_after}")
+
+        rows = ((n, record) for n, record in read_rows(path, fmt) if n > resume_after)
+        while True:
+            chunk = list(islice(rows, max(1, chunk_size)))
+            if not chunk:
+                break
+            lines, items = {}, []
+            for n, record in chunk:
+                try:
+                    items.append(dict(parse_row(record, images_dir, confine, company), row=n))
+                except BulkRowError as e:
+                    external_id = record.get("external_id") if isinstance(record, dict) else None
+                    lines[n] = {"row": n, "external_id": external_id, "status": "error", "error": str(e)}
+
+            outcomes = _process_chunk_retrying(items, use_llm) if items else []
+            for o in outcomes:
+                if o["error"]:
+                    lines[o["row"]] = {"row": o["row"], "external_id": o["external_id"], "status": "error",
+                                       "error": o["error"]}
+            good = [o for o in outcomes if not o["error"]]
+
+            claim_ids = persist_chunk(db, run, good, user_id, last_row=chunk[-1][0], errors=len(lines))
+            for o, claim_id in zip(good, claim_ids):
+                lines[o["row"]] = {"row": o["row"], "external_id": o["external_id"], "status": "ok",
+                                   "claim_id": claim_id, "final_decision": o["decision"].get("final_decision"),
+                                   "risk_level": o["decision"].get("risk_level")}
+            for n in sorted(lines):
+                report.write(json.dumps(sanitize_for_json(lines[n])) + "\n")
+            report.flush()
+            logger.info(f"Bulk run {run_id}: {run.rows_done} rows ({run.ok} ok, {run.errors} errors)")
+
+        run.status = "done"
+        run.updated_at = datetime.now(timezone.utc)
+        db.commit()
+        return run_summary(run)
+    except Exception as e:
+        # Rows of the failed chunk are not committed; the next start of this run redoes them
+        logger.error(f"Bulk run {run_id} failed: {e}")
+        db.rollback()
+        run = db.get(models.BulkIngestRun, run_id)
+        if run is not None:
+            run.status = "failed"
+            run.last_error = str(e)
+            run.updated_at = datetime.now(timezone.utc)
+            db.commit()
+        raise
+    finally:
+        report.close()
+        db.close()
+
+
+def report_path_for(run_id: str) -> str:
+    return os.path.join(BULK_DIR, f"{run_id}.report.jsonl")
+
+
+def is_active(run_id: str) -> bool:
+    with _active_lock:
+        return run_id in _active
+
+
+def reserve(run_id: str) -> bool:
+    """Claims a run id for this process before its input file is written. False if it is already taken."""
+    with _active_lock:
+        if run_id in _active:
+            return False
+        _active.add(run_id)
+        return True
+
+
+def release(run_id: str):
+    with _active_lock:
+        _active.discard(run_id)
+
+
+def start(run_id: str, path: str, **kwargs):
+    """Runs ingest() on the bulk pool (POST /bulk/claims); the caller holds the reservation, released at the end."""
+    def run():
+        try:
+            ingest(path, run_id, report_path_for(run_id), images_dir=BULK_IMAGE_ROOT, confine=True, **kwargs)
+        except Exception:
+            pass  # recorded on the run row by ingest()
+        finally:
+            release(run_id)
+
+    _pool.submit(run)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("file", help="JSONL or CSV file of claims")
+    parser.add_argument("--run", required=True, help="Run id; reuse it to resume an interrupted run")
+    parser.add_argument("--images-dir", help="Directory image references are relative to (default: the file's)")
+    parser.add_argument("--chunk-size", type=int, default=BULK_CHUNK_SIZE, help="Claims batched together")
+    parser.add_argument("--report", help="Per-row JSONL report (default: <file>.report.jsonl)")
+    parser.add_argument("--format", choices=("jsonl", "csv"), help="Input format (default: from the extension)")
+    parser.add_argument("--llm", action="store_true", help="Also extract keywords and write explanations")
+    parser.add_argument("--user-id", type=int, help="User the claims are filed under")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    if not RUN_ID_PATTERN.match(args.run):
+        parser.error("--run may only contain letters, digits, '.', '_' and '-'")
+    init_db()
+
+    report_path = args.report or f"{os.path.splitext(args.file)[0]}.report.jsonl"
+    images_dir = args.images_dir or os.path.dirname(os.path.abspath(args.file))
+    summary = ingest(args.file, args.run, report_path, images_dir=images_dir, chunk_size=args.chunk_size,
+                     use_llm=args.llm, user_id=args.user_id, fmt=args.format)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
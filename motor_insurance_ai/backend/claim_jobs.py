@@ -0,0 +1,195 @@
+"""
+Background processing for asynchronously submitted claims.
+
+POST /claim/submit persists the claim as PROCESSING and hands process_claim to
+this module's bounded worker pool. Every job keeps an in-process list of events
+(queued, running, one per finished stage, then done or failed) that
+GET /claims/{id}/status and the GET /claims/{id}/events SSE stream read.
+
+A job whose image stage could not get ML capacity (InferenceQueueTimeout) goes
+back to queued and is retried after CLAIM_JOB_BUSY_BACKOFF seconds instead of
+failing the claim.
+
+Job state lives in the API process that accepted the claim; other replicas
+(and this one after a restart) only see the claim row in the database.
+"""
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from claim_processor import process_claim, sanitize_for_json
+from ml.executor import InferenceQueueTimeout
+from db import crud
+from db.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+CLAIM_JOB_WORKERS = int(os.environ.get("CLAIM_JOB_WORKERS", "2"))
+# Claims allowed to wait for a worker; beyond that /claim/submit answers 503
+CLAIM_JOB_MAX_QUEUE = int(os.environ.get("CLAIM_JOB_MAX_QUEUE", "32"))
+# Finished jobs stay queryable for this many seconds
+CLAIM_JOB_RETENTION = float(os.environ.get("CLAIM_JOB_RETENTION", "900"))
+# A job that found the ML executor saturated is retried after this many seconds,
+# at most CLAIM_JOB_MAX_REQUEUES times before the claim is marked ERROR
+CLAIM_JOB_BUSY_BACKOFF = float(os.environ.get("CLAIM_JOB_BUSY_BACKOFF", "15"))
+CLAIM_JOB_MAX_REQUEUES = int(os.environ.get("CLAIM_JOB_MAX_REQUEUES", "20"))
+
+_pool = ThreadPoolExecutor(max_workers=CLAIM_JOB_WORKERS, thread_name_prefix="claim-job")
+_lock = threading.Lock()
+_jobs: Dict[int, Dict[str, Any]] = {}
+
+
+class ClaimQueueFull(RuntimeError):
+    """Too many claims are already waiting for a background worker."""
+
+
+def has_capacity() -> bool:
+    with _lock:
+        queued = sum(1 for job in _jobs.values() if job["status"] == "queued")
+    return queued < CLAIM_JOB_MAX_QUEUE
+
+
+def submit(claim_id: int, **process_kwargs) -> Dict[str, Any]:
+    """Queues process_claim for an already persisted claim; returns the job snapshot."""
+    with _lock:
+        _prune()
+        queued = sum(1 for job in _jobs.values() if job["status"] == "queued")
+        if queued >= CLAIM_JOB_MAX_QUEUE:
+            raise ClaimQueueFull(f"{queued} claims are already waiting")
+        _jobs[claim_id] = {
+            "claim_id": claim_id,
+            "status": "queued",
+            "stages": {},
+            "events": [],
+            "result": None,
+            "error": None,
+            "requeues": 0,
+            "submitted_at": time.time(),
+            "finished_at": None,
+        }
+    _publish(claim_id, "queued", {"claim_id": claim_id})
+    _pool.submit(_run, claim_id, process_kwargs)
+    return job_status(claim_id)
+
+
+def _run(claim_id: int, process_kwargs: Dict[str, Any]):
+    _set(claim_id, status="running", stages={})
+    _publish(claim_id, "running", {"claim_id": claim_id})
+
+    def progress(stage: str, entry: Dict[str, Any], value: Any):
+        with _lock:
+            _jobs[claim_id]["stages"][stage] = entry
+        _publish(claim_id, "stage", dict(entry, stage=stage, **_summarize(stage, value)))
+
+    try:
+        result = process_claim(claim_id=claim_id, progress=progress, **process_kwargs)
+    except InferenceQueueTimeout as e:
+        if _requeue(claim_id, process_kwargs, str(e)):
+            return
+        logger.error(f"Background processing of claim {claim_id} gave up waiting for ML capacity: {e}")
+        mark_claim_error(claim_id)
+        _set(claim_id, status="failed", error=str(e), finished_at=time.time())
+        _publish(claim_id, "failed", {"claim_id": claim_id, "error": str(e)})
+        return
+    except Exception as e:
+        logger.error(f"Background processing of claim {claim_id} failed: {e}")
+        mark_claim_error(claim_id)
+        _set(claim_id, status="failed", error=str(e), finished_at=time.time())
+        _publish(claim_id, "failed", {"claim_id": claim_id, "error": str(e)})
+        return
+
+    result = sanitize_for_json(result)
+    _set(claim_id, status="done", result=result, finished_at=time.time())
+    _publish(claim_id, "done", result)
+
+
+def _requeue(claim_id: int, process_kwargs: Dict[str, Any], reason: str) -> bool:
+    """Puts a job back in the queue after CLAIM_JOB_BUSY_BACKOFF seconds. False once out of requeues."""
+    with _lock:
+        job = _jobs[claim_id]
+        if job["requeues"] >= CLAIM_JOB_MAX_REQUEUES:
+            return False
+        job["requeues"] += 1
+        job["status"] = "queued"
+    logger.warning(f"Claim {claim_id}: ML executor busy, retrying in {CLAIM_JOB_BUSY_BACKOFF:.0f}s: {reason}")
+    _publish(claim_id, "requeued", {"claim_id": claim_id, "retry_in": CLAIM_JOB_BUSY_BACKOFF, "reason": reason})
+    timer = threading.Timer(CLAIM_JOB_BUSY_BACKOFF, _pool.submit, args=(_run, claim_id, process_kwargs))
+    timer.daemon = True
+    timer.start()
+    return True
+
+
+def _summarize(stage: str, value: Any) -> Dict[str, Any]:
+    """Small, client-friendly part of a stage's value to show as progress."""
+    if stage == "image" and isinstance(value, dict):
+        return {"damage_detected": value.get("damage_detected"), "severity": value.get("severity")}
+    if stage == "retrieval" and isinstance(value, tuple) and len(value) == 2:
+        return {"clauses": len(value[0]) + len(value[1])}
+    if stage == "keywords" and isinstance(value, dict):
+        return {"keywords": value.get("keywords", [])}
+    if stage == "decision" and isinstance(value, dict):
+        return {"final_decision": value.get("final_decision"), "risk_level": value.get("risk_level")}
+    return {}
+
+
+def mark_claim_error(claim_id: int, db: Session = None):
+    """
+    Sets a claim whose processing failed to ERROR so it does not stay PROCESSING.
+    Uses the caller's session if given (discarding its failed transaction first).
+    """
+    own_session = db is None
+    if own_session:
+        db = SessionLocal()
+    try:
+        db.rollback()
+        claim = crud.get_claim(db, claim_id)
+        if claim:
+            claim.final_decision = "ERROR"
+            db.commit()
+    except Exception as e:
+        logger.error(f"Could not mark claim {claim_id} as ERROR: {e}")
+        db.rollback()
+    finally:
+        if own_session:
+            db.close()
+
+
+def _set(claim_id: int, **fields):
+    with _lock:
+        _jobs[claim_id].update(fields)
+
+
+def _publish(claim_id: int, event: str, data: Dict[str, Any]):
+    with _lock:
+        _jobs[claim_id]["events"].append((event, data))
+
+
+def _prune():
+    """Drops finished jobs older than the retention window (caller holds _lock)."""
+    cutoff = time.time() - CLAIM_JOB_RETENTION
+    for claim_id in [cid for cid, job in _jobs.items() if job["finished_at"] and job["finished_at"] < cutoff]:
+        del _jobs[claim_id]
+
+
+def job_status(claim_id: int) -> Optional[Dict[str, Any]]:
+    """Snapshot of a job known to this process (None otherwise)."""
+    with _lock:
+        job = _jobs.get(claim_id)
+        if job is None:
+            return None
+        return {k: (dict(v) if k == "stages" else v) for k, v in job.items() if k != "events"}
+
+
+def events_since(claim_id: int, index: int) -> Tuple[List[Tuple[str, Dict[str, Any]]], bool]:
+    """(events from position `index` on, whether the job has finished)."""
+    with _lock:
+        job = _jobs.get(claim_id)
+        if job is None:
+            return [], True
+        return job["events"][index:], job["status"] in ("done", "failed")
+
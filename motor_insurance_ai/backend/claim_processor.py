@@ -1,17 +1,23 @@
 import json
 import os
-from typing import List, Tuple, Dict, Any
+import logging
+from typing import Callable, List, Tuple, Dict, Any
 
-from ml.image_model import run_image_inference
+from ml.image_model import run_image_inference, quality_gate, no_usable_images_result
+from ml.executor import call_ml, InferenceQueueTimeout
+from claim_stages import StageRunner
 from ml.Claim_model.predict import predict_survey
 from llm import keyword_extractor
 from rag import retrieve
 from decision_engine import final_decision
 from llm.explanation_gen import generate_explanation
-from db import crud
+from db import crud, models
 from db.database import SessionLocal
+from sqlalchemy.orm import Session
 import numpy as np
 
+logger = logging.getLogger(__name__)
+
 def sanitize_for_json(obj):
     if isinstance(obj, dict):
         return {k: sanitize_for_json(v) for k, v in obj.items()}
@@ -33,16 +39,120 @@ def _combine_clauses(primary: List[dict], secondary: List[dict]) -> List[dict]:
     return primary + secondary
 
 
+def _survey_model_input(survey_result: Any):
+    """Model features for a survey without a prediction yet (None if it already has one)."""
+    # If prediction is missing (which is likely if called from simpler frontend), calculate it now
+    if not isinstance(survey_result, dict) or "probability" in survey_result:
+        return None
+    logger.debug("Calculating missing survey prediction")
+
+    # Flatten the nested structure for the model
+    raw_flat = {}
+    if "vehicleDetails" in survey_result: raw_flat.update(survey_result["vehicleDetails"])
+    if "incidentDetails" in survey_result: raw_flat.update(survey_result["incidentDetails"])
+    if "accidentSpecifics" in survey_result: raw_flat.update(survey_result["accidentSpecifics"])
+    # Also include top-level keys just in case
+    raw_flat.update({k: v for k, v in survey_result.items() if isinstance(v, (str, int, float, bool))})
+
+    # --- MAPPER: Frontend (camelCase) -> Model (snake_case) ---
+    model_input = {}
+
+    # Direct Mappings
+    key_map = {
+        "carAge": "car_age",
+        "driverAge": "driver_age",
+        "accidentTime": "accident_time",
+        "locationType": "location_type",
+        "accidentType": "accident_type",
+        "previousClaims": "previous_claims",
+        "policeReport": "police_report",
+        "driverAtFault": "driver_at_fault"
+    }
+
+    for fe_key, model_key in key_map.items():
+        if fe_key in raw_flat:
+            model_input[model_key] = raw_flat[fe_key]
+
+    # Handle Damage Parts (Array -> Flags)
+    dmg_parts = raw_flat.get("damageParts", [])
+    # Ensure it's a list
+    if isinstance(dmg_parts, str):
+        # If passed as string representation
+        dmg_parts = []
+
+    model_input["damage_front"] = 1 if "Damage Front" in dmg_parts else 0
+    model_input["damage_rear"] = 1 if "Damage Rear" in dmg_parts else 0
+    model_input["damage_left_side"] = 1 if "Damage Left" in dmg_parts else 0
+    model_input["damage_right_side"] = 1 if "Damage Right" in dmg_parts else 0
+
+    # Fallback for accident_time if needed (e.g. if model expects hour int)
+    # But let's pass as-is first.
+
+    logger.debug(f"Survey model input prepared: {list(model_input)}")
+    return model_input
+
+
+def _analyze_images(paths: List[str], image_quality: List[Dict[str, Any]]) -> Dict[str, Any]:
+    image_result = call_ml(run_image_inference, paths)
+    image_result["quality"] = image_quality
+    return image_result
+
+
+def _image_fallback(e: Exception) -> Dict[str, Any]:
+    # The photos could not be analyzed: no damage verdict either way, the claim goes to manual review
+    return {
+        "analysis_failed": True,
+        "damage_detected": None,
+        "claimability": "Requires Review",
+        "final_insurance_reason": "Image analysis unavailable",
+        "details": {"error": str(e)},
+    }
+
+
+def _decide(survey_result: Dict[str, Any], image_result: Dict[str, Any]) -> Dict[str, Any]:
+    """final_decision, except that a claim whose photos could not be analyzed always goes to review."""
+    if image_result.get("analysis_failed"):
+        return {
+            "final_decision": "REQUIRES_REVIEW",
+            "reason": ["Image analysis failed or timed out; the photos need manual review"],
+            "risk_level": "MEDIUM",
+        }
+    return final_decision(survey_result, image_result)
+
+
+def _decision_fallback(e: Exception) -> Dict[str, Any]:
+    return {
+        "final_decision": "REQUIRES_REVIEW",
+        "reason": ["Automated decision unavailable; manual review required"],
+        "risk_level": "MEDIUM",
+    }
+
+
 def process_claim(description: str,
                   company: str,
                   policy_type: str,
                   survey_result: Any,
                   uploaded_image_paths: List[str],
                   user_id: Any = None,
-                  claim_id: int = None) -> Dict[str, Any]:
+                  claim_id: int = None,
+                  image_quality: List[Dict[str, Any]] = None,
+                  progress: Callable[[str, Dict[str, Any], Any], None] = None,
+                  db: Session = None,
+                  before_commit: Callable[[Session], None] = None) -> Dict[str, Any]:
     """Orchestrate image analysis, keyword extraction, clause retrieval,
     decision engine and explanation generation. Persists results to DB.
 
+    `image_quality` holds the upload-time quality verdicts (one per uploaded
+    path); images that failed are stored with the claim but not analyzed.
+    Computed here when the caller did not run the gate.
+
+    `progress(stage, entry, value)` is called as each stage finishes (see StageRunner).
+
+    All result rows are written in one transaction, on `db` if given (the
+    caller keeps ownership of that session) or on a new session.
+    `before_commit(db)` runs inside that transaction just before the commit;
+    raising from it rolls the results back (e.g. a queue worker that lost its lease).
+
     Returns a dictionary ready to be returned by the API.
     """
     
@@ -54,151 +164,98 @@ def process_claim(description: str,
            print("Warning: Failed to parse survey_result string")
            survey_result = {}
 
+    if uploaded_image_paths and image_quality is None:
+        _, image_quality = quality_gate(uploaded_image_paths)
+    usable_paths = [
+        p for p, q in zip(uploaded_image_paths or [], image_quality or []) if q.get("passed")
+    ]
+
+    # Stage graph: (image || survey || keywords -> retrieval) -> decision -> explanation.
+    # Independent stages run concurrently, each with its own timeout and fallback.
+    stages = StageRunner(on_result=progress)
+
     image_result = {}
-    if uploaded_image_paths:
-        try:
-            # Preprocess and analyze
-            image_result = run_image_inference(uploaded_image_paths)
-        except Exception as e:
-            print(f"Warning: Image analysis failed: {e}")
-            # Fallback: Treat as no damage detected or inconclusive
-            image_result = {"accident": False, "damage_detected": False, "details": {"error": str(e)}}
-
-    # Extract keywords
-    try:
-        kw = keyword_extractor.extract_keywords(description)
-        keywords = kw.get("keywords", []) if isinstance(kw, dict) else []
-    except Exception as e:
-        print(f"Warning: Keyword extraction failed: {e}")
-        kw = {}
-        keywords = []
+    if uploaded_image_paths and not usable_paths:
+        image_result = no_usable_images_result(image_quality)
+    elif usable_paths:
+        # Preprocess and analyze (bounded ML executor shared with the image endpoints).
+        # InferenceQueueTimeout propagates (the API answers 503 / background jobs requeue); any other
+        # failure or timeout sends the claim to manual review rather than deciding without the photos
+        stages.submit("image", _analyze_images, usable_paths, image_quality,
+                      fallback=_image_fallback, propagate=(InferenceQueueTimeout,))
 
-    # Build query for RAG retrieval
+    # Survey prediction is only stored with the claim (the decision uses the survey as submitted)
+    survey_input = _survey_model_input(survey_result)
+    if survey_input is not None:
+        stages.submit("survey", call_ml, predict_survey, survey_input)
+
+    # Extract keywords, then build the query for RAG retrieval; runs alongside image inference
+    stages.submit("keywords", keyword_extractor.extract_keywords, description, fallback=lambda e: {})
+    kw = stages.result("keywords")
+    kw = kw if isinstance(kw, dict) else {}
+    keywords = kw.get("keywords", [])
     query = " ".join(filter(None, [description, " ".join(keywords)])) or description
 
-    try:
-        primary, secondary = retrieve.get_reason_aware_clauses(query, company, policy_type)
-    except Exception as e:
-        print(f"Warning: RAG retrieval failed: {e}")
-        primary, secondary = [], []
+    primary, secondary = stages.run("retrieval", retrieve.get_reason_aware_clauses, query, company, policy_type,
+                                    fallback=lambda e: ([], []))
+
+    if usable_paths:
+        image_result = stages.result("image")
 
-    decision = final_decision(survey_result, image_result)
+    decision = stages.run("decision", _decide, survey_result, image_result, fallback=_decision_fallback)
 
     # Generate explanation text (use top clauses)
     selected_clauses = _combine_clauses(primary, secondary)[:5]
+    explanation_text = stages.run(
+        "explanation", generate_explanation,
+        company=company,
+        policy_type=policy_type,
+        reasons=decision.get("reason", []),
+        clauses=selected_clauses,
+        image_findings=image_result,
+        fallback=lambda e: "Detailed explanation unavailable due to LLM service error."
+    )
+
+    # Persist all results in one transaction: one commit, bulk child inserts, no refreshes.
+    # A session passed in by the caller (the /claim/process endpoint) is reused and left open.
+    own_session = db is None
+    if own_session:
+        db = SessionLocal()
     try:
-        explanation_text = generate_explanation(
-            company=company,
-            policy_type=policy_type,
-            reasons=decision.get("reason", []),
-            clauses=selected_clauses,
-            image_findings=image_result
-        )
-    except Exception as e:
-        print(f"LLM Explanation generation failed: {e}")
-        explanation_text = "Detailed explanation unavailable due to LLM service error."
-    
-    # Persist to DB (synchronous SQLAlchemy)
-    db = SessionLocal()
-    try:
+        updated = 0
         if claim_id:
-             # Update existing claim
-             claim = crud.get_claim(db, claim_id)
-             if claim:
-                 # Update fields
-                 claim.final_decision = decision.get("final_decision")
-                 claim.risk_level = decision.get("risk_level")
-                 db.commit()
-                 db.refresh(claim)
-             else:
-                 # Fallback if not found (should not happen)
-                 claim = crud.create_claim(
-                    db=db,
-                    user_id=user_id,
-                    company=company,
-                    policy_type=policy_type,
-                    description=description,
-                    final_decision=decision.get("final_decision"),
-                    risk_level=decision.get("risk_level")
-                )
-        else:
-             # Create core claim row
-            claim = crud.create_claim(
+            # Update existing claim
+            updated = db.query(models.Claim).filter(models.Claim.id == claim_id).update(
+                {"final_decision": decision.get("final_decision"), "risk_level": decision.get("risk_level")},
+                synchronize_session=False)
+        if not updated:
+            # Create core claim row (also the fallback if claim_id was not found, which should not happen)
+            claim_id = crud.create_claim(
                 db=db,
                 user_id=user_id,
                 company=company,
                 policy_type=policy_type,
                 description=description,
                 final_decision=decision.get("final_decision"),
-                risk_level=decision.get("risk_level")
-            )
+                risk_level=decision.get("risk_level"),
+                commit=False
+            ).id
 
-        # Save survey
-        try:
-            # If prediction is missing (which is likely if called from simpler frontend), calculate it now
-            if isinstance(survey_result, dict) and "probability" not in survey_result:
-                print("Calculating missing survey prediction...")
-                
-                # Flatten the nested structure for the model
-                raw_flat = {}
-                if "vehicleDetails" in survey_result: raw_flat.update(survey_result["vehicleDetails"])
-                if "incidentDetails" in survey_result: raw_flat.update(survey_result["incidentDetails"])
-                if "accidentSpecifics" in survey_result: raw_flat.update(survey_result["accidentSpecifics"])
-                # Also include top-level keys just in case
-                raw_flat.update({k: v for k, v in survey_result.items() if isinstance(v, (str, int, float, bool))})
-                
-                # --- MAPPER: Frontend (camelCase) -> Model (snake_case) ---
-                model_input = {}
-                
-                # Direct Mappings
-                key_map = {
-                    "carAge": "car_age",
-                    "driverAge": "driver_age",
-                    "accidentTime": "accident_time",
-                    "locationType": "location_type",
-                    "accidentType": "accident_type",
-                    "previousClaims": "previous_claims", 
-                    "policeReport": "police_report", 
-                    "driverAtFault": "driver_at_fault"
-                }
-
-                for fe_key, model_key in key_map.items():
-                    if fe_key in raw_flat:
-                        model_input[model_key] = raw_flat[fe_key]
-                
-                # Handle Damage Parts (Array -> Flags)
-                dmg_parts = raw_flat.get("damageParts", [])
-                # Ensure it's a list
-                if isinstance(dmg_parts, str): 
-                    # If passed as string representation
-                    dmg_parts = [] 
-                
-                model_input["damage_front"] = 1 if "Damage Front" in dmg_parts else 0
-                model_input["damage_rear"] = 1 if "Damage Rear" in dmg_parts else 0
-                model_input["damage_left_side"] = 1 if "Damage Left" in dmg_parts else 0
-                model_input["damage_right_side"] = 1 if "Damage Right" in dmg_parts else 0
-                
-                # Fallback for accident_time if needed (e.g. if model expects hour int)
-                # But let's pass as-is first.
-                
-                print(f"DEBUG: Model Input Prepared: {model_input.keys()}")
-                
-                pred_out = predict_survey(model_input)
+        # Save survey (prediction computed by the "survey" stage when it was missing)
+        if survey_input is not None:
+            pred_out = stages.result("survey")
+            if isinstance(pred_out, dict):
                 survey_result.update(pred_out) # Merge back result
-
-            prediction = survey_result.get("prediction") if isinstance(survey_result, dict) else None
-            probability = survey_result.get("probability") if isinstance(survey_result, dict) else None
-        except Exception as e:
-            print(f"Error calculating/saving survey: {e}")
-            prediction = None
-            probability = None
+        prediction = survey_result.get("prediction") if isinstance(survey_result, dict) else None
+        probability = survey_result.get("probability") if isinstance(survey_result, dict) else None
 
         crud.save_survey_result(
             db=db,
-            claim_id=claim.id,
+            claim_id=claim_id,
             survey_payload=survey_result,
             survey_prediction=prediction,
-            survey_probability=probability
+            survey_probability=probability,
+            commit=False
         )
 
         # Save images (store aggregate result for each image file)
@@ -206,32 +263,39 @@ def process_claim(description: str,
             image_results = []
             filenames = []
             sanitized_result = sanitize_for_json(image_result)
-            for path in uploaded_image_paths:
-                image_results.append(sanitized_result)
+            for path, quality in zip(uploaded_image_paths, image_quality):
+                # Photos rejected by the quality gate were never analyzed
+                image_results.append(sanitized_result if quality.get("passed") else {"excluded": "quality_gate"})
                 filenames.append(os.path.basename(path))
             
             # Re-enabled image saving with filenames
-            crud.save_claim_images(db=db, claim_id=claim.id, image_results=image_results, filenames=filenames)
+            crud.save_claim_images(db=db, claim_id=claim_id, image_results=image_results, filenames=filenames,
+                                   qualities=sanitize_for_json(image_quality), commit=False)
 
         # Save explanation + keywords + clauses
         crud.save_claim_explanation(
             db=db,
-            claim_id=claim.id,
+            claim_id=claim_id,
             extracted_keywords=sanitize_for_json(kw),
             clauses_used=sanitize_for_json(selected_clauses),
-            explanation_text=explanation_text
+            explanation_text=explanation_text,
+            commit=False
         )
-        
-        # Prepare Result Dict inside session to avoid DetachedInstanceError
+        if before_commit is not None:
+            before_commit(db)
+        db.commit()
+
         result_dict = {
-            "claim_id": claim.id,
+            "claim_id": claim_id,
             "status": decision.get("final_decision", "PENDING"),
             "final_decision": decision.get("final_decision"),
             "risk_level": decision.get("risk_level"),
             "clauses_used": selected_clauses,
             "explanation": explanation_text,
             "image_result": image_result,
-            "ml_result": image_result
+            "ml_result": image_result,
+            "image_quality": image_quality or [],
+            "stages": stages.report
         }
         return result_dict
 
@@ -240,4 +304,5 @@ def process_claim(description: str,
         db.rollback()
         raise e
     finally:
-        db.close()
\ No newline at end of file
+        if own_session:
+            db.close()
\ No newline at end of file
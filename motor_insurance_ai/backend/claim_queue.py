@@ -0,0 +1,297 @@
+"""
+Durable claim processing queue in the application's Postgres database.
+
+With CLAIM_QUEUE=postgres, /claim/submit stores a claim_jobs row instead of
+using the in-process pool (claim_jobs.py), and standalone workers
+(claim_worker.py) pull jobs with SELECT ... FOR UPDATE SKIP LOCKED, so any
+number of workers on any number of nodes can share the queue without handing
+the same job to two of them.
+
+A worker holds a job for CLAIM_QUEUE_VISIBILITY_TIMEOUT seconds and extends
+that lease while it works. If the worker dies, the lease runs out and another
+worker picks the job up again. Every attempt is recorded in claim_job_attempts.
+Failed attempts are retried with exponential backoff until max_attempts, then
+the job and its claim are marked failed / ERROR. An attempt that only found the
+ML executor saturated is deferred instead and does not count against max_attempts.
+"""
+import os
+import socket
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from claim_processor import sanitize_for_json
+from db import models
+from db.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# "memory" (in-process background pool) or "postgres" (this module + claim_worker.py)
+CLAIM_QUEUE = os.environ.get("CLAIM_QUEUE", "memory").lower()
+CLAIM_QUEUE_VISIBILITY_TIMEOUT = float(os.environ.get("CLAIM_QUEUE_VISIBILITY_TIMEOUT", "300"))
+CLAIM_QUEUE_MAX_ATTEMPTS = int(os.environ.get("CLAIM_QUEUE_MAX_ATTEMPTS", "3"))
+# Delay before retry n is RETRY_BACKOFF * 2**(n-1) seconds
+CLAIM_QUEUE_RETRY_BACKOFF = float(os.environ.get("CLAIM_QUEUE_RETRY_BACKOFF", "30"))
+# Delay before a job deferred because the ML executor was saturated runs again
+CLAIM_QUEUE_BUSY_BACKOFF = float(os.environ.get("CLAIM_QUEUE_BUSY_BACKOFF", "15"))
+
+
+class LeaseLost(RuntimeError):
+    """This worker no longer holds the job's lease; its results must not be written."""
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def enqueue(db: Session, claim_id: int, payload: Dict[str, Any]) -> models.ClaimJob:
+    """Adds the processing job of a persisted claim (payload: process_claim keyword arguments)."""
+    job = models.ClaimJob(
+        claim_id=claim_id,
+        status="queued",
+        payload=sanitize_for_json(payload),
+        stages={},
+        attempts=0,
+        max_attempts=CLAIM_QUEUE_MAX_ATTEMPTS,
+        available_at=_now(),
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def claim_next(db: Session, worker: str) -> Optional[models.ClaimJob]:
+    """
+    Takes the next visible job: queued and due, or running with an expired lease.
+    Other workers skip the locked row instead of waiting for it.
+    """
+    while True:
+        now = _now()
+        job = (
+            db.query(models.ClaimJob)
+            .filter(or_(
+                and_(models.ClaimJob.status == "queued", models.ClaimJob.available_at <= now),
+                and_(models.ClaimJob.status == "running", models.ClaimJob.locked_until < now),
+            ))
+            .order_by(models.ClaimJob.available_at, models.ClaimJob.id)
+            .with_for_update(skip_locked=True)
+            .first()
+        )
+        if job is None:
+            db.commit()
+            return None
+
+        if job.status == "running":
+            # The previous worker stopped extending its lease (crashed, killed, partitioned)
+            _close_attempt(db, job, "expired", "visibility timeout expired")
+            logger.warning(f"Claim job {job.id} (claim {job.claim_id}): lease of {job.locked_by} expired")
+            if job.attempts >= job.max_attempts:
+                _give_up(db, job, "visibility timeout expired")
+                db.commit()
+                continue
+
+        job.status = "running"
+        job.attempts += 1
+        job.locked_by = worker
+        job.locked_until = now + timedelta(seconds=CLAIM_QUEUE_VISIBILITY_TIMEOUT)
+        job.stages = {}
+        db.add(models.ClaimJobAttempt(job_id=job.id, attempt=job.attempts, worker=worker,
+                                      status="running", started_at=now))
+        if job.attempts > 1:
+            _discard_partial_outputs(db, job.claim_id)
+        db.commit()
+        db.refresh(job)
+        return job
+
+
+def extend_lease(job_id: int, worker: str) -> bool:
+    """Heartbeat: pushes the lease forward. False if the job is no longer ours."""
+    db = SessionLocal()
+    try:
+        updated = (
+            db.query(models.ClaimJob)
+            .filter(models.ClaimJob.id == job_id, models.ClaimJob.locked_by == worker,
+                    models.ClaimJob.status == "running")
+            .update({"locked_until": _now() + timedelta(seconds=CLAIM_QUEUE_VISIBILITY_TIMEOUT)},
+                    synchronize_session=False)
+        )
+        db.commit()
+        return updated == 1
+    finally:
+        db.close()
+
+
+def record_stage(job_id: int, stage: str, entry: Dict[str, Any]):
+    """Stores a finished stage so status / SSE endpoints on any replica can report it."""
+    db = SessionLocal()
+    try:
+        job = db.get(models.ClaimJob, job_id)
+        if job is not None:
+            # Reassign (not mutate) so the JSON column is flagged dirty
+            job.stages = dict(job.stages or {}, **{stage: sanitize_for_json(entry)})
+            db.commit()
+    finally:
+        db.close()
+
+
+def hold_lease(db: Session, job_id: int, worker: str):
+    """
+    Locks the job row inside the caller's transaction if `worker` still holds a
+    valid lease, else raises LeaseLost. Called just before the claim's results
+    are committed: while the row is locked, claim_next (SKIP LOCKED) cannot hand
+    the job to another worker, so results and lease stay consistent.
+    """
+    job = (
+        db.query(models.ClaimJob)
+        .filter(models.ClaimJob.id == job_id, models.ClaimJob.locked_by == worker,
+                models.ClaimJob.status == "running", models.ClaimJob.locked_until >= _now())
+        .with_for_update()
+        .first()
+    )
+    if job is None:
+        raise LeaseLost(f"claim job {job_id} is no longer leased by {worker}")
+
+
+def complete(job_id: int, worker: str, result: Dict[str, Any]) -> bool:
+    db = SessionLocal()
+    try:
+        job = _owned(db, job_id, worker)
+        if job is None:
+            return False
+        job.status = "done"
+        job.result = sanitize_for_json(result)
+        job.locked_by = job.locked_until = None
+        job.finished_at = _now()
+        _close_attempt(db, job, "done")
+        db.commit()
+        return True
+    finally:
+        db.close()
+
+
+def fail(job_id: int, worker: str, error: str) -> Optional[str]:
+    """Records a failed attempt; requeues with backoff or gives up. Returns the new job status."""
+    db = SessionLocal()
+    try:
+        job = _owned(db, job_id, worker)
+        if job is None:
+            return None
+        _close_attempt(db, job, "failed", error)
+        if job.attempts < job.max_attempts:
+            delay = CLAIM_QUEUE_RETRY_BACKOFF * 2 ** (job.attempts - 1)
+            job.status = "queued"
+            job.available_at = _now() + timedelta(seconds=delay)
+            job.locked_by = job.locked_until = None
+            job.last_error = error
+            logger.warning(f"Claim job {job.id} attempt {job.attempts} failed; retrying in {delay:.0f}s: {error}")
+        else:
+            _give_up(db, job, error)
+        db.commit()
+        return job.status
+    finally:
+        db.close()
+
+
+def defer(job_id: int, worker: str, reason: str) -> bool:
+    """
+    Requeues a job whose attempt could not get ML capacity. The attempt is closed
+    as deferred and max_attempts is raised by one, so it does not burn a retry.
+    """
+    db = SessionLocal()
+    try:
+        job = _owned(db, job_id, worker)
+        if job is None:
+            return False
+        _close_attempt(db, job, "deferred", reason)
+        job.max_attempts += 1
+        job.status = "queued"
+        job.available_at = _now() + timedelta(seconds=CLAIM_QUEUE_BUSY_BACKOFF)
+        job.locked_by = job.locked_until = None
+        logger.info(f"Claim job {job.id} deferred for {CLAIM_QUEUE_BUSY_BACKOFF:.0f}s: {reason}")
+        db.commit()
+        return True
+    finally:
+        db.close()
+
+
+def job_snapshot(db: Session, claim_id: int) -> Optional[Dict[str, Any]]:
+    """Durable job state of a claim, in the same shape as claim_jobs.job_status (None if no job)."""
+    job = db.query(models.ClaimJob).filter(models.ClaimJob.claim_id == claim_id).first()
+    if job is None:
+        return None
+    return {
+        "claim_id": job.claim_id,
+        "status": job.status,
+        "stages": dict(job.stages or {}),
+        "result": job.result,
+        "error": job.last_error if job.status == "failed" else None,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "submitted_at": job.created_at.timestamp() if job.created_at else None,
+        "finished_at": job.finished_at.timestamp() if job.finished_at else None,
+    }
+
+
+def _owned(db: Session, job_id: int, worker: str) -> Optional[models.ClaimJob]:
+    job = (
+        db.query(models.ClaimJob)
+        .filter(models.ClaimJob.id == job_id)
+        .with_for_update()
+        .first()
+    )
+    if job is None or job.status != "running" or job.locked_by != worker:
+        logger.warning(f"Claim job {job_id}: lease lost by {worker}; outcome not recorded")
+        db.rollback()
+        return None
+    return job
+
+
+def _close_attempt(db: Session, job: models.ClaimJob, status: str, error: str = None):
+    attempt = (
+        db.query(models.ClaimJobAttempt)
+        .filter(models.ClaimJobAttempt.job_id == job.id, models.ClaimJobAttempt.attempt == job.attempts)
+        .first()
+    )
+    if attempt is not None:
+        attempt.status = status
+        attempt.error = error
+        attempt.finished_at = _now()
+
+
+def _give_up(db: Session, job: models.ClaimJob, error: str):
+    job.status = "failed"
+    job.last_error = error
+    job.locked_by = job.locked_until = None
+    job.finished_at = _now()
+    claim = db.get(models.Claim, job.claim_id)
+    if claim is not None:
+        claim.final_decision = "ERROR"
+    logger.error(f"Claim job {job.id} (claim {job.claim_id}) failed after {job.attempts} attempts: {error}")
+
+
+def _discard_partial_outputs(db: Session, claim_id: int):
+    """
+    A retried attempt starts from the state /claim/submit left: drop image and
+    explanation rows and every survey row but the submitted one.
+    """
+    db.query(models.ClaimImage).filter(models.ClaimImage.claim_id == claim_id).delete(synchronize_session=False)
+    db.query(models.ClaimExplanation).filter(models.ClaimExplanation.claim_id == claim_id).delete(
+        synchronize_session=False)
+    first_survey = (
+        db.query(models.ClaimSurvey.id)
+        .filter(models.ClaimSurvey.claim_id == claim_id)
+        .order_by(models.ClaimSurvey.id)
+        .first()
+    )
+    if first_survey is not None:
+        db.query(models.ClaimSurvey).filter(
+            models.ClaimSurvey.claim_id == claim_id, models.ClaimSurvey.id != first_survey.id
+        ).delete(synchronize_session=False)
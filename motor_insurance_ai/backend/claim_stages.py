@@ -0,0 +1,118 @@
+"""
+Stage runner for process_claim.
+
+Each stage of a claim (image inference, keyword extraction, retrieval, decision,
+explanation, survey prediction) is a call with its own timeout and fallback.
+Independent stages are submitted together and run concurrently on a shared,
+bounded thread pool, so a claim takes as long as its critical path instead of
+the sum of its stages. Model inference itself still goes through the bounded
+ML executor (call_ml) from inside its stage.
+
+A stage that times out keeps running in the background (threads cannot be
+cancelled) but the claim continues with the fallback immediately.
+
+Callers that submit many calls at once (bulk ingestion) can give a runner its
+own small pool and have timeouts start when each call starts running, so calls
+still waiting for a thread do not time out.
+"""
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Stages mostly wait on Ollama, FAISS or the ML executor, so the pool can be
+# larger than the ML concurrency
+CLAIM_STAGE_WORKERS = int(os.environ.get("CLAIM_STAGE_WORKERS", "16"))
+
+# Per-stage timeouts (seconds), measured from submission (or from the start, see StageRunner)
+STAGE_TIMEOUTS = {
+    "image": float(os.environ.get("CLAIM_IMAGE_TIMEOUT", "120")),
+    "survey": float(os.environ.get("CLAIM_SURVEY_TIMEOUT", "30")),
+    "keywords": float(os.environ.get("CLAIM_KEYWORDS_TIMEOUT", "60")),
+    "retrieval": float(os.environ.get("CLAIM_RETRIEVAL_TIMEOUT", "30")),
+    "decision": float(os.environ.get("CLAIM_DECISION_TIMEOUT", "5")),
+    "explanation": float(os.environ.get("CLAIM_EXPLANATION_TIMEOUT", "120")),
+}
+
+_pool = ThreadPoolExecutor(max_workers=CLAIM_STAGE_WORKERS, thread_name_prefix="claim-stage")
+
+
+class StageRunner:
+    """
+    Runs the stages of one claim. `report` collects, per stage, the status
+    ("ok", "failed", "timeout") and the wall-clock ms from submission until the
+    stage finished (or until the claim gave up on it). `on_result(name, entry, value)`,
+    if given, is called with each report entry and the stage's value (or fallback)
+    as soon as it is recorded.
+
+    `pool` replaces the shared stage pool. With `timeout_from_start`, a stage's
+    timeout counts from when it starts running instead of from submission.
+    """
+
+    def __init__(self, on_result: Callable[[str, Dict[str, Any], Any], None] = None,
+                 pool: ThreadPoolExecutor = None, timeout_from_start: bool = False):
+        self._on_result = on_result
+        self._pool = pool or _pool
+        self._timeout_from_start = timeout_from_start
+        self._pending: Dict[str, Tuple[Any, float, Callable[[Exception], Any], Tuple[type, ...], threading.Event]] = {}
+        self._started: Dict[str, float] = {}
+        self._finished: Dict[str, float] = {}
+        self.report: Dict[str, Dict[str, Any]] = {}
+
+    def submit(self, name: str, fn: Callable, *args,
+               fallback: Callable[[Exception], Any] = lambda e: None,
+               propagate: Tuple[type, ...] = (), **kwargs):
+        """
+        Starts a stage without waiting for it. `fallback(exc)` builds the value used
+        if it fails or times out; exceptions listed in `propagate` are re-raised instead.
+        """
+        running = threading.Event()
+
+        def timed():
+            self._started[name] = time.perf_counter()
+            running.set()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._finished[name] = time.perf_counter()
+
+        self._pending[name] = (self._pool.submit(timed), time.perf_counter(), fallback, propagate, running)
+
+    def result(self, name: str) -> Any:
+        """Waits for a submitted stage (at most until its timeout) and returns its value or fallback."""
+        future, started, fallback, propagate, running = self._pending.pop(name)
+        timeout = STAGE_TIMEOUTS.get(name)
+        deadline_from = started
+        if timeout is not None and self._timeout_from_start:
+            # Still queued behind other calls on the runner's pool: that wait does not count
+            running.wait()
+            deadline_from = self._started[name]
+        remaining = None if timeout is None else max(0.0, deadline_from + timeout - time.perf_counter())
+        try:
+            value = future.result(timeout=remaining)
+            status = "ok"
+        except FutureTimeout:
+            logger.warning(f"Claim stage '{name}' timed out after {timeout:g}s; using fallback")
+            value, status = fallback(TimeoutError(f"{name} timed out after {timeout:g}s")), "timeout"
+        except propagate:
+            raise
+        except Exception as e:
+            logger.warning(f"Claim stage '{name}' failed: {e}")
+            value, status = fallback(e), "failed"
+        finished = self._finished.get(name, time.perf_counter()) if status != "timeout" else time.perf_counter()
+        self.report[name] = {"status": status, "ms": round((finished - started) * 1000, 1)}
+        if self._on_result:
+            try:
+                self._on_result(name, self.report[name], value)
+            except Exception as e:
+                logger.warning(f"Stage progress callback failed for '{name}': {e}")
+        return value
+
+    def run(self, name: str, fn: Callable, *args, **kwargs) -> Any:
+        """submit() + result() for a stage that nothing else runs alongside."""
+        self.submit(name, fn, *args, **kwargs)
+        return self.result(name)
@@ -0,0 +1,156 @@
+"""
+Standalone claim worker for the durable queue (CLAIM_QUEUE=postgres).
+
+Loads every model once, then pulls claim jobs from Postgres (claim_queue.py)
+and runs process_claim on them. Run as many as needed, on any node that can
+reach the database and the upload directory:
+
+    python claim_worker.py [--concurrency 2] [--poll 1.0] [--no-warmup]
+
+SIGTERM / SIGINT stop taking new jobs; jobs in progress are finished first.
+"""
+import os
+import time
+import signal
+import logging
+import argparse
+import threading
+
+from db.database import init_db, SessionLocal
+import claim_queue
+from claim_processor import process_claim
+from ml.executor import InferenceQueueTimeout
+
+logger = logging.getLogger("claim_worker")
+
+CLAIM_WORKER_POLL = float(os.environ.get("CLAIM_WORKER_POLL", "1.0"))
+# Wait before retrying a queue write (complete / fail) or the loop after a database error
+CLAIM_WORKER_ERROR_BACKOFF = float(os.environ.get("CLAIM_WORKER_ERROR_BACKOFF", "5"))
+CLAIM_WORKER_RECORD_ATTEMPTS = 3
+
+_stopping = threading.Event()
+
+
+def _heartbeat(job_id: int, worker: str, done: threading.Event, lease_lost: threading.Event):
+    """Extends the job's lease every third of the visibility timeout until the job ends."""
+    interval = max(1.0, claim_queue.CLAIM_QUEUE_VISIBILITY_TIMEOUT / 3)
+    while not done.wait(interval):
+        try:
+            if not claim_queue.extend_lease(job_id, worker):
+                logger.warning(f"Claim job {job_id}: lease taken over by another worker")
+                lease_lost.set()
+                return
+        except Exception as e:
+            # Keep trying: the lease only expires after the full visibility timeout
+            logger.warning(f"Claim job {job_id}: heartbeat failed: {e}")
+
+
+def _record(what: str, fn, *args):
+    """Runs a queue write, retrying with backoff through database errors. False if it never succeeded."""
+    for attempt in range(1, CLAIM_WORKER_RECORD_ATTEMPTS + 1):
+        try:
+            fn(*args)
+            return True
+        except Exception as e:
+            logger.error(f"Could not record {what} (attempt {attempt}): {e}")
+            if attempt < CLAIM_WORKER_RECORD_ATTEMPTS:
+                time.sleep(CLAIM_WORKER_ERROR_BACKOFF * attempt)
+    # The lease runs out and another worker (or this one) retries the job
+    return False
+
+
+def run_job(job_id: int, claim_id: int, payload: dict, worker: str):
+    done = threading.Event()
+    lease_lost = threading.Event()
+    beat = threading.Thread(target=_heartbeat, args=(job_id, worker, done, lease_lost), daemon=True)
+    beat.start()
+
+    def progress(stage, entry, value):
+        claim_queue.record_stage(job_id, stage, entry)
+
+    def before_commit(db):
+        # Inside the results transaction: only the current lease holder may write results
+        if lease_lost.is_set():
+            raise claim_queue.LeaseLost(f"claim job {job_id}: lease lost")
+        claim_queue.hold_lease(db, job_id, worker)
+
+    try:
+        result = process_claim(claim_id=claim_id, progress=progress, before_commit=before_commit, **payload)
+    except claim_queue.LeaseLost as e:
+        logger.warning(f"Claim {claim_id}: results discarded, {e}")
+    except InferenceQueueTimeout as e:
+        # Saturation, not a bad claim: run it again later without using up an attempt
+        _record(f"deferral of claim job {job_id}", claim_queue.defer, job_id, worker, str(e))
+    except Exception as e:
+        logger.error(f"Claim {claim_id} failed: {e}")
+        _record(f"failure of claim job {job_id}", claim_queue.fail, job_id, worker, str(e))
+    else:
+        if _record(f"completion of claim job {job_id}", claim_queue.complete, job_id, worker, result):
+            logger.info(f"Claim {claim_id} processed: {result.get('final_decision')}")
+    finally:
+        done.set()
+
+
+def work_loop(worker: str, poll: float):
+    while not _stopping.is_set():
+        db = SessionLocal()
+        try:
+            job = claim_queue.claim_next(db, worker)
+            job_info = (job.id, job.claim_id, dict(job.payload)) if job else None
+        except Exception as e:
+            logger.error(f"Could not fetch a claim job: {e}")
+            db.rollback()
+            job_info = None
+            _stopping.wait(CLAIM_WORKER_ERROR_BACKOFF)
+        finally:
+            db.close()
+
+        if job_info is None:
+            _stopping.wait(poll)
+            continue
+        try:
+            run_job(*job_info, worker=worker)
+        except Exception as e:
+            # Never let one job end this worker slot
+            logger.error(f"Claim job {job_info[0]}: unexpected worker error: {e}")
+            _stopping.wait(CLAIM_WORKER_ERROR_BACKOFF)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=int(os.environ.get("CLAIM_WORKER_CONCURRENCY", "1")),
+                        help="Jobs processed at once by this process (models are shared)")
+    parser.add_argument("--poll", type=float, default=CLAIM_WORKER_POLL,
+                        help="Seconds to wait when the queue is empty")
+    parser.add_argument("--no-warmup", action="store_true", help="Load models on first use instead of at start")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    init_db()
+
+    if not args.no_warmup:
+        from ml import warmup
+        warmup.warm_all()
+        logger.info(f"Models warmed: {warmup.readiness()}")
+
+    def stop(signum, frame):
+        logger.info("Stopping after the current jobs")
+        _stopping.set()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    base = claim_queue.worker_name()
+    threads = [
+        threading.Thread(target=work_loop, args=(f"{base}/{i}", args.poll), name=f"claim-worker-{i}")
+        for i in range(args.concurrency)
+    ]
+    for t in threads:
+        t.start()
+    logger.info(f"Claim worker {base} started with {args.concurrency} slot(s)")
+    for t in threads:
+        t.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 from typing import List, Dict, Optional
 from datetime import datetime, timezone
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 from . import models
 from passlib.context import CryptContext
@@ -35,7 +36,9 @@ def create_user(db: Session, email: str, name: str, password: str, role: str, co
     return db_user
 
 
-def create_claim(db: Session, user_id: Optional[int], company: str, policy_type: str, description: str, final_decision: Optional[str], risk_level: Optional[str]):
+# commit=False (write helpers below): the caller commits its unit of work once; rows are not refreshed
+def create_claim(db: Session, user_id: Optional[int], company: str, policy_type: str, description: str, final_decision: Optional[str], risk_level: Optional[str],
+                 commit: bool = True):
     c = models.Claim(
         user_id=user_id,
         company=company,
@@ -46,12 +49,16 @@ def create_claim(db: Session, user_id: Optional[int], company: str, policy_type:
         created_at=datetime.now(timezone.utc)
     )
     db.add(c)
+    if not commit:
+        db.flush()  # assigns c.id
+        return c
     db.commit()
     db.refresh(c)
     return c
 
 
-def save_survey_result(db: Session, claim_id: int, survey_payload: Dict, survey_prediction: Optional[str], survey_probability: Optional[float]):
+def save_survey_result(db: Session, claim_id: int, survey_payload: Dict, survey_prediction: Optional[str], survey_probability: Optional[float],
+                       commit: bool = True):
     s = models.ClaimSurvey(
         claim_id=claim_id,
         survey_payload=survey_payload,
@@ -59,35 +66,35 @@ def save_survey_result(db: Session, claim_id: int, survey_payload: Dict, survey_
         survey_probability=survey_probability
     )
     db.add(s)
+    if not commit:
+        return s
     db.commit()
     db.refresh(s)
     return s
 
 
-def save_claim_images(db: Session, claim_id: int, image_results: List[Dict], filenames: List[str] = None):
-    created = []
+def save_claim_images(db: Session, claim_id: int, image_results: List[Dict], filenames: List[str] = None,
+                      qualities: List[Dict] = None, commit: bool = True):
+    """Inserts all image rows of a claim in one bulk INSERT. Returns the number of rows."""
     # If filenames provided, zip them. Otherwise, use dummy or ensure we handle it (though DB requires it).
-    
-    if filenames and len(filenames) == len(image_results):
-        for res, fname in zip(image_results, filenames):
-            img = models.ClaimImage(claim_id=claim_id, image_result=res, filename=fname)
-            db.add(img)
-            created.append(img)
-    else:
+    qualities = qualities if qualities and len(qualities) == len(image_results) else [None] * len(image_results)
+    if not (filenames and len(filenames) == len(image_results)):
         # Fallback if no filenames matched (should not happen now)
-        for i, res in enumerate(image_results):
-            fname = f"image_{i}.jpg" # Fallback to prevent crash if backend logic fails
-            img = models.ClaimImage(claim_id=claim_id, image_result=res, filename=fname)
-            db.add(img)
-            created.append(img)
-            
-    db.commit()
-    for img in created:
-        db.refresh(img)
-    return created
+        filenames = [f"image_{i}.jpg" for i in range(len(image_results))]
+
+    rows = [
+        {"claim_id": claim_id, "image_result": res, "filename": fname, "quality": quality}
+        for res, fname, quality in zip(image_results, filenames, qualities)
+    ]
+    if rows:
+        db.execute(insert(models.ClaimImage), rows)
+    if commit:
+        db.commit()
+    return len(rows)
 
 
-def save_claim_explanation(db: Session, claim_id: int, extracted_keywords: Dict, clauses_used: List[Dict], explanation_text: str):
+def save_claim_explanation(db: Session, claim_id: int, extracted_keywords: Dict, clauses_used: List[Dict], explanation_text: str,
+                           commit: bool = True):
     ex = models.ClaimExplanation(
         claim_id=claim_id,
         extracted_keywords=extracted_keywords,
@@ -95,6 +102,8 @@ def save_claim_explanation(db: Session, claim_id: int, extracted_keywords: Dict,
         explanation_text=explanation_text
     )
     db.add(ex)
+    if not commit:
+        return ex
     db.commit()
     db.refresh(ex)
     return ex
@@ -29,3 +29,5 @@ def init_db():
         conn.execute(text("ALTER TABLE claims ADD COLUMN IF NOT EXISTS user_id INTEGER"))
         # Ensure users.hashed_password exists (for migration from mock auth)
         conn.execute(text("ALTER TABLE users ADD COLUMN IF NOT EXISTS hashed_password VARCHAR"))
+        # Ensure claim_images.quality exists (upload-time quality gate scores)
+        conn.execute(text("ALTER TABLE claim_images ADD COLUMN IF NOT EXISTS quality JSON"))
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Float, ForeignKey, func
+from sqlalchemy import Column, Integer, String, Text, DateTime, Float, ForeignKey, Index, func
 # Use SQLAlchemy's JSON type (PostgreSQL-only deployment required)
 from sqlalchemy import JSON as JSONType
 from sqlalchemy.orm import relationship
@@ -35,6 +35,7 @@ class Claim(Base):
     surveys = relationship("ClaimSurvey", back_populates="claim", cascade="all, delete-orphan")
     images = relationship("ClaimImage", back_populates="claim", cascade="all, delete-orphan")
     explanations = relationship("ClaimExplanation", back_populates="claim", cascade="all, delete-orphan")
+    job = relationship("ClaimJob", back_populates="claim", cascade="all, delete-orphan", uselist=False)
 
 
 class ClaimSurvey(Base):
@@ -57,6 +58,8 @@ class ClaimImage(Base):
     claim_id = Column(Integer, ForeignKey("claims.id"), nullable=False)
     image_result = Column(JSONType, nullable=True)
     filename = Column(String, nullable=False)
+    # Upload-time quality verdict (blur / brightness scores, passed, reasons)
+    quality = Column(JSONType, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     claim = relationship("Claim", back_populates="images")
@@ -72,4 +75,65 @@ class ClaimExplanation(Base):
     explanation_text = Column(Text, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
-    claim = relationship("Claim", back_populates="explanations")
\ No newline at end of file
+    claim = relationship("Claim", back_populates="explanations")
+
+
+class ClaimJob(Base):
+    """Durable processing job of a claim, pulled by claim workers (see claim_queue.py)."""
+    __tablename__ = "claim_jobs"
+
+    id = Column(Integer, primary_key=True)
+    claim_id = Column(Integer, ForeignKey("claims.id"), nullable=False, unique=True)
+    # queued -> running -> done | failed (back to queued while retries remain)
+    status = Column(String, nullable=False, default="queued")
+    payload = Column(JSONType, nullable=False)  # process_claim keyword arguments
+    stages = Column(JSONType, nullable=True)  # per-stage status / ms, written as stages finish
+    result = Column(JSONType, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    available_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    # Visibility timeout: a running job whose lease expired is picked up again
+    locked_by = Column(String, nullable=True)
+    locked_until = Column(DateTime(timezone=True), nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    claim = relationship("Claim", back_populates="job")
+    attempt_log = relationship("ClaimJobAttempt", back_populates="job", cascade="all, delete-orphan",
+                               order_by="ClaimJobAttempt.attempt")
+
+    __table_args__ = (Index("ix_claim_jobs_status_available_at", "status", "available_at"),)
+
+
+class ClaimJobAttempt(Base):
+    __tablename__ = "claim_job_attempts"
+
+    id = Column(Integer, primary_key=True)
+    job_id = Column(Integer, ForeignKey("claim_jobs.id"), nullable=False, index=True)
+    attempt = Column(Integer, nullable=False)
+    worker = Column(String, nullable=False)
+    # running -> done | failed | expired (worker lost its lease, e.g. crashed)
+    status = Column(String, nullable=False, default="running")
+    error = Column(Text, nullable=True)
+    started_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    job = relationship("ClaimJob", back_populates="attempt_log")
+
+
+class BulkIngestRun(Base):
+    """Checkpoint of a bulk claim ingestion run (see bulk_ingest.py); advanced with each committed chunk."""
+    __tablename__ = "bulk_ingest_runs"
+
+    id = Column(String, primary_key=True)  # run id chosen by the caller
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    source = Column(String, nullable=True)
+    # running -> done | failed (a failed or interrupted run resumes from rows_done)
+    status = Column(String, nullable=False, default="running")
+    rows_done = Column(Integer, nullable=False, default=0)  # input rows up to here are committed
+    ok = Column(Integer, nullable=False, default=0)
+    errors = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), nullable=True)
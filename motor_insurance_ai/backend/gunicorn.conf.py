@@ -0,0 +1,17 @@
+"""
+Gunicorn settings for multi-worker deployments:
+
+    gunicorn -c gunicorn.conf.py main:app
+
+With PRELOAD_MODELS=1 the app (and every model, see ml.warmup.preload_models)
+is loaded once in the master before the workers are forked, so the weights
+are shared copy-on-write instead of loaded N times.
+"""
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = os.environ.get("PRELOAD_MODELS", "0") == "1"
+# First requests on a fresh worker may still wait for the post-fork warm-up
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "120"))
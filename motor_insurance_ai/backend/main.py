@@ -1,19 +1,29 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Form, Depends, status
+import time
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, UploadFile, File, HTTPException, Form, Depends, Request, status
 from contextlib import asynccontextmanager
 from datetime import timedelta
 from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
 from typing import Dict, Any, List
 import os
 import uuid
 import json
+import asyncio
 
 from decision_engine import final_decision
 # Import DB early so missing/invalid DATABASE_URL causes immediate fail-fast behavior on import
 from db.database import init_db, SessionLocal
 from ml.Claim_model.predict import predict_survey, get_model_metadata
-from ml.Claim_model.predict import predict_survey, get_model_metadata
-from ml.image_model import run_image_inference
+from ml.image_model import run_image_inference, inference_stats, ingest_image, render_annotated_image, rendered_path
+from ml.image_model import quality_gate, no_usable_images_result
+from ml.image_model.image_io import working_copy_path
+from ml.image_model.quality import assess_image, quality_stats
+from ml.image_model.video import extract_keyframes, attach_frame_findings, VideoError, VIDEO_MAX_BYTES
+from ml.executor import run_ml, executor_stats, worker_stats, InferenceQueueTimeout, ML_EXECUTION_MODE
+from ml import warmup
 import logging
 
 # Setup Logging
@@ -27,39 +37,76 @@ logger = logging.getLogger(__name__)
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 UPLOAD_DIR = os.path.join(BASE_DIR, "uploads")
+# SSE progress stream: poll interval for new job events and keep-alive period (seconds)
+CLAIM_EVENTS_POLL = float(os.environ.get("CLAIM_EVENTS_POLL", "0.25"))
+CLAIM_EVENTS_KEEPALIVE = float(os.environ.get("CLAIM_EVENTS_KEEPALIVE", "15"))
+# Durable jobs (CLAIM_QUEUE=postgres) are followed by polling their row
+CLAIM_QUEUE_EVENTS_POLL = float(os.environ.get("CLAIM_QUEUE_EVENTS_POLL", "1.0"))
 
 import shutil
 
 def save_upload_file(file: UploadFile, destination: str):
     with open(destination, "wb") as buffer:
         shutil.copyfileobj(file.file, buffer)
+    # Oversized phone photos get a bounded-size working copy for the image models
+    ingest_image(destination)
+
+def save_video_file(file: UploadFile, destination: str, max_bytes: int) -> bool:
+    # Plain streamed copy (no image ingest); stops and removes the file past max_bytes
+    written = 0
+    with open(destination, "wb") as buffer:
+        while chunk := file.file.read(1024 * 1024):
+            written += len(chunk)
+            if max_bytes and written > max_bytes:
+                break
+            buffer.write(chunk)
+    if max_bytes and written > max_bytes:
+        os.remove(destination)
+        return False
+    return True
 
 from rag.explain import generate_explanation
 from rag.pipeline import run_rag_pipeline
 from rag import retrieve
 from claim_processor import process_claim
+import claim_jobs
+import claim_queue
+import bulk_ingest
 from db import crud
 from db.deps import get_db, get_current_user
 from sqlalchemy.orm import Session
 from auth import create_access_token, UserAuth, Token, SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
 from db.crud import verify_password
-from db.models import User
+from db.models import User, BulkIngestRun
 from schemas import map_claim_to_frontend
 from analytics.router import router as analytics_router
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup: Load ML models
-    try:
-        retrieve.load_model()
-    except Exception as e:
-        print(f"Warning: Model loading failed: {e}")
-        # Proceeding without model (will retry on first request)
+    # Heavy ML packages are imported lazily, on first use or by the warm-up
+    logger.info(f"API modules imported in {_import_ms:.0f} ms")
+    warmup.record_import_time(_import_ms)
+    # Startup: warm every model in the background (GET /ready reports progress).
+    # Set DEV_WARM_MODELS=0 to disable; models then load on first use.
+    if os.environ.get("DEV_WARM_MODELS", "1") != "0":
+        warmup.start_background_warmup()
+    else:
+        try:
+            retrieve.load_model()
+        except Exception as e:
+            print(f"Warning: Model loading failed: {e}")
+            # Proceeding without model (will retry on first request)
     yield
     # Shutdown (optional cleanup)
 
+# Preload-before-fork: with `gunicorn --preload` this runs once in the master and
+# workers share the weights copy-on-write (see gunicorn.conf.py)
+if os.environ.get("PRELOAD_MODELS", "0") == "1":
+    warmup.preload_models()
+
 app = FastAPI(title="Motor Insurance AI Backend", lifespan=lifespan)
+_import_ms = (time.perf_counter() - _import_started) * 1000
 
 # Mount uploads directory for static access
 from fastapi.staticfiles import StaticFiles
@@ -93,30 +140,17 @@ app.add_middleware(
 
 app.include_router(analytics_router)
 
-# Optional dev model warm-up: set DEV_WARM_MODELS=0 to disable
-import threading
-
-def _warm_models_background():
-    """Call model loaders in background to reduce first-request latency."""
-    try:
-        # Claim survey model
-        from ml.Claim_model.predict import _load_pipeline
-        _load_pipeline()
-    except Exception:
-        pass
-
 
+@app.exception_handler(InferenceQueueTimeout)
+async def inference_queue_timeout_handler(request, exc: InferenceQueueTimeout):
+    # ML executor saturated: ask the client to retry instead of piling up threads
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "5"})
 
 @app.on_event("startup")
 def startup_event():
     # Initialize DB tables (idempotent). Fail-fast if database configuration is missing or invalid.
     init_db()
 
-    # Optional dev model warm-up: set DEV_WARM_MODELS=0 to disable
-    if os.environ.get("DEV_WARM_MODELS", "1") != "0":
-        t = threading.Thread(target=_warm_models_background, daemon=True)
-        t.start()
-
 
 @app.post("/db/init")
 def db_init():
@@ -130,13 +164,20 @@ def db_init():
 def health_check():
     return {"status": "Backend running successfully"}
 
+
+@app.get("/ready")
+def readiness_check():
+    """Readiness probe: 200 once every model is loaded and warmed, 503 while warming or after a failure."""
+    report = warmup.readiness()
+    return JSONResponse(status_code=200 if report["ready"] else 503, content=report)
+
 # ------------------------
 # Survey ML (placeholder)
 # ------------------------
 
 @app.post("/survey")
-def survey_predict(payload: dict):
-    return predict_survey(payload)
+async def survey_predict(payload: dict):
+    return await run_ml(predict_survey, payload)
 
 
 # ------------------------
@@ -175,11 +216,77 @@ async def image_analyze(files: List[UploadFile] = File(...)):
     
     # result = analyze_images(processed)
     
-    # New Pipeline
-    result = run_image_inference(saved_paths)
+    # Quality gate on a small decode: blurry / dark photos are reported, not analyzed
+    passed_paths, quality = await run_in_threadpool(quality_gate, saved_paths)
+    if not passed_paths:
+        return no_usable_images_result(quality)
+
+    # New Pipeline (bounded ML executor, keeps the event loop free)
+    result = await run_ml(run_image_inference, passed_paths)
+    result["quality"] = quality
+    return result
+
+
+@app.post("/image/analyze/video")
+async def image_analyze_video(file: UploadFile = File(...)):
+    # Walk-around video: a few keyframes go through the image pipeline as one claim
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    ext = os.path.splitext(file.filename)[1] or ".mp4"
+    path = os.path.join(UPLOAD_DIR, f"{uuid.uuid4().hex}{ext}")
+    if not await run_in_threadpool(save_video_file, file, path, VIDEO_MAX_BYTES):
+        raise HTTPException(status_code=413, detail=f"Video is larger than the upload limit ({VIDEO_MAX_BYTES} bytes)")
+
+    try:
+        # Keyframes are written to UPLOAD_DIR so /image/annotated/{filename} serves them
+        sampled = await run_in_threadpool(extract_keyframes, path, UPLOAD_DIR)
+    except VideoError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        os.remove(path)
+
+    frames = sampled.pop("frames")
+    if frames:
+        result = await run_ml(run_image_inference, [f["path"] for f in frames])
+    else:
+        result = no_usable_images_result([])
+        result["final_insurance_reason"] = "No usable frames: the video is too blurry or too dark"
+    attach_frame_findings(result, frames)
+    result["video"].update(sampled)
     return result
 
 
+@app.get("/image/annotated/{filename}")
+async def image_annotated(filename: str, max_size: int = 1280):
+    # Annotated images are rendered lazily on first view and cached on disk
+    if os.path.basename(filename) != filename:
+        raise HTTPException(status_code=400, detail="Invalid filename")
+    path = os.path.join(UPLOAD_DIR, filename)
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Image not found")
+    max_size = min(max(max_size, 64), 4096)
+
+    cached = rendered_path(path, max_size)
+    if not os.path.exists(cached):
+        # On the ML executor (worker processes in process mode): findings come from the
+        # result cache when possible and the models are only loaded on a cache miss
+        cached = await run_ml(render_annotated_image, path, max_size)
+    return FileResponse(cached, media_type="image/jpeg")
+
+
+@app.get("/image/inference/stats")
+def image_inference_stats():
+    # Queue depth / batch size statistics of the image pipeline and the ML executor.
+    # In process mode inference runs in the worker processes, so the backend, cache,
+    # micro-batching and timing stats are collected from each worker instead.
+    if ML_EXECUTION_MODE == "process":
+        stats = worker_stats(inference_stats)
+    else:
+        stats = inference_stats()
+    stats["executor"] = executor_stats()
+    stats["quality_gate"] = quality_stats()
+    return stats
+
+
 # ------------------------
 # Decision Engine (placeholder)
 # ------------------------
@@ -193,16 +300,13 @@ def decision(payload: Dict[str, Any]):
 # ------------------------
 # Claim orchestration
 # ------------------------
-@app.post("/claim/process")
-async def claim_process(
-    description: str = Form(...),
-    company: str = Form(...),
-    policy_type: str = Form(...),
-    survey_result: str = Form(...),
-    files: List[UploadFile] = File(None),
-    # db: Session = Depends(get_db), # Removed dependency, using local session
-    current_user: User = Depends(get_current_user)
-):
+async def _prepare_claim(description: str, company: str, policy_type: str, survey_result: str,
+                         files: List[UploadFile], current_user: User, db: Session):
+    """
+    Saves the uploads, runs the quality gate and persists the claim as PROCESSING
+    (claim and initial survey in one transaction on the request's session `db`).
+    Returns (claim_id, keyword arguments for process_claim).
+    """
     # parse survey
     try:
         survey_obj = json.loads(survey_result)
@@ -218,69 +322,344 @@ async def claim_process(
             path = os.path.join(UPLOAD_DIR, filename)
             await run_in_threadpool(save_upload_file, f, path)
             saved_paths.append(path)
+    # Failed photos are kept with the claim (with their scores) but skipped by inference
+    _, image_quality = await run_in_threadpool(quality_gate, saved_paths)
+
+    def persist():
+        # 1. Create Claim (flushed for its id) 2. Save Initial Survey; one commit
+        new_claim = crud.create_claim(
+            db=db,
+            user_id=current_user.id,
+            company=company,
+            policy_type=policy_type,
+            description=description,
+            final_decision="PROCESSING",
+            risk_level=None,
+            commit=False
+        )
+        crud.save_survey_result(
+            db=db,
+            claim_id=new_claim.id,
+            survey_payload=survey_obj,
+            survey_prediction=None,
+            survey_probability=None,
+            commit=False
+        )
+        # Extract ID before commit expires the instance
+        claim_id = new_claim.id
+        db.commit()
+        return claim_id
+
+    try:
+        claim_id_val = await run_in_threadpool(persist)
+    except Exception as e:
+        logger.error(f"Failed to create claim or save survey: {e}")
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Database Error: {str(e)}")
+
+    return claim_id_val, dict(
+        description=description,
+        company=company,
+        policy_type=policy_type,
+        survey_result=survey_obj,
+        uploaded_image_paths=saved_paths,
+        user_id=current_user.id,
+        image_quality=image_quality
+    )
+
+
+def _discard_claim(claim_id: int, paths: List[str], db: Session):
+    """Deletes a claim that was persisted but never processed, with its uploaded files."""
+    try:
+        db.rollback()
+        crud.delete_claim(db, claim_id)
+    except Exception as e:
+        logger.error(f"Could not delete unprocessed claim {claim_id}: {e}")
+        db.rollback()
+        claim_jobs.mark_claim_error(claim_id, db)
+    for path in paths:
+        for p in (path, working_copy_path(path)):
+            if os.path.exists(p):
+                os.remove(p)
+
 
-    # Use a fresh session for this complex transaction to avoid PendingRollbackError
-    # from middleware or other dependencies
+@app.post("/claim/process")
+async def claim_process(
+    description: str = Form(...),
+    company: str = Form(...),
+    policy_type: str = Form(...),
+    survey_result: str = Form(...),
+    files: List[UploadFile] = File(None),
+    # db: Session = Depends(get_db), # Removed dependency, using local session
+    current_user: User = Depends(get_current_user)
+):
+    # One local session for the whole request (a fresh one rather than get_db, to avoid
+    # PendingRollbackError from middleware or other dependencies). Calls on it are sequential.
     db = SessionLocal()
     try:
+        claim_id_val, claim_kwargs = await _prepare_claim(description, company, policy_type, survey_result,
+                                                          files, current_user, db)
+
+        # 3. Heavy Processing (ML/RAG) - Must run in threadpool; its results are
+        # committed on the same session in one transaction
         try:
-            # 1. Create Claim (Async wrapper for blocking DB call)
-            new_claim = await run_in_threadpool(
-                crud.create_claim,
-                db=db,
-                user_id=current_user.id,
-                company=company,
-                policy_type=policy_type,
-                description=description,
-                final_decision="PROCESSING",
-                risk_level=None
-            )
-            
-            # 2. Save Initial Survey (Async wrapper)
-            await run_in_threadpool(
-                crud.save_survey_result,
-                db=db,
-                claim_id=new_claim.id,
-                survey_payload=survey_obj,
-                survey_prediction=None,
-                survey_probability=None
-            )
-            
-            # Extract ID before closing session to avoid DetachedInstanceError
-            claim_id_val = new_claim.id
-            
-        except Exception as e:
-            logger.error(f"Failed to create claim or save survey: {e}")
-            db.rollback()
-            raise HTTPException(status_code=500, detail=f"Database Error: {str(e)}")
-        
-        # 3. Heavy Processing (ML/RAG) - Must run in threadpool
-        # process_claim creates its OWN session, so it is safe.
-        try:
-            result = await run_in_threadpool(
-                process_claim,
-                description=description,
-                company=company,
-                policy_type=policy_type,
-                survey_result=survey_obj,
-                uploaded_image_paths=saved_paths,
-                user_id=current_user.id,
-                claim_id=claim_id_val
-            )
+            result = await run_in_threadpool(process_claim, claim_id=claim_id_val, db=db, **claim_kwargs)
+        except InferenceQueueTimeout:
+            # The client is told to retry (503), which submits the claim again:
+            # drop this attempt instead of leaving an orphaned ERROR claim behind
+            await run_in_threadpool(_discard_claim, claim_id_val, claim_kwargs["uploaded_image_paths"], db)
+            raise
         except Exception as e:
             # Mark as error if processing fails
             logger.error(f"Processing failed: {e}")
-            new_claim.final_decision = "ERROR"
-            db.add(new_claim) # Ensure it's attached
-            db.commit()
+            await run_in_threadpool(claim_jobs.mark_claim_error, claim_id_val, db)
             raise e
+    finally:
+        db.close()
+
+    return result
 
-        return result
 
+@app.post("/claim/submit", status_code=status.HTTP_202_ACCEPTED)
+async def claim_submit(
+    description: str = Form(...),
+    company: str = Form(...),
+    policy_type: str = Form(...),
+    survey_result: str = Form(...),
+    files: List[UploadFile] = File(None),
+    current_user: User = Depends(get_current_user)
+):
+    # Same inputs as /claim/process, but the pipeline runs on the background
+    # claim workers; progress via /claims/{id}/status or /claims/{id}/events
+    durable = claim_queue.CLAIM_QUEUE == "postgres"
+    if not durable and not claim_jobs.has_capacity():
+        raise HTTPException(status_code=503, detail="Claim processing queue is full", headers={"Retry-After": "30"})
+    db = SessionLocal()
+    try:
+        claim_id_val, claim_kwargs = await _prepare_claim(description, company, policy_type, survey_result,
+                                                          files, current_user, db)
+        if durable:
+            # Picked up by claim_worker.py processes (any node)
+            try:
+                await run_in_threadpool(claim_queue.enqueue, db, claim_id_val, claim_kwargs)
+            except Exception as e:
+                logger.error(f"Failed to enqueue claim {claim_id_val}: {e}")
+                await run_in_threadpool(claim_jobs.mark_claim_error, claim_id_val, db)
+                raise HTTPException(status_code=500, detail=f"Database Error: {str(e)}")
+        else:
+            try:
+                claim_jobs.submit(claim_id_val, **claim_kwargs)
+            except claim_jobs.ClaimQueueFull:
+                await run_in_threadpool(claim_jobs.mark_claim_error, claim_id_val, db)
+                raise HTTPException(status_code=503, detail="Claim processing queue is full",
+                                    headers={"Retry-After": "30"})
     finally:
         db.close()
 
-    return result
+    return {
+        "claim_id": claim_id_val,
+        "status": "queued",
+        "status_url": f"/claims/{claim_id_val}/status",
+        "events_url": f"/claims/{claim_id_val}/events",
+    }
+
+
+def _authorized_claim(claim_id: int, db: Session, current_user: User):
+    c = crud.get_claim(db, claim_id)
+    if not c:
+        raise HTTPException(status_code=404, detail="Claim not found")
+    if current_user.role == 'user' and c.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to view this claim")
+    return c
+
+
+def _claim_row_status(claim) -> Dict[str, Any]:
+    """Status of a claim this process has no job for (other replica, restart, or sync path)."""
+    decision = claim.final_decision
+    state = "processing" if decision == "PROCESSING" else "failed" if decision == "ERROR" else "done"
+    return {"claim_id": claim.id, "status": state, "final_decision": decision, "risk_level": claim.risk_level}
+
+
+@app.get("/claims/{claim_id}/status")
+def claim_status(claim_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    c = _authorized_claim(claim_id, db, current_user)
+    job = claim_jobs.job_status(claim_id) or claim_queue.job_snapshot(db, claim_id)
+    if job is None:
+        return _claim_row_status(c)
+    return job
+
+
+def _sse(event: str, data: Any, event_id: int = None) -> str:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def _durable_snapshot(claim_id: int):
+    db = SessionLocal()
+    try:
+        return claim_queue.job_snapshot(db, claim_id)
+    finally:
+        db.close()
+
+
+async def _durable_events(claim_id: int, request: Request):
+    """SSE for a claim_jobs row: polls the row and turns changes into the same events."""
+    status_sent, stages_sent, idle = None, set(), 0.0
+    while not await request.is_disconnected():
+        job = await run_in_threadpool(_durable_snapshot, claim_id)
+        if job is None:
+            return
+        sent = False
+        if job["status"] in ("queued", "running") and job["status"] != status_sent:
+            status_sent = job["status"]
+            yield _sse(job["status"], {"claim_id": claim_id, "attempts": job["attempts"]})
+            sent = True
+        for stage, entry in job["stages"].items():
+            if stage not in stages_sent:
+                stages_sent.add(stage)
+                yield _sse("stage", dict(entry, stage=stage))
+                sent = True
+        if job["status"] == "done":
+            yield _sse("done", job["result"])
+            return
+        if job["status"] == "failed":
+            yield _sse("failed", {"claim_id": claim_id, "error": job["error"]})
+            return
+        if sent:
+            idle = 0.0
+        elif idle >= CLAIM_EVENTS_KEEPALIVE:
+            yield ": keep-alive\n\n"
+            idle = 0.0
+        await asyncio.sleep(CLAIM_QUEUE_EVENTS_POLL)
+        idle += CLAIM_QUEUE_EVENTS_POLL
+
+
+@app.get("/claims/{claim_id}/events")
+async def claim_events(claim_id: int, request: Request, db: Session = Depends(get_db),
+                       current_user: User = Depends(get_current_user)):
+    # Server-sent events: queued, running, one "stage" event per finished stage, then done / failed.
+    # Reconnecting clients resume after Last-Event-ID.
+    c = _authorized_claim(claim_id, db, current_user)
+    row_status = _claim_row_status(c)
+    try:
+        index = int(request.headers.get("last-event-id", "-1")) + 1
+    except ValueError:
+        index = 0
+
+    async def stream():
+        nonlocal index
+        if claim_jobs.job_status(claim_id) is None:
+            # Not processed by this API process: follow the durable job if there is one,
+            # otherwise report what the database knows and stop
+            if await run_in_threadpool(_durable_snapshot, claim_id) is None:
+                yield _sse("status", row_status)
+                return
+            async for chunk in _durable_events(claim_id, request):
+                yield chunk
+            return
+        idle = 0.0
+        while not await request.is_disconnected():
+            events, finished = claim_jobs.events_since(claim_id, index)
+            for event, data in events:
+                yield _sse(event, data, index)
+                index += 1
+            if finished and not events:
+                return
+            if events:
+                idle = 0.0
+            elif idle >= CLAIM_EVENTS_KEEPALIVE:
+                # Comment line keeps proxies from closing an idle stream
+                yield ": keep-alive\n\n"
+                idle = 0.0
+            await asyncio.sleep(CLAIM_EVENTS_POLL)
+            idle += CLAIM_EVENTS_POLL
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+# ------------------------
+# Bulk ingestion
+# ------------------------
+def _authorized_run(run_id: str, db: Session, current_user: User):
+    if current_user.role == 'user':
+        raise HTTPException(status_code=403, detail="Bulk ingestion is restricted to insurer accounts")
+    run = db.get(BulkIngestRun, run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="Bulk run not found")
+    if run.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to view this bulk run")
+    return run
+
+
+@app.post("/bulk/claims", status_code=status.HTTP_202_ACCEPTED)
+async def bulk_claims_submit(
+    file: UploadFile = File(...),
+    run_id: str = Form(None),
+    chunk_size: int = Form(bulk_ingest.BULK_CHUNK_SIZE),
+    llm: bool = Form(False),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    # Partner backlog files (JSONL / CSV); image references resolve inside BULK_IMAGE_ROOT.
+    # Send the same file with the same run_id again to resume a failed or interrupted run.
+    if current_user.role == 'user':
+        raise HTTPException(status_code=403, detail="Bulk ingestion is restricted to insurer accounts")
+    try:
+        fmt = bulk_ingest.detect_format(file.filename)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    run_id = run_id or uuid.uuid4().hex
+    if not bulk_ingest.RUN_ID_PATTERN.match(run_id):
+        raise HTTPException(status_code=400, detail="run_id may only contain letters, digits, '.', '_' and '-'")
+    existing = db.get(BulkIngestRun, run_id)
+    if existing is not None and existing.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to resume this bulk run")
+    # Reserve the id before touching its input file, which a running ingest may be reading
+    if not bulk_ingest.reserve(run_id):
+        raise HTTPException(status_code=409, detail="Bulk run is already in progress")
+    started = False
+    try:
+        os.makedirs(bulk_ingest.BULK_DIR, exist_ok=True)
+        path = os.path.join(bulk_ingest.BULK_DIR, f"{run_id}.{fmt}")
+        tmp_path = f"{path}.{uuid.uuid4().hex}.part"
+        try:
+            with open(tmp_path, "wb") as buffer:
+                await run_in_threadpool(shutil.copyfileobj, file.file, buffer)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        run = await run_in_threadpool(bulk_ingest.open_run, db, run_id, file.filename, current_user.id)
+        if run.status != "done":
+            bulk_ingest.start(run_id, path, chunk_size=chunk_size, use_llm=llm, user_id=current_user.id,
+                              company=current_user.company, fmt=fmt)
+            started = True
+    finally:
+        if not started:
+            bulk_ingest.release(run_id)
+
+    return {
+        "run_id": run_id,
+        "status": run.status,
+        "status_url": f"/bulk/claims/{run_id}",
+        "report_url": f"/bulk/claims/{run_id}/report",
+    }
+
+
+@app.get("/bulk/claims/{run_id}")
+def bulk_claims_status(run_id: str, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    return bulk_ingest.run_summary(_authorized_run(run_id, db, current_user))
+
+
+@app.get("/bulk/claims/{run_id}/report")
+def bulk_claims_report(run_id: str, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    _authorized_run(run_id, db, current_user)
+    path = bulk_ingest.report_path_for(run_id)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="No report yet")
+    return FileResponse(path, media_type="application/x-ndjson", filename=f"{run_id}.report.jsonl")
+
 
 # ------------------------
 # Compatibility endpoints for frontend
@@ -365,7 +744,9 @@ async def claims_upload(file: UploadFile = File(...)):
     # with open(path, "wb") as fh:
     #     fh.write(content)
     await run_in_threadpool(save_upload_file, file, path)
-    return {"filename": filename, "path": path}
+    # Immediate verdict so the user can retake a blurry / dark photo before submitting
+    quality = await run_in_threadpool(assess_image, path)
+    return {"filename": filename, "path": path, "quality": quality}
 
 
 @app.post("/image")
@@ -385,8 +766,14 @@ async def image_single(file: UploadFile = File(...)):
     #     return {"damage_detected": False, "details": {}}
     # return analyze_images(processed)
     
-    # New Pipeline
-    return run_image_inference(path)
+    passed_paths, quality = await run_in_threadpool(quality_gate, [path])
+    if not passed_paths:
+        return no_usable_images_result(quality)
+
+    # New Pipeline (bounded ML executor, keeps the event loop free)
+    result = await run_ml(run_image_inference, path)
+    result["quality"] = quality
+    return result
 
 
 @app.post("/auth/login", response_model=Token)
@@ -510,11 +897,11 @@ def explanation(payload: dict):
 
 
 @app.post("/rag/query")
-def rag_query(payload: dict):
+async def rag_query(payload: dict):
     query = payload.get("query", "")
     # Placeholder: retrieve relevant clauses.
     # We might not have company/policy_type in this ad-hoc query, assume defaults or generic search.
-    primary, secondary = retrieve.get_reason_aware_clauses(query, company="General", policy_type="General")
+    primary, secondary = await run_ml(retrieve.get_reason_aware_clauses, query, company="General", policy_type="General")
     # Combine and return matches in 'matches' key expected by frontend
     matches = primary + secondary
     # transform to frontend expected format if needed
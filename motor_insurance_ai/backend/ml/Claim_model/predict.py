@@ -1,5 +1,4 @@
 import pickle
-import pandas as pd
 import os
 import logging
 
@@ -91,6 +90,8 @@ def predict_survey(data: dict):
     Uses the trained pipeline (encoder + classifier). If the model
     isn't available or failed to load, returns a placeholder prediction.
     """
+    # pandas is only needed here; importing it lazily keeps this module cheap to import
+    import pandas as pd
     df = pd.DataFrame([data])
 
     _load_pipeline()
@@ -131,3 +132,53 @@ def predict_survey(data: dict):
         "prediction": "APPROVED" if prob >= 0.5 else "REJECTED",
         "probability": round(float(prob), 3)
     }
+
+
+def predict_survey_batch(rows: list) -> list:
+    """
+    predict_survey for many surveys (bulk ingestion): one DataFrame and one
+    predict_proba call instead of one per claim. Returns one result per row, in
+    order, in the same format as predict_survey.
+    """
+    import pandas as pd
+    if not rows:
+        return []
+
+    _load_pipeline()
+
+    if pipeline is None:
+        return [{
+            "prediction": "APPROVED",
+            "probability": 0.5,
+            "note": "Model unavailable; placeholder result returned"
+        } for _ in rows]
+
+    expected = list(getattr(pipeline, 'feature_names_in_', []))
+    results = [None] * len(rows)
+    valid = []
+    for i, row in enumerate(rows):
+        missing = [f for f in expected if f not in row]
+        if missing:
+            results[i] = {
+                "error": "missing required fields",
+                "required_fields": expected,
+                "missing_fields": missing
+            }
+        else:
+            valid.append(i)
+
+    if valid:
+        try:
+            probs = pipeline.predict_proba(pd.DataFrame([rows[i] for i in valid]))[:, 1]
+        except Exception as e:
+            # One bad row fails the whole batch; isolate it by predicting row by row
+            logger.warning("Batch prediction failed, retrying row by row: %s", e)
+            for i in valid:
+                results[i] = predict_survey(rows[i])
+        else:
+            for i, prob in zip(valid, probs):
+                results[i] = {
+                    "prediction": "APPROVED" if prob >= 0.5 else "REJECTED",
+                    "probability": round(float(prob), 3)
+                }
+    return results
@@ -0,0 +1,289 @@
+"""
+Bounded executor for heavy synchronous ML calls.
+
+All model inference goes through one fixed-size thread pool so that the API
+event loop never runs inference itself and concurrent requests cannot spawn
+unbounded threads. Calls that wait in the queue longer than ML_QUEUE_TIMEOUT
+seconds (or arrive when ML_MAX_QUEUE calls are already waiting) are rejected
+with InferenceQueueTimeout, which the API maps to 503.
+
+With ML_EXECUTION_MODE=process, model calls (run_image_inference and
+predict_survey) are shipped to a pool of ML_MAX_CONCURRENCY worker processes
+instead. Each worker loads the models once and gets a fixed torch thread
+budget (ML_TORCH_THREADS, default cores / workers) so the pool never
+oversubscribes the CPU. A dead worker breaks the pool; it is rebuilt and the
+call retried once.
+
+With IMAGE_MICRO_BATCHING=1 in thread mode, run_image_inference calls bypass
+the ML_MAX_CONCURRENCY slots and wait on a separate lane instead (see
+ML_BATCHED_CONCURRENCY). In process mode a worker handles one call at a time,
+so its micro-batcher never has more than one request to merge.
+"""
+import os
+import asyncio
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, TimeoutError as FutureTimeout, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+ML_MAX_CONCURRENCY = int(os.environ.get("ML_MAX_CONCURRENCY", "2"))
+ML_MAX_QUEUE = int(os.environ.get("ML_MAX_QUEUE", "32"))
+ML_QUEUE_TIMEOUT = float(os.environ.get("ML_QUEUE_TIMEOUT", "30"))
+ML_EXECUTION_MODE = os.environ.get("ML_EXECUTION_MODE", "thread").lower()
+ML_TORCH_THREADS = int(os.environ.get("ML_TORCH_THREADS", "0")) or max(1, (os.cpu_count() or 1) // ML_MAX_CONCURRENCY)
+ML_TORCH_INTEROP_THREADS = int(os.environ.get("ML_TORCH_INTEROP_THREADS", "1"))
+# How long a warm-up task waits for the other workers before giving up (seconds)
+ML_WARMUP_TIMEOUT = float(os.environ.get("ML_WARMUP_TIMEOUT", "600"))
+# Thread mode with IMAGE_MICRO_BATCHING=1: image inference only waits on the
+# micro-batcher, which runs every model pass on its own thread. Those calls get a
+# lane of ML_BATCHED_CONCURRENCY waiting threads next to the ML_MAX_CONCURRENCY
+# slots, so the batcher can merge more than ML_MAX_CONCURRENCY requests per pass.
+ML_MICRO_BATCHING = os.environ.get("IMAGE_MICRO_BATCHING", "0") == "1"
+ML_BATCHED_CONCURRENCY = int(os.environ.get("ML_BATCHED_CONCURRENCY", os.environ.get("IMAGE_BATCH_MAX_IMAGES", "16")))
+# How long a stats request waits for busy workers to report (seconds)
+ML_STATS_TIMEOUT = float(os.environ.get("ML_STATS_TIMEOUT", "5"))
+
+# Calls that are shipped to worker processes in process mode (by qualified name,
+# so this module never has to import the heavy ML packages itself)
+PROCESS_CALLS = {
+    "ml.image_model.run_image_inference",
+    "ml.image_model.inference.run_image_inference",
+    "ml.image_model.run_image_inference_many",
+    "ml.image_model.inference.run_image_inference_many",
+    "ml.Claim_model.predict.predict_survey",
+    "ml.Claim_model.predict.predict_survey_batch",
+    "ml.image_model.render_annotated_image",
+    "ml.image_model.inference.render_annotated_image",
+    "ml.warmup.warm_image_models",
+}
+
+# Calls served by the micro-batcher (see ML_MICRO_BATCHING)
+BATCHED_CALLS = {
+    "ml.image_model.run_image_inference",
+    "ml.image_model.inference.run_image_inference",
+}
+
+
+class InferenceQueueTimeout(RuntimeError):
+    """The ML executor is saturated; the caller should retry later."""
+
+
+_executor = ThreadPoolExecutor(max_workers=ML_MAX_CONCURRENCY, thread_name_prefix="ml-inference")
+_batched_executor = ThreadPoolExecutor(max_workers=ML_BATCHED_CONCURRENCY, thread_name_prefix="ml-batched")
+_lock = threading.Lock()
+_stats = {"queued": 0, "running": 0, "completed": 0, "rejected": 0, "timed_out": 0, "worker_restarts": 0}
+
+_process_pool = None
+_pool_barrier = None
+_pool_lock = threading.Lock()
+
+# Worker-process side: barrier shared by every worker of the pool (set by _init_worker)
+_warm_barrier = None
+
+
+def _init_worker(torch_threads: int, interop_threads: int, warm_barrier=None):
+    """Process-pool initializer: pin the thread budget, then load every model once."""
+    global _warm_barrier
+    _warm_barrier = warm_barrier
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(torch_threads)
+    import torch
+    torch.set_num_threads(torch_threads)
+    torch.set_num_interop_threads(interop_threads)
+
+    try:
+        from ml.Claim_model.predict import _load_pipeline
+        _load_pipeline()
+        from ml.image_model.inference import model_instance
+        model_instance._load_models()
+    except Exception as e:
+        # Models are loaded lazily on first call instead
+        logger.warning(f"ML worker {os.getpid()} could not preload models: {e}")
+
+
+def _new_process_pool() -> ProcessPoolExecutor:
+    global _pool_barrier
+    logger.info(
+        f"Starting {ML_MAX_CONCURRENCY} ML worker processes "
+        f"({ML_TORCH_THREADS} intra-op / {ML_TORCH_INTEROP_THREADS} inter-op torch threads each)"
+    )
+    # spawn: forking a process that already initialised torch/OpenMP is unsafe
+    ctx = multiprocessing.get_context("spawn")
+    _pool_barrier = ctx.Barrier(ML_MAX_CONCURRENCY)
+    return ProcessPoolExecutor(
+        max_workers=ML_MAX_CONCURRENCY,
+        mp_context=ctx,
+        initializer=_init_worker,
+        initargs=(ML_TORCH_THREADS, ML_TORCH_INTEROP_THREADS, _pool_barrier),
+    )
+
+
+def _get_process_pool(broken: ProcessPoolExecutor = None) -> ProcessPoolExecutor:
+    """Returns the worker pool, replacing it if `broken` is still the current one."""
+    global _process_pool
+    with _pool_lock:
+        if _process_pool is None or _process_pool is broken:
+            if broken is not None:
+                logger.error("ML worker process died; restarting the process pool")
+                broken.shutdown(wait=False, cancel_futures=True)
+                with _lock:
+                    _stats["worker_restarts"] += 1
+            _process_pool = _new_process_pool()
+        return _process_pool
+
+
+def _run_in_process(func: Callable, args, kwargs):
+    pool = _get_process_pool()
+    try:
+        return pool.submit(func, *args, **kwargs).result()
+    except BrokenProcessPool:
+        # One retry on a fresh pool; a second crash is reported to the caller
+        return _get_process_pool(broken=pool).submit(func, *args, **kwargs).result()
+
+
+def _uses_process(func: Callable) -> bool:
+    return ML_EXECUTION_MODE == "process" and f"{func.__module__}.{func.__qualname__}" in PROCESS_CALLS
+
+
+def _uses_batcher(func: Callable) -> bool:
+    return (ML_MICRO_BATCHING and ML_EXECUTION_MODE != "process"
+            and f"{func.__module__}.{func.__qualname__}" in BATCHED_CALLS)
+
+
+def _tracked(func: Callable, args, kwargs):
+    with _lock:
+        _stats["queued"] -= 1
+        _stats["running"] += 1
+    try:
+        if _uses_process(func):
+            return _run_in_process(func, args, kwargs)
+        return func(*args, **kwargs)
+    finally:
+        with _lock:
+            _stats["running"] -= 1
+            _stats["completed"] += 1
+
+
+def _submit(func: Callable, args, kwargs):
+    with _lock:
+        if _stats["queued"] >= ML_MAX_QUEUE:
+            _stats["rejected"] += 1
+            raise InferenceQueueTimeout(f"ML queue is full ({ML_MAX_QUEUE} calls waiting)")
+        _stats["queued"] += 1
+    executor = _batched_executor if _uses_batcher(func) else _executor
+    return executor.submit(_tracked, func, args, kwargs)
+
+
+def _give_up(future) -> bool:
+    """Cancels a call that never left the queue. Returns False if it is already running."""
+    if not future.cancel():
+        return False
+    with _lock:
+        _stats["queued"] -= 1
+        _stats["timed_out"] += 1
+    return True
+
+
+async def run_ml(func: Callable, *args, **kwargs) -> Any:
+    """Runs `func` on the ML executor without blocking the event loop."""
+    future = _submit(func, args, kwargs)
+    wrapped = asyncio.wrap_future(future)
+    done, _ = await asyncio.wait({wrapped}, timeout=ML_QUEUE_TIMEOUT)
+    if not done and _give_up(future):
+        raise InferenceQueueTimeout(f"ML call waited more than {ML_QUEUE_TIMEOUT:.0f}s in the queue")
+    return await wrapped
+
+
+def call_ml(func: Callable, *args, **kwargs) -> Any:
+    """Blocking variant of run_ml for code already running in a worker thread."""
+    future = _submit(func, args, kwargs)
+    try:
+        return future.result(timeout=ML_QUEUE_TIMEOUT)
+    except FutureTimeout:
+        if _give_up(future):
+            raise InferenceQueueTimeout(f"ML call waited more than {ML_QUEUE_TIMEOUT:.0f}s in the queue")
+        return future.result()
+
+
+def _broadcast_task(func: Callable, timeout: float):
+    """Runs `func`, then holds this worker until every other worker is running a broadcast task too."""
+    result = func()
+    if _warm_barrier is not None:
+        try:
+            _warm_barrier.wait(timeout=timeout)
+        except threading.BrokenBarrierError:
+            logger.warning(f"ML worker {os.getpid()} ran {func.__name__}, but not every worker joined within {timeout:.0f}s")
+    return os.getpid(), result
+
+
+def _broadcast(func: Callable, timeout: float, wait_timeout: float = None, strict: bool = False) -> Dict[int, Any]:
+    """
+    Runs `func` once in every worker process and returns {pid: result}. A shared
+    barrier keeps a worker that finishes early from picking up a second task.
+    Workers that have not answered within `wait_timeout` are left out; a worker
+    whose call raised is left out too, unless `strict` re-raises its error.
+    Bypasses the request queue.
+    """
+    pool = _get_process_pool()
+    with _pool_lock:
+        barrier = _pool_barrier
+    if barrier is not None and barrier.broken:
+        # A previous broadcast timed out; every task of it has finished by now
+        barrier.reset()
+    futures = [pool.submit(_broadcast_task, func, timeout) for _ in range(ML_MAX_CONCURRENCY)]
+    done, _ = wait(futures, timeout=wait_timeout)
+    results = {}
+    for f in done:
+        if f.exception() is None or strict:
+            pid, result = f.result()
+            results[pid] = result
+        else:
+            logger.warning(f"ML worker failed to run {func.__name__}: {f.exception()}")
+    return results
+
+
+def warm_workers(func: Callable) -> list:
+    """
+    Process mode: starts the worker pool and runs `func` exactly once in every worker,
+    so each one is spawned and has loaded its models before traffic arrives.
+    Returns the per-worker results.
+    """
+    results = _broadcast(func, ML_WARMUP_TIMEOUT, strict=True)
+    if len(results) < ML_MAX_CONCURRENCY:
+        logger.warning(f"Only {len(results)} of {ML_MAX_CONCURRENCY} ML workers were warmed up")
+    return list(results.values())
+
+
+def worker_stats(func: Callable) -> Dict[str, Any]:
+    """
+    Process mode: collects `func()` (a stats function) from every worker process.
+    A worker busy with a long inference may miss the ML_STATS_TIMEOUT deadline;
+    it is then counted as not reporting.
+    """
+    results = _broadcast(func, ML_STATS_TIMEOUT, wait_timeout=2 * ML_STATS_TIMEOUT)
+    return {
+        "workers_expected": ML_MAX_CONCURRENCY,
+        "workers_reporting": len(results),
+        "workers": [{"pid": pid, **stats} for pid, stats in sorted(results.items())],
+    }
+
+
+def executor_stats() -> Dict[str, Any]:
+    with _lock:
+        stats = dict(_stats)
+    stats.update({
+        "mode": ML_EXECUTION_MODE,
+        "max_concurrency": ML_MAX_CONCURRENCY,
+        "max_queue": ML_MAX_QUEUE,
+        "queue_timeout_s": ML_QUEUE_TIMEOUT,
+    })
+    if ML_MICRO_BATCHING and ML_EXECUTION_MODE != "process":
+        stats["batched_concurrency"] = ML_BATCHED_CONCURRENCY
+    if ML_EXECUTION_MODE == "process":
+        stats["torch_threads_per_worker"] = ML_TORCH_THREADS
+        stats["torch_interop_threads_per_worker"] = ML_TORCH_INTEROP_THREADS
+    return stats
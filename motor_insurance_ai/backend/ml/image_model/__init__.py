@@ -1 +1,32 @@
-from .inference import run_image_inference
+"""
+Image damage pipeline.
+
+The API-facing entry points below are thin facades: torch, torchvision and
+ultralytics are only imported (via .inference) on the first call, so workers
+and scripts that never run image inference do not pay for them.
+ingest_image, rendered_path and the upload quality gate only need
+PIL/numpy/OpenCV and are exported directly.
+"""
+from .image_io import ingest_image
+from .annotate import rendered_path
+from .quality import quality_gate, no_usable_images_result
+
+
+def run_image_inference(image_in):
+    from .inference import run_image_inference as _run
+    return _run(image_in)
+
+
+def run_image_inference_many(claims):
+    from .inference import run_image_inference_many as _run_many
+    return _run_many(claims)
+
+
+def inference_stats():
+    from .inference import inference_stats as _stats
+    return _stats()
+
+
+def render_annotated_image(image_path, max_size=None):
+    from .inference import render_annotated_image as _render
+    return _render(image_path) if max_size is None else _render(image_path, max_size)
@@ -0,0 +1,96 @@
+import os
+import logging
+import threading
+from typing import Any, Dict, List
+
+from PIL import ImageDraw, ImageFont
+
+from .image_io import DecodedImage
+from .timing import StageTimer, histograms
+
+logger = logging.getLogger(__name__)
+
+# this file is in backend/ml/image_model/, uploads is in backend/uploads/
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+ANNOTATED_DIR = os.path.join(BACKEND_DIR, "uploads", "annotated")
+
+DEFAULT_MAX_SIZE = 1280
+
+
+def annotated_url(image_path: str) -> str:
+    """URL the frontend uses to fetch the (lazily rendered) annotated version of an upload."""
+    return f"/image/annotated/{os.path.basename(image_path)}"
+
+
+def rendered_path(image_path: str, max_size: int) -> str:
+    """On-disk cache location of a rendering of `image_path` at `max_size`."""
+    stem = os.path.splitext(os.path.basename(image_path))[0]
+    return os.path.join(ANNOTATED_DIR, f"annotated_{stem}_{max_size}.jpg")
+
+
+def draw_findings(decoded: DecodedImage, findings: List[Dict[str, Any]]):
+    """Draws findings (bboxes in original pixels) on a PIL copy of the decoded buffer."""
+    full_img = decoded.to_pil()
+    draw = ImageDraw.Draw(full_img)
+
+    # Findings are in original pixels; the decoded buffer may be downscaled
+    sx = full_img.width / decoded.original_size[0]
+    sy = full_img.height / decoded.original_size[1]
+
+    for finding in findings:
+        bx1, by1, bx2, by2 = finding["bbox"]
+        x1, y1, x2, y2 = int(bx1 * sx), int(by1 * sy), int(bx2 * sx), int(by2 * sy)
+        damage_type = finding["type"]
+        conf = finding["confidence"]
+
+        # Draw Color
+        color = "red" if "major" in damage_type else "yellow"
+        draw.rectangle([x1, y1, x2, y2], outline=color, width=3)
+
+        # Text
+        text = f"{damage_type.replace('_', ' ')}: {conf:.0%}"
+        # Try to load a font, fall back to default
+        try:
+            # font = ImageFont.truetype("arial.ttf", 15)
+            font = ImageFont.load_default()
+        except:
+            font = ImageFont.load_default()
+
+        # Draw text background
+        if hasattr(font, "getbbox"):
+            tx1, ty1, tx2, ty2 = font.getbbox(text)
+            text_w = tx2 - tx1
+            text_h = ty2 - ty1
+        else:
+            text_w, text_h = draw.textsize(text, font)
+
+        draw.rectangle([x1, y1 - text_h - 4, x1 + text_w + 4, y1], fill=color)
+        draw.text((x1 + 2, y1 - text_h - 2), text, fill="black", font=font)
+
+    return full_img
+
+
+def render_annotated(image_path: str, findings: List[Dict[str, Any]], max_size: int = DEFAULT_MAX_SIZE) -> str:
+    """
+    Renders the annotated image at most `max_size` px on its longest side and caches it on disk.
+    Later calls for the same upload and size return the cached file.
+    """
+    out_path = rendered_path(image_path, max_size)
+    if os.path.exists(out_path):
+        return out_path
+
+    timer = StageTimer()
+    # Draft-mode decode straight to the requested size
+    with timer.stage("annotate_decode"):
+        decoded = DecodedImage.open(image_path, max_side=max_size)
+    with timer.stage("annotate_draw"):
+        img = draw_findings(decoded, findings)
+
+    os.makedirs(ANNOTATED_DIR, exist_ok=True)
+    tmp_path = f"{out_path}.{threading.get_ident()}.tmp"
+    with timer.stage("jpeg_save"):
+        img.save(tmp_path, "JPEG", quality=85)
+    os.replace(tmp_path, out_path)
+    timer.count("annotated_rendered")
+    histograms.record(timer)
+    return out_path
@@ -0,0 +1,146 @@
+import time
+import queue
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import Future
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+class _Request:
+    __slots__ = ("image_paths", "future", "enqueued_at")
+
+    def __init__(self, image_paths: List[str]):
+        self.image_paths = image_paths
+        self.future: Future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class MicroBatchingServer:
+    """
+    In-process dynamic batching in front of ImageDamageModel.
+
+    Callers from any thread `submit()` an image set and get a Future. A single
+    worker thread drains the queue and flushes when `max_batch_images` images are
+    pending or the oldest request has waited `max_wait_ms`. Each flush is one
+    `predict_many` call, so YOLO and both classifiers see every image / crop of
+    every pending request in one batch; results are routed back per Future.
+    If a flush fails, its requests are run again one by one.
+    """
+
+    def __init__(self, model, max_batch_images: int = 16, max_wait_ms: float = 10.0):
+        self.model = model
+        self.max_batch_images = max(1, max_batch_images)
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: "queue.Queue[_Request]" = queue.Queue()
+        self._worker = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "flushes": 0,
+            "flushed_requests": 0,
+            "images": 0,
+            "max_queue_depth": 0,
+            "total_wait_ms": 0.0,
+            "separate_retries": 0,
+        }
+        self._batch_sizes: Counter = Counter()
+
+    def _ensure_started(self):
+        if self._worker is not None:
+            return
+        with self._start_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="image-microbatcher", daemon=True)
+                self._worker.start()
+
+    def submit(self, image_paths: List[str]) -> Future:
+        self._ensure_started()
+        request = _Request(list(image_paths))
+        self._queue.put(request)
+        with self._stats_lock:
+            self._stats["requests"] += 1
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], self._queue.qsize())
+        return request.future
+
+    def predict(self, image_paths: List[str], timeout: float = None) -> Dict[str, Any]:
+        """Blocking helper with the same contract as ImageDamageModel.predict."""
+        return self.submit(image_paths).result(timeout=timeout)
+
+    def _collect(self) -> List[_Request]:
+        batch = [self._queue.get()]
+        pending_images = len(batch[0].image_paths)
+        deadline = batch[0].enqueued_at + self.max_wait
+        while pending_images < self.max_batch_images:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+            pending_images += len(request.image_paths)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            flushed_at = time.perf_counter()
+            n_images = sum(len(r.image_paths) for r in batch)
+            with self._stats_lock:
+                self._stats["flushes"] += 1
+                self._stats["flushed_requests"] += len(batch)
+                self._stats["images"] += n_images
+                self._stats["total_wait_ms"] += sum((flushed_at - r.enqueued_at) * 1000 for r in batch)
+                self._batch_sizes[n_images] += 1
+
+            try:
+                results = self.model.predict_many([r.image_paths for r in batch])
+            except Exception as e:
+                if len(batch) == 1:
+                    batch[0].future.set_exception(e)
+                    continue
+                logger.error(f"Batched inference failed for {len(batch)} requests, running them one by one: {e}")
+                self._run_separately(batch)
+                continue
+
+            for r, result in zip(batch, results):
+                r.future.set_result(result)
+
+    def _run_separately(self, batch: List[_Request]):
+        """Runs each request of a failed flush on its own, so one bad image set only fails its own caller."""
+        with self._stats_lock:
+            self._stats["separate_retries"] += len(batch)
+        for r in batch:
+            try:
+                result = self.model.predict_many([r.image_paths])[0]
+            except Exception as e:
+                r.future.set_exception(e)
+            else:
+                r.future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            s = dict(self._stats)
+            sizes = dict(sorted(self._batch_sizes.items()))
+        flushes = s["flushes"] or 1
+        flushed_requests = s["flushed_requests"] or 1
+        return {
+            "queue_depth": self._queue.qsize(),
+            "max_queue_depth": s["max_queue_depth"],
+            "requests": s["requests"],
+            "flushes": s["flushes"],
+            "avg_batch_images": round(s["images"] / flushes, 2),
+            "avg_requests_per_flush": round(s["flushed_requests"] / flushes, 2),
+            "avg_queue_wait_ms": round(s["total_wait_ms"] / flushed_requests, 2),
+            # requests re-run on their own after their flush failed
+            "separate_retries": s["separate_retries"],
+            # images per flush -> number of flushes
+            "batch_size_histogram": sizes,
+            "max_batch_images": self.max_batch_images,
+            "max_wait_ms": self.max_wait * 1000,
+        }
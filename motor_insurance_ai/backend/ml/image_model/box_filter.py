@@ -0,0 +1,35 @@
+from typing import List, Sequence, Tuple
+
+import torch
+from torchvision.ops import nms
+
+Box = Tuple[int, int, int, int]
+
+
+def deduplicate_boxes(boxes: Sequence[Box], scores: Sequence[float], iou_threshold: float,
+                      min_area: float = 0.0, area_scale: float = 1.0) -> Tuple[List[Box], int, int]:
+    """
+    Class-agnostic clean-up of localizer boxes before crop classification.
+
+    Boxes whose area (times `area_scale`, e.g. buffer -> original pixels) is below
+    `min_area` are dropped first. The rest go through non-maximum suppression
+    ignoring the YOLO class: when boxes overlap above `iou_threshold` only the
+    most confident one is kept. `iou_threshold >= 1` disables suppression.
+
+    Returns (kept boxes in localizer order, removed_small, removed_overlap).
+    """
+    sized = [
+        (box, score) for box, score in zip(boxes, scores)
+        if (box[2] - box[0]) * (box[3] - box[1]) * area_scale >= min_area
+    ]
+    removed_small = len(boxes) - len(sized)
+    if len(sized) < 2 or iou_threshold >= 1:
+        return [box for box, _ in sized], removed_small, 0
+
+    keep = nms(
+        torch.tensor([box for box, _ in sized], dtype=torch.float32),
+        torch.tensor([score for _, score in sized], dtype=torch.float32),
+        iou_threshold,
+    )
+    kept = sorted(keep.tolist())
+    return [sized[i][0] for i in kept], removed_small, len(sized) - len(kept)
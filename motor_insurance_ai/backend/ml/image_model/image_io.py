@@ -0,0 +1,127 @@
+import os
+import logging
+from typing import Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Longest side (px) the models ever need. YOLO letterboxes to 640 and crops are
+# resized to 224, so 2x the detector input keeps small dents legible.
+# Set IMAGE_WORKING_MAX_SIDE=0 to always decode at full resolution.
+WORKING_MAX_SIDE = int(os.environ.get("IMAGE_WORKING_MAX_SIDE", "1280"))
+WORKING_SUFFIX = ".work.jpg"
+
+# EXIF orientations that swap width and height
+_TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+
+def working_copy_path(path: str) -> str:
+    """Path of the bounded-size working copy stored next to an upload."""
+    return os.path.splitext(path)[0] + WORKING_SUFFIX
+
+
+def _oriented_size(img: Image.Image) -> Tuple[int, int]:
+    """(width, height) after EXIF orientation, read from the header only."""
+    w, h = img.size
+    if img.getexif().get(0x0112) in _TRANSPOSED_ORIENTATIONS:
+        return h, w
+    return w, h
+
+
+def _decode_bounded(img: Image.Image, max_side: int) -> Image.Image:
+    """Decodes an opened image, using JPEG draft (DCT scaling) when it is larger than max_side."""
+    if max_side and max(img.size) > max_side:
+        ratio = max_side / max(img.size)
+        # draft() picks the smallest 1/2, 1/4, 1/8 scale that is still >= the requested size
+        img.draft("RGB", (int(img.size[0] * ratio) + 1, int(img.size[1] * ratio) + 1))
+    img = ImageOps.exif_transpose(img).convert("RGB")
+    if max_side and max(img.size) > max_side:
+        img.thumbnail((max_side, max_side), Image.BILINEAR)
+    return img
+
+
+def ingest_image(path: str, max_side: int = WORKING_MAX_SIDE) -> Optional[str]:
+    """
+    Upload-time ingest: writes a bounded-size working copy next to an oversized original.
+    The original file is kept untouched. Returns the working copy path, or None if not needed.
+    """
+    if not max_side:
+        return None
+    try:
+        with Image.open(path) as img:
+            if max(img.size) <= max_side:
+                return None
+            work = _decode_bounded(img, max_side)
+        out_path = working_copy_path(path)
+        work.save(out_path, "JPEG", quality=90)
+        return out_path
+    except Exception as e:
+        logger.warning(f"Image ingest skipped for {path}: {e}")
+        return None
+
+
+class DecodedImage:
+    """
+    An uploaded image decoded exactly once.
+
+    The RGB pixel buffer is shared by every stage of the pipeline:
+    YOLO gets a zero-copy BGR view, crops are array slices and the
+    annotation canvas is built from the same buffer.
+
+    The buffer may be smaller than the original upload; `to_original`
+    maps boxes back to original pixel coordinates.
+    """
+
+    def __init__(self, path: str, rgb: np.ndarray, original_size: Optional[Tuple[int, int]] = None):
+        self.path = path
+        self.rgb = rgb
+        self.original_size = original_size or self.size
+
+    @classmethod
+    def open(cls, path: str, max_side: int = WORKING_MAX_SIDE) -> "DecodedImage":
+        with Image.open(path) as img:
+            original_size = _oriented_size(img)
+            work_path = working_copy_path(path)
+            if (max_side and WORKING_MAX_SIDE and max_side <= WORKING_MAX_SIDE
+                    and max(original_size) > max_side and os.path.exists(work_path)):
+                # Ingest already produced a bounded copy with enough pixels; decode that instead.
+                # Larger targets (e.g. a 2048-px annotated rendering) decode the original
+                with Image.open(work_path) as work:
+                    rgb = np.asarray(_decode_bounded(work, max_side))
+            else:
+                rgb = np.asarray(_decode_bounded(img, max_side))
+        return cls(path, rgb, original_size)
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        """(width, height) like PIL."""
+        return self.rgb.shape[1], self.rgb.shape[0]
+
+    @property
+    def bgr(self) -> np.ndarray:
+        """BGR view of the buffer (OpenCV / ultralytics channel order), no copy."""
+        return self.rgb[:, :, ::-1]
+
+    def crop(self, bbox) -> Image.Image:
+        x1, y1, x2, y2 = bbox
+        return Image.fromarray(self.rgb[max(0, y1):y2, max(0, x1):x2])
+
+    def to_original(self, bbox) -> Tuple[int, int, int, int]:
+        """Maps a box in buffer pixels to original image pixels."""
+        if self.original_size == self.size:
+            return tuple(bbox)
+        sx = self.original_size[0] / self.size[0]
+        sy = self.original_size[1] / self.size[1]
+        x1, y1, x2, y2 = bbox
+        return (
+            min(int(round(x1 * sx)), self.original_size[0]),
+            min(int(round(y1 * sy)), self.original_size[1]),
+            min(int(round(x2 * sx)), self.original_size[0]),
+            min(int(round(y2 * sy)), self.original_size[1]),
+        )
+
+    def to_pil(self) -> Image.Image:
+        """A writable PIL copy of the buffer, e.g. for drawing annotations."""
+        return Image.fromarray(self.rgb)
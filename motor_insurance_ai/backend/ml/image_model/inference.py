@@ -3,36 +3,64 @@ import torch
 import torch.nn as nn
 from torchvision import transforms
 from torchvision.models import efficientnet_b0
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image
 from ultralytics import YOLO
 import numpy as np
 import logging
 from typing import Union, List, Dict, Any
 from collections import Counter
-import uuid
+import hashlib
+import threading
+import time
+
+from .image_io import DecodedImage, WORKING_MAX_SIDE
+from .result_cache import InferenceResultCache
+from . import onnx_backend
+from . import quantization
+from .quantization import quantize_torch_classifier, load_calibration_batches
+from .batching import MicroBatchingServer
+from .box_filter import deduplicate_boxes
+from .timing import StageTimer, histograms
+from .annotate import annotated_url, render_annotated, rendered_path, DEFAULT_MAX_SIZE
 
 # Configure logger
 logger = logging.getLogger(__name__)
 
 # Define constants and paths
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-MODELS_DIR = os.path.join(BASE_DIR, "models")
+# IMAGE_MODELS_DIR points the pipeline at another weights folder (e.g. benchmark fixtures)
+MODELS_DIR = os.environ.get("IMAGE_MODELS_DIR") or os.path.join(BASE_DIR, "models")
 YOLO_PATH = os.path.join(MODELS_DIR, "damage_localizer.pt")
 BIN_PATH = os.path.join(MODELS_DIR, "damage_binary_effnet.pth")
 SEV_PATH = os.path.join(MODELS_DIR, "damage_severity_effnet.pth")
+# Exported ONNX copies of the three models (IMAGE_INFERENCE_BACKEND=onnx)
+ONNX_DIR = os.path.join(MODELS_DIR, "onnx")
 
 # Calculate path to 'uploads' directory relative to this file
 # this file is in backend/ml/image_model/
 # uploads is in backend/uploads/
 BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 UPLOADS_DIR = os.path.join(BACKEND_DIR, "uploads")
-ANNOTATED_DIR = os.path.join(UPLOADS_DIR, "annotated")
+# Outside uploads/, which is served publicly as /uploads
+CACHE_DIR = os.environ.get("IMAGE_CACHE_DIR") or os.path.join(BACKEND_DIR, "cache", "inference")
+LEGACY_CACHE_DIR = os.path.join(UPLOADS_DIR, "inference_cache")
 
 DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
 
 class Config:
     CONFIDENCE_THRESHOLD = 0.5
-    IOU_THRESHOLD = 0.45
+    # Class-agnostic de-duplication of localizer boxes before classification: overlapping
+    # boxes above IOU_THRESHOLD collapse to the most confident one, and boxes smaller than
+    # MIN_BOX_AREA original-image pixels are dropped. Off by default: it changes damaged_regions
+    # and evidence_strength for images with overlapping boxes
+    BOX_DEDUP = os.environ.get("IMAGE_BOX_DEDUP", "0") == "1"
+    IOU_THRESHOLD = float(os.environ.get("IMAGE_DEDUP_IOU", "0.45"))
+    MIN_BOX_AREA = float(os.environ.get("IMAGE_MIN_BOX_AREA", "0"))
+    # Attach per-stage timings and counts to every result as details.timings
+    # (process-level histograms are always collected, see inference_stats)
+    TIMINGS = os.environ.get("IMAGE_TIMINGS", "0") == "1"
+    # Memory-map classifier weights (CPU) so workers share the read-only pages via the page cache
+    MMAP_WEIGHTS = os.environ.get("IMAGE_MMAP_WEIGHTS", "1") == "1"
     DAMAGE_CLASSES = [
         "minor_scratch",
         "minor_dent",
@@ -41,6 +69,29 @@ class Config:
         "major_crushed_body",
         "major_structural_deformation"
     ]
+    # Max crops per EfficientNet forward pass (bounds peak memory on large claims)
+    CLASSIFIER_BATCH_SIZE = int(os.environ.get("IMAGE_CLASSIFIER_BATCH_SIZE", "32"))
+    # Max images per YOLO call (a claim has at most 10 photos)
+    YOLO_BATCH_SIZE = int(os.environ.get("IMAGE_YOLO_BATCH_SIZE", "10"))
+    # Per-image result cache (memory LRU + JSON files under CACHE_DIR)
+    CACHE_ENABLED = os.environ.get("IMAGE_CACHE_ENABLED", "1") != "0"
+    CACHE_MAX_ENTRIES = int(os.environ.get("IMAGE_CACHE_MAX_ENTRIES", "512"))
+    # Disk tier bounds: oldest entries evicted beyond the cap; entries expire after the TTL (0 = off)
+    CACHE_DISK_MAX_ENTRIES = int(os.environ.get("IMAGE_CACHE_DISK_MAX_ENTRIES", "50000"))
+    CACHE_TTL_DAYS = float(os.environ.get("IMAGE_CACHE_TTL_DAYS", "30"))
+    # "torch" (default) or "onnx" (CPU ONNX Runtime, falls back to torch on failure)
+    INFERENCE_BACKEND = os.environ.get("IMAGE_INFERENCE_BACKEND", "torch").lower()
+    # Opt-in static INT8 binary/severity classifiers, calibrated on IMAGE_QUANTIZE_CALIBRATION_DIR
+    # (check scripts/quantization_report.py first)
+    QUANTIZE_CLASSIFIERS = os.environ.get("IMAGE_CLASSIFIER_QUANTIZE", "0") == "1"
+    # Dynamic micro-batching of concurrent run_image_inference calls
+    MICRO_BATCHING = os.environ.get("IMAGE_MICRO_BATCHING", "0") == "1"
+    BATCH_MAX_IMAGES = int(os.environ.get("IMAGE_BATCH_MAX_IMAGES", "16"))
+    BATCH_MAX_WAIT_MS = float(os.environ.get("IMAGE_BATCH_MAX_WAIT_MS", "10"))
+    # Whole-image pre-screen with the binary model; images with P(damaged) below
+    # the threshold skip YOLO and crop classification (tune with scripts/prescreen_report.py)
+    PRESCREEN_ENABLED = os.environ.get("IMAGE_PRESCREEN", "0") == "1"
+    PRESCREEN_THRESHOLD = float(os.environ.get("IMAGE_PRESCREEN_THRESHOLD", "0.1"))
 
 class ImageDamageModel:
     _instance = None
@@ -58,6 +109,7 @@ class ImageDamageModel:
         self.yolo_model = None
         self.bin_model = None
         self.sev_model = None
+        self.backend = None
         self.transform = transforms.Compose([
             transforms.Resize((224, 224)),
             transforms.ToTensor(),
@@ -65,11 +117,98 @@ class ImageDamageModel:
                                  [0.229, 0.224, 0.225])
         ])
         self.classes = Config.DAMAGE_CLASSES
+        self.cache = InferenceResultCache(CACHE_DIR, max_entries=Config.CACHE_MAX_ENTRIES,
+                                          disk_max_entries=Config.CACHE_DISK_MAX_ENTRIES,
+                                          ttl=Config.CACHE_TTL_DAYS * 86400)
+        if os.path.isdir(LEGACY_CACHE_DIR):
+            logger.warning(f"{LEGACY_CACHE_DIR} is a leftover inference cache under the public /uploads "
+                           f"mount; delete it (the cache now lives in {CACHE_DIR})")
+        self._fingerprint = None
+        self._calibration = None
+        # Counters shared by every thread that runs inference on this instance
+        self._stats_lock = threading.Lock()
+        self.prescreen_stats = {"checked": 0, "skipped": 0}
+        self.dedup_stats = {"boxes": 0, "removed_overlap": 0, "removed_small": 0}
         self.initialized = True
 
+    def _build_classifier(self, weights_path: str, num_classes: int) -> nn.Module:
+        """EfficientNet-B0 head in eval mode with weights loaded from `weights_path`."""
+        if not os.path.exists(weights_path):
+            raise FileNotFoundError(f"Model file not found: {weights_path}")
+        model = efficientnet_b0(weights=None)
+        model.classifier[1] = nn.Linear(model.classifier[1].in_features, num_classes)
+        state, mapped = self._load_weights(weights_path)
+        # assign=True makes the parameters point at the mapped storage instead of copying it
+        model.load_state_dict(state, assign=mapped)
+        return model.to(DEVICE).eval()
+
+    def _load_weights(self, weights_path: str):
+        """
+        Reads a state_dict. On CPU with MMAP_WEIGHTS the file is memory-mapped: tensors
+        are backed by the page cache, so every worker mapping the same file shares one
+        copy. Returns (state_dict, mapped).
+        """
+        if Config.MMAP_WEIGHTS and DEVICE == "cpu":
+            try:
+                return torch.load(weights_path, map_location="cpu", mmap=True, weights_only=True), True
+            except Exception as e:
+                # Legacy (non-zip) checkpoints and pickled objects cannot be mapped
+                logger.warning(f"Could not memory-map {weights_path}, loading a private copy: {e}")
+        return torch.load(weights_path, map_location=DEVICE), False
+
+    def _load_onnx_models(self):
+        """Loads (exporting once if needed) all three models as ONNX Runtime sessions."""
+        if not onnx_backend._HAS_ORT:
+            raise RuntimeError("onnxruntime is not installed")
+        for path in (YOLO_PATH, BIN_PATH, SEV_PATH):
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Model file not found: {path}")
+
+        logger.info(f"Loading ONNX Runtime models from {ONNX_DIR}...")
+        try:
+            yolo_model = onnx_backend.load_localizer(YOLO_PATH, ONNX_DIR)
+        except Exception as e:
+            # Classifiers can still use ONNX Runtime; findings must not change with the backend
+            logger.warning(f"ONNX localizer unavailable, using the PyTorch localizer: {e}")
+            yolo_model = YOLO(YOLO_PATH)
+        int8 = Config.QUANTIZE_CLASSIFIERS
+        bin_model = onnx_backend.load_classifier(BIN_PATH, ONNX_DIR, lambda: self._build_classifier(BIN_PATH, 2),
+                                                 int8=int8, calibration=self._calibration_batches)
+        sev_model = onnx_backend.load_classifier(SEV_PATH, ONNX_DIR, lambda: self._build_classifier(SEV_PATH, 6),
+                                                 int8=int8, calibration=self._calibration_batches)
+        self.yolo_model, self.bin_model, self.sev_model = yolo_model, bin_model, sev_model
+        self.backend = "onnx"
+
+    def _calibration_batches(self) -> List[torch.Tensor]:
+        """Calibration inputs for static INT8 (read once per process)."""
+        if self._calibration is None:
+            self._calibration = load_calibration_batches(self.transform)
+        return self._calibration
+
+    def _quantized(self, model: nn.Module) -> nn.Module:
+        """INT8 copy of a torch classifier when IMAGE_CLASSIFIER_QUANTIZE is on and calibration data exists."""
+        if not Config.QUANTIZE_CLASSIFIERS:
+            return model
+        if DEVICE != "cpu":
+            logger.warning("IMAGE_CLASSIFIER_QUANTIZE is CPU-only; keeping the fp32 classifiers")
+            return model
+        calibration = self._calibration_batches()
+        if not calibration:
+            logger.warning("IMAGE_CLASSIFIER_QUANTIZE=1 needs sample images in IMAGE_QUANTIZE_CALIBRATION_DIR; "
+                           "keeping the fp32 classifiers")
+            return model
+        return quantize_torch_classifier(model, calibration)
+
     def _load_models(self):
         """Lazy load models only when needed."""
         try:
+            if Config.INFERENCE_BACKEND == "onnx" and self.backend is None:
+                try:
+                    self._load_onnx_models()
+                except Exception as e:
+                    # PyTorch stays the fallback path
+                    logger.warning(f"ONNX backend unavailable, falling back to PyTorch: {e}")
+
             if self.yolo_model is None:
                 logger.info(f"Loading YOLO model from {YOLO_PATH}...")
                 if not os.path.exists(YOLO_PATH):
@@ -78,152 +217,359 @@ class ImageDamageModel:
 
             if self.bin_model is None:
                 logger.info(f"Loading Binary model from {BIN_PATH}...")
-                if not os.path.exists(BIN_PATH):
-                    raise FileNotFoundError(f"Model file not found: {BIN_PATH}")
-                self.bin_model = efficientnet_b0(weights=None)
-                self.bin_model.classifier[1] = nn.Linear(self.bin_model.classifier[1].in_features, 2)
-                state = torch.load(BIN_PATH, map_location=DEVICE)
-                self.bin_model.load_state_dict(state)
-                self.bin_model = self.bin_model.to(DEVICE).eval()
+                self.bin_model = self._quantized(self._build_classifier(BIN_PATH, 2))
 
             if self.sev_model is None:
                 logger.info(f"Loading Severity model from {SEV_PATH}...")
-                if not os.path.exists(SEV_PATH):
-                    raise FileNotFoundError(f"Model file not found: {SEV_PATH}")
-                self.sev_model = efficientnet_b0(weights=None)
-                self.sev_model.classifier[1] = nn.Linear(self.sev_model.classifier[1].in_features, 6)
-                state = torch.load(SEV_PATH, map_location=DEVICE)
-                self.sev_model.load_state_dict(state)
-                self.sev_model = self.sev_model.to(DEVICE).eval()
-                
+                self.sev_model = self._quantized(self._build_classifier(SEV_PATH, 6))
+
+            if self.backend is None:
+                self.backend = "torch"
+
         except Exception as e:
             logger.error(f"Failed to load models: {e}")
             raise e
 
-    def _process_single_image(self, image_path: str) -> Dict[str, Any]:
-        """Runs inference on a single image, annotates it, and returns findings."""
-        if not os.path.exists(image_path):
-            logger.warning(f"Image not found: {image_path}")
-            return {"findings": [], "annotated_path": None, "error": "file_not_found"}
+    def preload(self):
+        """
+        Loads the models without running them (see ml.warmup.preload_models).
+        Also builds the YOLO predictor: its first use copies and fuses the localizer
+        weights, which would otherwise happen privately in every forked worker.
+        """
+        self._load_models()
+        yolo = self.yolo_model
+        if getattr(yolo, "predictor", None) is None and hasattr(yolo, "_smart_load"):
+            try:
+                # Same setup ultralytics' Model.predict does on its first call (no forward pass)
+                args = {**yolo.overrides, "conf": 0.25, "mode": "predict", "save": False, "verbose": False}
+                yolo.predictor = yolo._smart_load("predictor")(overrides=args, _callbacks=yolo.callbacks)
+                yolo.predictor.setup_model(model=yolo.model, verbose=False)
+            except Exception as e:
+                yolo.predictor = None
+                logger.warning(f"Could not pre-build the YOLO predictor: {e}")
+        self.model_fingerprint()
 
-        damage_findings = []
-        
-        # Load original image
-        try:
-            full_img = Image.open(image_path).convert("RGB")
-            draw = ImageDraw.Draw(full_img)
-        except Exception as e:
-            logger.error(f"Failed to open image {image_path}: {e}")
-            return {"findings": [], "annotated_path": None, "error": str(e)}
+    def warm_up(self) -> Dict[str, float]:
+        """
+        Loads all three models and pushes one dummy input through each, so the first
+        real claim does not pay for lazy loading, allocator growth or kernel selection.
+        Returns the load and per-model warm-up times in ms.
+        """
+        timings = {}
+        start = time.perf_counter()
+        self._load_models()
+        self.model_fingerprint()
+        timings["load_ms"] = round((time.perf_counter() - start) * 1000, 1)
 
-        # 1. Localization (YOLO)
-        results = self.yolo_model(image_path, verbose=False, conf=0.25)
-        
-        has_annotations = False
-        
-        for r in results:
-            for box in r.boxes:
-                # Crop
-                x1, y1, x2, y2 = map(int, box.xyxy[0].cpu().numpy())
-                
-                # Check valid crop
-                if x2 <= x1 or y2 <= y1:
-                    continue
+        side = WORKING_MAX_SIDE or 1280
+        blank = np.zeros((side * 3 // 4, side, 3), dtype=np.uint8)
+        start = time.perf_counter()
+        self.yolo_model([blank], verbose=False, conf=0.25, batch=1)
+        timings["yolo_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+        batch = self.transform(Image.new("RGB", (224, 224))).unsqueeze(0).to(DEVICE)
+        for name, model in (("binary_ms", self.bin_model), ("severity_ms", self.sev_model)):
+            start = time.perf_counter()
+            with torch.no_grad():
+                model(batch)
+            timings[name] = round((time.perf_counter() - start) * 1000, 1)
+        return timings
+
+    def _localize(self, image_paths: List[str], timer: StageTimer = None) -> List[Dict[str, Any]]:
+        """
+        Runs YOLO over all images of a claim in batched calls.
+        Returns one entry per input path (same order) with the decoded image and its valid boxes.
+        """
+        timer = timer or StageTimer()
+        localized = []
+        for image_path in image_paths:
+            if not os.path.exists(image_path):
+                logger.warning(f"Image not found: {image_path}")
+                localized.append({"image": None, "boxes": [], "error": "file_not_found"})
+                continue
+
+            # Decode once; the buffer is shared by YOLO, cropping and annotation
+            try:
+                with timer.stage("decode"):
+                    decoded = DecodedImage.open(image_path)
+            except Exception as e:
+                logger.error(f"Failed to open image {image_path}: {e}")
+                localized.append({"image": None, "boxes": [], "error": str(e)})
+                continue
+
+            localized.append({"image": decoded, "boxes": [], "scores": []})
+
+        pending = [loc for loc in localized if loc["image"] is not None]
+
+        # 0. Optional pre-screen: skip localization on clearly undamaged photos
+        if Config.PRESCREEN_ENABLED and pending:
+            with timer.stage("prescreen"):
+                scores = self.prescreen_scores([loc["image"] for loc in pending])
+            for loc, score in zip(pending, scores):
+                loc["prescreen_score"] = score
+                loc["skipped"] = score < Config.PRESCREEN_THRESHOLD
+            with self._stats_lock:
+                self.prescreen_stats["checked"] += len(pending)
+                self.prescreen_stats["skipped"] += sum(loc["skipped"] for loc in pending)
+            pending = [loc for loc in pending if not loc["skipped"]]
+
+        # 1. Localization (YOLO) - one call per batch of readable images
+        batch_size = max(1, Config.YOLO_BATCH_SIZE)
+
+        for start in range(0, len(pending), batch_size):
+            chunk = pending[start:start + batch_size]
+            with timer.stage("yolo"):
+                results = self.yolo_model([loc["image"].bgr for loc in chunk], verbose=False, conf=0.25, batch=len(chunk))
+
+            # Results come back in source order, one per image
+            for loc, r in zip(chunk, results):
+                for box in r.boxes:
+                    x1, y1, x2, y2 = map(int, box.xyxy[0].cpu().numpy())
 
-                crop = full_img.crop((x1, y1, x2, y2))
-                
-                # Preprocess for EffNet
-                img_tensor = self.transform(crop).unsqueeze(0).to(DEVICE)
+                    # Check valid crop
+                    if x2 <= x1 or y2 <= y1:
+                        continue
+                    loc["boxes"].append((x1, y1, x2, y2))
+                    loc["scores"].append(float(box.conf[0]))
 
+        timer.count("images", len(image_paths))
+        timer.count("boxes", sum(len(loc["boxes"]) for loc in localized))
+        return localized
+
+    def _deduplicate(self, localized: List[Dict[str, Any]]):
+        """
+        Collapses duplicate localizer boxes in place so each physical region is classified
+        (and counted as evidence) once. Records the number of removed crops per image.
+        """
+        for loc in localized:
+            if not loc["boxes"]:
+                continue
+            decoded = loc["image"]
+            area_scale = (decoded.original_size[0] * decoded.original_size[1]) / (decoded.size[0] * decoded.size[1])
+            n_boxes = len(loc["boxes"])
+            loc["boxes"], removed_small, removed_overlap = deduplicate_boxes(
+                loc["boxes"], loc["scores"], Config.IOU_THRESHOLD,
+                min_area=Config.MIN_BOX_AREA, area_scale=area_scale,
+            )
+            loc["crops_removed"] = removed_small + removed_overlap
+            with self._stats_lock:
+                self.dedup_stats["boxes"] += n_boxes
+                self.dedup_stats["removed_small"] += removed_small
+                self.dedup_stats["removed_overlap"] += removed_overlap
+
+    def prescreen_scores(self, images: List[DecodedImage]) -> List[float]:
+        """
+        P(damaged) of the binary EfficientNet on each whole image, downscaled to 224x224.
+        Cheap compared to YOLO + per-crop classification; used to short-circuit context shots.
+        """
+        scores = []
+        batch_size = max(1, Config.CLASSIFIER_BATCH_SIZE)
+        for start in range(0, len(images), batch_size):
+            chunk = images[start:start + batch_size]
+            batch = torch.stack([self.transform(img.to_pil()) for img in chunk]).to(DEVICE)
+            with torch.no_grad():
+                probs = torch.softmax(self.bin_model(batch), dim=1)
+            scores.extend(probs[:, 0].tolist())
+        return scores
+
+    def _classify_crops(self, crops: List[Image.Image], timer: StageTimer = None) -> List[Any]:
+        """
+        Classifies every crop of a claim in batches.
+        Returns one (damage_type, confidence) tuple per crop, or None when the
+        binary model rejects the crop as undamaged.
+        """
+        timer = timer or StageTimer()
+        labels: List[Any] = [None] * len(crops)
+        batch_size = max(1, Config.CLASSIFIER_BATCH_SIZE)
+
+        for start in range(0, len(crops), batch_size):
+            chunk = crops[start:start + batch_size]
+            # Preprocess for EffNet
+            with timer.stage("preprocess"):
+                batch = torch.stack([self.transform(c) for c in chunk]).to(DEVICE)
+
+            with torch.no_grad(), timer.stage("binary"):
                 # 2. Binary Verification
-                with torch.no_grad():
-                    out = self.bin_model(img_tensor)
-                    probs = torch.softmax(out, dim=1)
-                    # Assuming Index 0 is 'damaged' based on probabilistic logic (>0.5)
-                    is_damaged = probs[0][0].item() > Config.CONFIDENCE_THRESHOLD
-                
-                if is_damaged:
-                    # 3. Severity
-                    with torch.no_grad():
-                        out2 = self.sev_model(img_tensor)
-                        probs2 = torch.softmax(out2, dim=1)
-                        pred_idx = torch.argmax(probs2).item()
-                        conf = probs2[0][pred_idx].item()
-                        damage_type = self.classes[pred_idx]
-                    
-                    damage_findings.append({
-                        "type": damage_type,
-                        "confidence": float(conf),
-                        "bbox": [x1, y1, x2, y2]
-                    })
-                    
-                    # Annotate
-                    has_annotations = True
-                    # Draw Color
-                    color = "red" if "major" in damage_type else "yellow"
-                    draw.rectangle([x1, y1, x2, y2], outline=color, width=3)
-                    
-                    # Text
-                    text = f"{damage_type.replace('_', ' ')}: {conf:.0%}"
-                    # Try to load a font, fall back to default
-                    try:
-                        # font = ImageFont.truetype("arial.ttf", 15) 
-                        font = ImageFont.load_default()
-                    except:
-                        font = ImageFont.load_default()
-                        
-                    # Draw text background
-                    if hasattr(font, "getbbox"):
-                        tx1, ty1, tx2, ty2 = font.getbbox(text)
-                        text_w = tx2 - tx1
-                        text_h = ty2 - ty1
-                    else:
-                        text_w, text_h = draw.textsize(text, font)
-                        
-                    draw.rectangle([x1, y1 - text_h - 4, x1 + text_w + 4, y1], fill=color)
-                    draw.text((x1 + 2, y1 - text_h - 2), text, fill="black", font=font)
-
-        annotated_path = None
-        if has_annotations:
-            # Save annotated image
-            os.makedirs(ANNOTATED_DIR, exist_ok=True)
-            filename = f"annotated_{uuid.uuid4().hex}.jpg"
-            save_path = os.path.join(ANNOTATED_DIR, filename)
-            full_img.save(save_path)
-            # Return relative path for frontend URL (assuming static mount at /uploads)
-            # if we save to backend/uploads/annotated/foo.jpg, and backend/uploads is mounted at /uploads
-            # then URL is /uploads/annotated/foo.jpg
-            annotated_path = f"/uploads/annotated/{filename}"
+                probs = torch.softmax(self.bin_model(batch), dim=1)
+                # Assuming Index 0 is 'damaged' based on probabilistic logic (>0.5)
+                damaged_mask = probs[:, 0] > Config.CONFIDENCE_THRESHOLD
+            if not damaged_mask.any():
+                continue
 
-        return {
-            "findings": damage_findings,
-            "annotated_path": annotated_path
-        }
+            with torch.no_grad(), timer.stage("severity"):
+                # 3. Severity (damaged subset only)
+                damaged_idx = torch.nonzero(damaged_mask).flatten()
+                probs2 = torch.softmax(self.sev_model(batch[damaged_idx]), dim=1)
+                confs, pred_idxs = probs2.max(dim=1)
+
+            for i, conf, pred_idx in zip(damaged_idx.tolist(), confs.tolist(), pred_idxs.tolist()):
+                labels[start + i] = (self.classes[pred_idx], float(conf))
+
+        timer.count("crops_classified", len(crops))
+        timer.count("crops_kept", sum(1 for label in labels if label is not None))
+        return labels
+
+    def _analyze_images(self, image_paths: List[str], timer: StageTimer = None) -> List[Dict[str, Any]]:
+        """
+        Runs the model stack over a set of images.
+        Localizes all images in batched YOLO calls, then classifies all crops in one batched pass.
+        Returns one {"findings"} entry per input path (same order). Nothing is drawn here;
+        annotated images are rendered on demand by render_annotated_image.
+        """
+        # 1. Localize every image and collect all crops
+        timer = timer or StageTimer()
+        localized = self._localize(image_paths, timer)
+        if Config.BOX_DEDUP:
+            with timer.stage("dedup"):
+                self._deduplicate(localized)
+            timer.count("crops_removed", sum(loc.get("crops_removed", 0) for loc in localized))
+        crops = []
+        crop_owners = []
+        with timer.stage("crop"):
+            for img_idx, loc in enumerate(localized):
+                for bbox in loc["boxes"]:
+                    crops.append(loc["image"].crop(bbox))
+                    crop_owners.append((img_idx, bbox))
+
+        # 2 + 3. Batched binary verification and severity classification
+        labels = self._classify_crops(crops, timer)
+
+        per_image_findings = [[] for _ in localized]
+        for (img_idx, bbox), label in zip(crop_owners, labels):
+            if label is None:
+                continue
+            damage_type, conf = label
+            per_image_findings[img_idx].append({
+                "type": damage_type,
+                "confidence": conf,
+                # Reported in original upload pixels, independent of the working resolution
+                "bbox": list(localized[img_idx]["image"].to_original(bbox))
+            })
+
+        results = []
+        for loc, findings in zip(localized, per_image_findings):
+            result = {"findings": findings}
+            if loc.get("error"):
+                result["error"] = loc["error"]
+            if "prescreen_score" in loc:
+                result["prescreen_score"] = round(loc["prescreen_score"], 4)
+                result["prescreen_skipped"] = loc["skipped"]
+            if loc.get("crops_removed"):
+                result["crops_removed"] = loc["crops_removed"]
+            results.append(result)
+        return results
+
+    def model_fingerprint(self) -> str:
+        """
+        Identifies the weights and thresholds that produced a result (part of every cache key).
+        Built from file stats and configuration only, so cache lookups never load the models.
+        """
+        if self._fingerprint is None:
+            parts = []
+            for path in (YOLO_PATH, BIN_PATH, SEV_PATH):
+                st = os.stat(path)
+                parts.append(f"{os.path.basename(path)}:{st.st_size}:{st.st_mtime_ns}")
+            # Configured backend (ONNX falls back to torch only on failure; outputs match within 1e-3)
+            int8 = Config.QUANTIZE_CLASSIFIERS and bool(quantization.CALIBRATION_DIR)
+            parts.append(f"conf={Config.CONFIDENCE_THRESHOLD}:yolo_conf=0.25:work={WORKING_MAX_SIDE}:backend={Config.INFERENCE_BACKEND}:int8={int8}")
+            if Config.PRESCREEN_ENABLED:
+                parts.append(f"prescreen={Config.PRESCREEN_THRESHOLD}")
+            if Config.BOX_DEDUP:
+                parts.append(f"dedup_iou={Config.IOU_THRESHOLD}:min_area={Config.MIN_BOX_AREA}")
+            parts.append(",".join(self.classes))
+            self._fingerprint = hashlib.sha256("|".join(parts).encode()).hexdigest()[:16]
+        return self._fingerprint
 
     def predict(self, image_paths: List[str]) -> Dict[str, Any]:
         """
         Main entry point for list of images.
+        Per-image results are served from the content-hash cache; only misses hit the models.
+        """
+        return self.predict_many([image_paths])[0]
+
+    def predict_many(self, claims: List[List[str]]) -> List[Dict[str, Any]]:
+        """
+        Runs several independent image sets (e.g. concurrent claims) through one batched
+        model pass and returns one aggregated result per set, in order.
         """
         self._load_models()
-        
+        timer = StageTimer()
+
+        with timer.stage("cache_lookup"):
+            lookups = [self._lookup(paths) for paths in claims]
+
+        # One localization + classification pass over every cache miss of every set
+        miss_paths = []
+        for paths, (per_image, _) in zip(claims, lookups):
+            miss_paths.extend(p for p, r in zip(paths, per_image) if r is None)
+        unique_misses = list(dict.fromkeys(miss_paths))
+        fresh = dict(zip(unique_misses, self._analyze_images(unique_misses, timer))) if unique_misses else {}
+        timer.count("cache_hits", sum(len(paths) for paths in claims) - len(miss_paths))
+
+        results = []
+        for paths, (per_image, keys) in zip(claims, lookups):
+            for i, path in enumerate(paths):
+                if per_image[i] is not None:
+                    continue
+                per_image[i] = fresh[path]
+                # Never cache unreadable images; they may be fixed by a re-upload
+                if keys[i] and not per_image[i].get("error"):
+                    with timer.stage("cache_store"):
+                        self.cache.put(keys[i], per_image[i])
+            with timer.stage("aggregate"):
+                results.append(self._aggregate(per_image, paths))
+
+        histograms.record(timer)
+        if Config.TIMINGS:
+            # One model pass serves every set in the batch; each result carries the batch's timings
+            timings = dict(timer.as_dict(), batched_sets=len(claims))
+            for result in results:
+                result.setdefault("details", {})["timings"] = timings
+        return results
+
+    def findings_for(self, image_path: str) -> List[Dict[str, Any]]:
+        """Per-image findings, from the result cache when possible (models are only loaded on a miss)."""
+        per_image, keys = self._lookup([image_path])
+        if per_image[0] is None:
+            self._load_models()
+            per_image[0] = self._analyze_images([image_path])[0]
+            if keys[0] and not per_image[0].get("error"):
+                self.cache.put(keys[0], per_image[0])
+        return per_image[0].get("findings", [])
+
+    def _lookup(self, image_paths: List[str]):
+        """Returns (per-image cached results or None, cache keys) for a set of images."""
+        per_image: List[Any] = [None] * len(image_paths)
+        keys: List[Any] = [None] * len(image_paths)
+
+        if Config.CACHE_ENABLED:
+            fingerprint = self.model_fingerprint()
+            for i, path in enumerate(image_paths):
+                keys[i] = self.cache.key_for(path, fingerprint)
+                if keys[i]:
+                    per_image[i] = self.cache.get(keys[i])
+        return per_image, keys
+
+    def _aggregate(self, per_image: List[Dict[str, Any]], image_paths: List[str]) -> Dict[str, Any]:
+        """Claim-level verdict from per-image findings."""
         all_findings = []
         annotated_images = []
         damaged_images_count = 0
-        
-        for path in image_paths:
-            result = self._process_single_image(path)
+        prescreen_skipped = sum(1 for result in per_image if result.get("prescreen_skipped"))
+        crops_removed = sum(result.get("crops_removed", 0) for result in per_image)
+
+        for path, result in zip(image_paths, per_image):
             findings = result.get("findings", [])
-            
             if findings:
                 damaged_images_count += 1
                 all_findings.extend(findings)
-                if result.get("annotated_path"):
-                    annotated_images.append(result["annotated_path"])
-        
+                # Rendered lazily on first request (GET /image/annotated/{filename})
+                annotated_images.append(annotated_url(path))
+
         # ---------------- Aggregation & Logic (Ported from inference_pipeline.py) ----------------
         
         if not all_findings:
-            return {
+            result = {
                 "damage_detected": False,
                 "severity": "none",
                 "confidence": 0.0,
@@ -233,6 +579,9 @@ class ImageDamageModel:
                 "reasoning": ["No visual damage detected"],
                 "annotated_images": []
             }
+            if Config.PRESCREEN_ENABLED:
+                result["details"] = {"total_images": len(image_paths), "prescreen_skipped": prescreen_skipped}
+            return result
 
         # Extract Types and Confidences
         damage_types = [f['type'] for f in all_findings]
@@ -331,13 +680,60 @@ class ImageDamageModel:
             "details": {
                  "total_images": len(image_paths),
                  "damaged_regions": num_regions,
-                 "distribution": dict(type_counts)
+                 "distribution": dict(type_counts),
+                 **({"duplicate_crops_removed": crops_removed} if Config.BOX_DEDUP else {}),
+                 **({"prescreen_skipped": prescreen_skipped} if Config.PRESCREEN_ENABLED else {})
             }
         }
 
 # Singleton instance access
 model_instance = ImageDamageModel()
 
+_batching_server = None
+_batching_lock = threading.Lock()
+
+
+def get_batching_server() -> MicroBatchingServer:
+    """Process-wide micro-batching server (created on first use)."""
+    global _batching_server
+    if _batching_server is None:
+        with _batching_lock:
+            if _batching_server is None:
+                _batching_server = MicroBatchingServer(
+                    model_instance,
+                    max_batch_images=Config.BATCH_MAX_IMAGES,
+                    max_wait_ms=Config.BATCH_MAX_WAIT_MS,
+                )
+    return _batching_server
+
+
+def render_annotated_image(image_path: str, max_size: int = DEFAULT_MAX_SIZE) -> str:
+    """Returns the path of the annotated rendering of an upload, drawing it on first request."""
+    cached = rendered_path(image_path, max_size)
+    if os.path.exists(cached):
+        return cached
+    return render_annotated(image_path, model_instance.findings_for(image_path), max_size)
+
+
+def inference_stats() -> Dict[str, Any]:
+    """Runtime statistics of the image pipeline (backend, cache, micro-batching, stage timings)."""
+    cache = model_instance.cache
+    with model_instance._stats_lock:
+        dedup_stats = dict(model_instance.dedup_stats)
+        prescreen_stats = dict(model_instance.prescreen_stats)
+    return {
+        "backend": model_instance.backend,
+        "cache": {"enabled": Config.CACHE_ENABLED, "hits": cache.hits, "misses": cache.misses,
+                  "evicted": cache.evicted},
+        "micro_batching": get_batching_server().stats() if Config.MICRO_BATCHING else None,
+        "box_dedup": dict(dedup_stats, enabled=Config.BOX_DEDUP,
+                          iou_threshold=Config.IOU_THRESHOLD, min_area=Config.MIN_BOX_AREA),
+        "prescreen": dict(prescreen_stats, enabled=Config.PRESCREEN_ENABLED,
+                          threshold=Config.PRESCREEN_THRESHOLD),
+        # Per-stage latency histograms (ms) and running counts since process start
+        "timings": histograms.stats(),
+    }
+
 def run_image_inference(image_in: Union[str, List[str]]) -> Dict[str, Any]:
     """
     Public Interface.
@@ -363,6 +759,8 @@ def run_image_inference(image_in: Union[str, List[str]]) -> Dict[str, Any]:
         }
 
     try:
+        if Config.MICRO_BATCHING:
+            return get_batching_server().predict(valid_paths)
         return model_instance.predict(valid_paths)
     except Exception as e:
         logger.error(f"Inference failed: {e}")
@@ -374,3 +772,24 @@ def run_image_inference(image_in: Union[str, List[str]]) -> Dict[str, Any]:
             "damage_types": [],
             "error": str(e)
         }
+
+
+def run_image_inference_many(claims: List[List[str]]) -> List[Dict[str, Any]]:
+    """
+    Bulk interface: the image sets of many claims in one batched model pass
+    (see ImageDamageModel.predict_many). Returns one result per set, in order.
+    """
+    if not claims:
+        return []
+    try:
+        return model_instance.predict_many([[p for p in paths if p and isinstance(p, str)] for paths in claims])
+    except Exception as e:
+        logger.error(f"Bulk inference failed: {e}")
+        return [{
+            "damage_detected": False,
+            "severity": "none",
+            "confidence": 0.0,
+            "evidence_strength": "NONE",
+            "damage_types": [],
+            "error": str(e)
+        } for _ in claims]
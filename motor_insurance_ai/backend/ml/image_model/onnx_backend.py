@@ -0,0 +1,239 @@
+import os
+import shutil
+import inspect
+import logging
+import tempfile
+from contextlib import contextmanager
+
+import numpy as np
+import torch
+
+logger = logging.getLogger(__name__)
+
+# POSIX file locks serialise exports between processes; without fcntl only the
+# per-process temp names protect the cache
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# onnxruntime is optional; the PyTorch path is used when it is missing
+try:
+    import onnxruntime as ort
+    _HAS_ORT = True
+except Exception:
+    ort = None
+    _HAS_ORT = False
+
+CLASSIFIER_INPUT = (3, 224, 224)
+OPSET = 17
+# Max abs difference of softmax outputs accepted between PyTorch and ONNX Runtime
+PARITY_ATOL = 1e-3
+# Localizer parity on raw head outputs: class scores (0-1) and box coordinates (input pixels)
+LOCALIZER_INPUT = 640
+LOCALIZER_BOX_ATOL = 0.5
+
+
+def _is_fresh(exported: str, source: str) -> bool:
+    return os.path.exists(exported) and os.path.getmtime(exported) >= os.path.getmtime(source)
+
+
+@contextmanager
+def _export_lock(out_path: str):
+    """Exclusive lock on `out_path` across processes (workers starting together export once)."""
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    with open(out_path + ".lock", "w") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _tmp_path(out_path: str, suffix: str = ".tmp") -> str:
+    """Per-process temp name next to `out_path`, so concurrent writers never share a file."""
+    return f"{out_path}.{os.getpid()}{suffix}"
+
+
+def _session(path: str):
+    opts = ort.SessionOptions()
+    opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    threads = int(os.environ.get("IMAGE_ONNX_THREADS", "0"))
+    if threads:
+        opts.intra_op_num_threads = threads
+    return ort.InferenceSession(path, sess_options=opts, providers=["CPUExecutionProvider"])
+
+
+class OnnxClassifier:
+    """
+    ONNX Runtime stand-in for an EfficientNet head.
+    Called like the torch module: takes an NCHW tensor, returns logits as a tensor.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.session = _session(path)
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, batch: torch.Tensor) -> torch.Tensor:
+        feed = {self.input_name: batch.detach().cpu().numpy().astype(np.float32, copy=False)}
+        return torch.from_numpy(self.session.run(None, feed)[0])
+
+
+def export_classifier(model: torch.nn.Module, out_path: str):
+    """Exports an eval-mode classifier with a dynamic batch axis and checks parity with PyTorch."""
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    model = model.cpu().eval()
+    dummy = torch.randn(2, *CLASSIFIER_INPUT)
+    tmp_path = _tmp_path(out_path)
+    # Use the TorchScript exporter on every torch version (newer releases default to dynamo)
+    export_kwargs = {}
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        export_kwargs["dynamo"] = False
+    torch.onnx.export(
+        model, dummy, tmp_path,
+        input_names=["images"], output_names=["logits"],
+        dynamic_axes={"images": {0: "batch"}, "logits": {0: "batch"}},
+        opset_version=OPSET,
+        **export_kwargs,
+    )
+
+    with torch.no_grad():
+        expected = torch.softmax(model(dummy), dim=1)
+    got = torch.softmax(OnnxClassifier(tmp_path)(dummy), dim=1)
+    diff = (expected - got).abs().max().item()
+    if diff > PARITY_ATOL:
+        os.remove(tmp_path)
+        raise RuntimeError(f"ONNX export of {out_path} diverges from PyTorch (max diff {diff:.2e})")
+    os.replace(tmp_path, out_path)
+    logger.info(f"Exported classifier to {out_path} (max softmax diff {diff:.2e})")
+
+
+def _localizer_parity(pt_path: str, onnx_path: str):
+    """
+    Compares the raw detection head of the PyTorch and ONNX localizers on the same
+    inputs. Returns (max class-score diff, max box-coordinate diff in pixels).
+    """
+    from ultralytics import YOLO
+
+    net = YOLO(pt_path).model.float().eval()
+    generator = torch.Generator().manual_seed(0)
+    dummy = torch.rand(2, 3, LOCALIZER_INPUT, LOCALIZER_INPUT, generator=generator)
+    with torch.no_grad():
+        expected = net(dummy)
+    expected = (expected[0] if isinstance(expected, (list, tuple)) else expected).numpy()
+    session = _session(onnx_path)
+    got = session.run(None, {session.get_inputs()[0].name: dummy.numpy()})[0]
+    if got.shape != expected.shape:
+        raise RuntimeError(f"ONNX localizer output shape {got.shape} != PyTorch {expected.shape}")
+    diff = np.abs(expected - got)
+    return float(diff[:, 4:].max()), float(diff[:, :4].max())
+
+
+def export_localizer(pt_path: str, out_path: str):
+    """
+    Exports the YOLO localizer with a dynamic batch axis so a claim still runs as one
+    batch, and checks its raw outputs against PyTorch before publishing it.
+    """
+    from ultralytics import YOLO
+
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    # ultralytics writes next to the weights it exports: work on a private copy
+    work_dir = tempfile.mkdtemp(prefix=f".export-{os.getpid()}-", dir=os.path.dirname(out_path))
+    try:
+        work_pt = os.path.join(work_dir, os.path.basename(pt_path))
+        shutil.copy2(pt_path, work_pt)
+        exported = str(YOLO(work_pt).export(format="onnx", dynamic=True, simplify=False, opset=OPSET))
+        score_diff, box_diff = _localizer_parity(pt_path, exported)
+        if score_diff > PARITY_ATOL or box_diff > LOCALIZER_BOX_ATOL:
+            raise RuntimeError(f"ONNX export of {out_path} diverges from PyTorch "
+                               f"(score diff {score_diff:.2e}, box diff {box_diff:.2e} px)")
+        os.replace(exported, out_path)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    logger.info(f"Exported localizer to {out_path} (max score diff {score_diff:.2e}, box diff {box_diff:.2e} px)")
+
+
+def load_localizer(pt_path: str, onnx_dir: str):
+    """ONNX localizer, exported first if needed; raises if the export does not match PyTorch."""
+    from ultralytics import YOLO
+
+    out_path = os.path.join(onnx_dir, os.path.splitext(os.path.basename(pt_path))[0] + ".onnx")
+    if not _is_fresh(out_path, pt_path):
+        with _export_lock(out_path):
+            # Another process may have exported it while we waited for the lock
+            if not _is_fresh(out_path, pt_path):
+                export_localizer(pt_path, out_path)
+    # ultralytics runs .onnx weights through ONNX Runtime with the same predict() API
+    return YOLO(out_path, task="detect")
+
+
+class _CalibrationReader:
+    """Feeds calibration batches to onnxruntime.quantization (CalibrationDataReader protocol)."""
+
+    def __init__(self, batches, input_name: str = "images"):
+        self._feeds = iter([{input_name: b.detach().cpu().numpy().astype(np.float32)} for b in batches])
+
+    def get_next(self):
+        return next(self._feeds, None)
+
+    def rewind(self):
+        pass
+
+
+def quantize_onnx_model(fp32_path: str, int8_path: str, calibration):
+    """
+    Static INT8 post-training quantization in QDQ format: per-channel int8 weights
+    and uint8 activations with ranges calibrated on `calibration` batches. ONNX
+    Runtime fuses the QDQ pairs into integer Conv/MatMul kernels. Dynamic
+    quantization is not used: its ConvInteger path is slower than fp32 on CPU.
+    """
+    from onnxruntime.quantization import quantize_static, QuantFormat, QuantType
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    if not calibration:
+        raise ValueError("static quantization needs calibration batches")
+    pre_path = _tmp_path(int8_path, ".pre.onnx")
+    tmp_path = _tmp_path(int8_path)
+    try:
+        quant_pre_process(fp32_path, pre_path)
+        quantize_static(pre_path, tmp_path, _CalibrationReader(calibration),
+                        quant_format=QuantFormat.QDQ, per_channel=True,
+                        activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+        os.replace(tmp_path, int8_path)
+    finally:
+        for leftover in (pre_path, tmp_path):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+    logger.info(f"Quantized {fp32_path} -> {int8_path} (static QDQ, {len(calibration)} calibration batches)")
+
+
+def load_classifier(weights_path: str, onnx_dir: str, build_torch_model, int8: bool = False,
+                    calibration=None) -> OnnxClassifier:
+    """
+    Returns an ONNX Runtime classifier for `weights_path`, exporting it first if the
+    cached .onnx is missing or older than the weights. `build_torch_model` is only
+    called when an export is needed. With `int8`, a statically quantized copy is
+    derived from the fp32 export and cached next to it; `calibration()` returns the
+    calibration batches and is only called when that copy has to be (re)built.
+    Without calibration data the fp32 model is returned.
+    """
+    out_path = os.path.join(onnx_dir, os.path.splitext(os.path.basename(weights_path))[0] + ".onnx")
+    if not _is_fresh(out_path, weights_path):
+        with _export_lock(out_path):
+            if not _is_fresh(out_path, weights_path):
+                export_classifier(build_torch_model(), out_path)
+    if int8:
+        int8_path = out_path[:-len(".onnx")] + ".int8.onnx"
+        if not _is_fresh(int8_path, out_path):
+            with _export_lock(int8_path):
+                if not _is_fresh(int8_path, out_path):
+                    batches = calibration() if calibration else []
+                    if not batches:
+                        logger.warning(f"No calibration images for {out_path}; using the fp32 model")
+                        return OnnxClassifier(out_path)
+                    quantize_onnx_model(out_path, int8_path, batches)
+        return OnnxClassifier(int8_path)
+    return OnnxClassifier(out_path)
@@ -3,13 +3,7 @@ import cv2
 import uuid
 import warnings
 
-# Try to import ultralytics; provide a fallback when not installed
-try:
-    from ultralytics import YOLO
-    _HAS_YOLO = True
-except Exception:
-    YOLO = None
-    _HAS_YOLO = False
+from .image_io import DecodedImage
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -18,24 +12,45 @@ YOLO_MODEL_PATH = os.path.join(BASE_DIR, "yolov8n.pt")
 UPLOAD_DIR = os.path.join(BASE_DIR, "temp_uploads")
 PROCESSED_DIR = os.path.join(BASE_DIR, "processed")
 
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-os.makedirs(PROCESSED_DIR, exist_ok=True)
 
-# Load YOLO once if available
+# Quality thresholds (also used by the upload-time quality gate, see quality.py)
+BLUR_THRESHOLD = 60
+DARK_THRESHOLD = 40
+
+# YOLO is loaded on first use (importing this module must stay cheap: the
+# quality gate imports it on every upload)
 yolo_model = None
-if _HAS_YOLO:
-    try:
-        yolo_model = YOLO(YOLO_MODEL_PATH)
-    except Exception:
-        warnings.warn("Failed to load YOLO model; falling back to simplified preprocessing.")
-        yolo_model = None
-
-def is_blurry(img):
+_yolo_loaded = False
+
+
+def _get_yolo():
+    """Loads the car detector once if ultralytics is installed; None otherwise."""
+    global yolo_model, _yolo_loaded
+    if not _yolo_loaded:
+        _yolo_loaded = True
+        try:
+            from ultralytics import YOLO
+            yolo_model = YOLO(YOLO_MODEL_PATH)
+        except Exception:
+            warnings.warn("Failed to load YOLO model; falling back to simplified preprocessing.")
+            yolo_model = None
+    return yolo_model
+
+
+def blur_score(img):
+    """Variance of the Laplacian of a BGR image; low values mean a blurry photo."""
     gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    return cv2.Laplacian(gray, cv2.CV_64F).var() < 60
+    return cv2.Laplacian(gray, cv2.CV_64F).var()
+
+def brightness(img):
+    """Mean pixel intensity (0-255)."""
+    return img.mean()
+
+def is_blurry(img, threshold=BLUR_THRESHOLD):
+    return blur_score(img) < threshold
 
-def is_dark(img):
-    return img.mean() < 40
+def is_dark(img, threshold=DARK_THRESHOLD):
+    return brightness(img) < threshold
 
 def _simple_crop_and_save(img, out_path, size=(224,224)):
     """Center-crop + resize fallback when YOLO is not available."""
@@ -50,13 +65,17 @@ def _simple_crop_and_save(img, out_path, size=(224,224)):
 
 def preprocess_images(image_paths):
     """
-    Takes list of image file paths
+    Takes list of image file paths (or already decoded DecodedImage objects)
     Returns list of processed (cropped) image paths
     """
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    os.makedirs(PROCESSED_DIR, exist_ok=True)
     processed_images = []
+    yolo_model = _get_yolo()
 
     for path in image_paths:
-        img = cv2.imread(path)
+        # Reuse an existing decode instead of reading the file again
+        img = path.bgr if isinstance(path, DecodedImage) else cv2.imread(path)
         if img is None:
             continue
 
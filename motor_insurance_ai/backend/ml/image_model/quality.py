@@ -0,0 +1,91 @@
+import os
+import logging
+import threading
+from typing import Any, Dict, List, Tuple
+
+from .image_io import DecodedImage, WORKING_MAX_SIDE
+from .preprocess import blur_score, brightness, BLUR_THRESHOLD, DARK_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+# Upload-time quality gate: blurry or dark photos are reported back to the
+# client right away and never reach the damage models.
+QUALITY_GATE = os.environ.get("IMAGE_QUALITY_GATE", "1") == "1"
+# The checks run on the pipeline's working resolution: the .work.jpg copy that
+# ingest writes for large uploads (or a draft-mode decode of the original), i.e.
+# what the damage models see, so the gate never needs a full-size decode.
+# Laplacian variance grows when an image is downscaled, so IMAGE_BLUR_THRESHOLD
+# applies at this size; recalibrate it (scripts/calibrate_quality_threshold.py)
+# when changing IMAGE_QUALITY_MAX_SIDE. 0 decodes at full size.
+QUALITY_MAX_SIDE = int(os.environ.get("IMAGE_QUALITY_MAX_SIDE", str(WORKING_MAX_SIDE)))
+QUALITY_BLUR_THRESHOLD = float(os.environ.get("IMAGE_BLUR_THRESHOLD", str(BLUR_THRESHOLD)))
+QUALITY_DARK_THRESHOLD = float(os.environ.get("IMAGE_DARK_THRESHOLD", str(DARK_THRESHOLD)))
+
+_lock = threading.Lock()
+_stats = {"checked": 0, "passed": 0, "blurry": 0, "dark": 0, "unreadable": 0}
+
+
+def assess_image(path: str) -> Dict[str, Any]:
+    """
+    Blur / darkness verdict for one upload:
+    {"filename", "passed", "blur_score", "brightness", "reasons"}.
+    An image that cannot be decoded fails with reason "unreadable".
+    """
+    verdict: Dict[str, Any] = {"filename": os.path.basename(path), "passed": True, "reasons": []}
+    if not QUALITY_GATE:
+        return verdict
+
+    try:
+        img = DecodedImage.open(path, max_side=QUALITY_MAX_SIDE).bgr
+        verdict["blur_score"] = round(float(blur_score(img)), 2)
+        verdict["brightness"] = round(float(brightness(img)), 2)
+    except Exception as e:
+        logger.warning(f"Quality check could not read {path}: {e}")
+        verdict["reasons"].append("unreadable")
+    else:
+        if verdict["blur_score"] < QUALITY_BLUR_THRESHOLD:
+            verdict["reasons"].append("blurry")
+        if verdict["brightness"] < QUALITY_DARK_THRESHOLD:
+            verdict["reasons"].append("dark")
+    verdict["passed"] = not verdict["reasons"]
+
+    with _lock:
+        _stats["checked"] += 1
+        _stats["passed"] += verdict["passed"]
+        for reason in verdict["reasons"]:
+            _stats[reason] += 1
+    return verdict
+
+
+def quality_gate(paths: List[str]) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """Returns (paths that passed, one verdict per input path in order)."""
+    verdicts = [assess_image(p) for p in paths]
+    return [p for p, v in zip(paths, verdicts) if v["passed"]], verdicts
+
+
+def no_usable_images_result(verdicts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Image result used instead of inference when every photo failed the gate."""
+    return {
+        "damage_detected": False,
+        "severity": "none",
+        "confidence": 0.0,
+        "evidence_strength": "NONE",
+        "damage_types": [],
+        "claimability": "Requires Review",
+        "final_insurance_reason": "No usable photos: all images failed the quality check",
+        "reasoning": ["All photos are too blurry or too dark; please retake them"],
+        "annotated_images": [],
+        "quality": verdicts,
+    }
+
+
+def quality_stats() -> Dict[str, Any]:
+    with _lock:
+        stats = dict(_stats)
+    stats.update({
+        "enabled": QUALITY_GATE,
+        "max_side": QUALITY_MAX_SIDE or "full",
+        "blur_threshold": QUALITY_BLUR_THRESHOLD,
+        "dark_threshold": QUALITY_DARK_THRESHOLD,
+    })
+    return stats
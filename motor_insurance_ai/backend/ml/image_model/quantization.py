@@ -0,0 +1,147 @@
+import os
+import time
+import logging
+import warnings
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+logger = logging.getLogger(__name__)
+
+# Sample photos or crops used to calibrate static INT8 activation ranges. Static
+# quantization cannot run without them, so IMAGE_CLASSIFIER_QUANTIZE=1 keeps the
+# fp32 classifiers when this is unset.
+CALIBRATION_DIR = os.environ.get("IMAGE_QUANTIZE_CALIBRATION_DIR")
+CALIBRATION_SAMPLES = int(os.environ.get("IMAGE_QUANTIZE_CALIBRATION_SAMPLES", "64"))
+CALIBRATION_BATCH = 16
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+def load_calibration_batches(transform: Callable, folder: str = None, limit: int = None) -> List[torch.Tensor]:
+    """Classifier input batches built from the images in `folder` (empty if there are none)."""
+    from PIL import Image
+
+    folder = folder or CALIBRATION_DIR
+    limit = limit or CALIBRATION_SAMPLES
+    if not folder or not os.path.isdir(folder):
+        return []
+    paths = sorted(os.path.join(folder, f) for f in os.listdir(folder) if f.lower().endswith(IMAGE_EXTS))[:limit]
+    tensors = []
+    for path in paths:
+        try:
+            with Image.open(path) as img:
+                tensors.append(transform(img.convert("RGB")))
+        except Exception as e:
+            logger.warning(f"Skipping calibration image {path}: {e}")
+    return [torch.stack(tensors[i:i + CALIBRATION_BATCH]) for i in range(0, len(tensors), CALIBRATION_BATCH)]
+
+
+def _quantized_engine() -> str:
+    engines = torch.backends.quantized.supported_engines
+    engine = "x86" if "x86" in engines else "qnnpack"
+    torch.backends.quantized.engine = engine
+    return engine
+
+
+def quantize_torch_classifier(model: nn.Module, calibration: List[torch.Tensor]) -> nn.Module:
+    """
+    Static INT8 post-training quantization (FX graph mode) of an EfficientNet
+    classifier, conv trunk included. Activation ranges are calibrated on
+    `calibration` batches. CPU only.
+    """
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+    if not calibration:
+        raise ValueError("static quantization needs calibration batches")
+    model = model.cpu().eval()
+    engine = _quantized_engine()
+    with warnings.catch_warnings(), torch.no_grad():
+        # FX graph mode is deprecated upstream in favour of torchao; it still ships with torch
+        warnings.simplefilter("ignore")
+        prepared = prepare_fx(model, get_default_qconfig_mapping(engine), (calibration[0][:1],))
+        for batch in calibration:
+            prepared(batch)
+        return convert_fx(prepared)
+
+
+def time_batch(model, batch: torch.Tensor, repeats: int = 5) -> float:
+    """Median ms of a full forward pass over `batch`, after one warm-up pass."""
+    timings = []
+    with torch.no_grad():
+        model(batch)
+        for _ in range(max(1, repeats)):
+            start = time.perf_counter()
+            model(batch)
+            timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings))
+
+
+def _softmax_outputs(model, batch: torch.Tensor):
+    with torch.no_grad():
+        return torch.softmax(model(batch), dim=1)
+
+
+def agreement_report(fp32_models, int8_models, batch: torch.Tensor,
+                     classes: List[str], threshold: float, repeats: int = 5) -> Dict[str, Any]:
+    """
+    Compares fp32 and INT8 (binary, severity) classifier pairs on the same crops:
+    label agreement, confidence deltas and the latency of both heads over the
+    whole batch (median of `repeats` after a warm-up pass).
+
+    Mirrors the live decision logic: a crop counts as damaged when P(damaged) > threshold,
+    and the severity label is the argmax of the severity head.
+    """
+    fp_bin, fp_sev = fp32_models
+    q_bin, q_sev = int8_models
+
+    outputs = {}
+    latency = {}
+    for name, (bin_model, sev_model) in (("fp32", (fp_bin, fp_sev)), ("int8", (q_bin, q_sev))):
+        outputs[name] = (_softmax_outputs(bin_model, batch), _softmax_outputs(sev_model, batch))
+        latency[name] = time_batch(bin_model, batch, repeats) + time_batch(sev_model, batch, repeats)
+
+    (fp_bin_p, fp_sev_p), (q_bin_p, q_sev_p) = outputs["fp32"], outputs["int8"]
+    fp_damaged = fp_bin_p[:, 0] > threshold
+    q_damaged = q_bin_p[:, 0] > threshold
+    fp_sev_conf, fp_sev_idx = fp_sev_p.max(dim=1)
+    q_sev_conf, q_sev_idx = q_sev_p.max(dim=1)
+
+    both_damaged = fp_damaged & q_damaged
+    sev_delta = (fp_sev_conf - q_sev_conf).abs()
+    bin_delta = (fp_bin_p[:, 0] - q_bin_p[:, 0]).abs()
+    n = len(batch)
+
+    disagreements = []
+    for i in range(n):
+        if fp_damaged[i] != q_damaged[i] or (both_damaged[i] and fp_sev_idx[i] != q_sev_idx[i]):
+            disagreements.append({
+                "crop": i,
+                "fp32": classes[fp_sev_idx[i]] if fp_damaged[i] else "not_damaged",
+                "int8": classes[q_sev_idx[i]] if q_damaged[i] else "not_damaged",
+            })
+
+    return {
+        "crops": n,
+        "binary_agreement": round(float((fp_damaged == q_damaged).float().mean()), 4) if n else None,
+        "severity_agreement": round(float((fp_sev_idx[both_damaged] == q_sev_idx[both_damaged]).float().mean()), 4)
+        if both_damaged.any() else None,
+        # Agreement of the final per-crop label (not_damaged or damage class)
+        "label_agreement": round(1 - len(disagreements) / n, 4) if n else None,
+        "binary_conf_delta": {"mean": round(float(bin_delta.mean()), 5), "max": round(float(bin_delta.max()), 5)} if n else None,
+        "severity_conf_delta": {"mean": round(float(sev_delta[both_damaged].mean()), 5),
+                                "p95": round(float(np.percentile(sev_delta[both_damaged].numpy(), 95)), 5),
+                                "max": round(float(sev_delta[both_damaged].max()), 5)}
+        if both_damaged.any() else None,
+        "latency_ms": {
+            "batch": n,
+            "fp32": round(latency["fp32"], 1),
+            "int8": round(latency["int8"], 1),
+            "speedup": round(latency["fp32"] / latency["int8"], 2) if latency["int8"] else None,
+        },
+        # INT8 only pays off if it is faster on this hardware; do not deploy a slowdown
+        "int8_faster": latency["int8"] < latency["fp32"],
+        "disagreements": disagreements,
+    }
@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_CHUNK = 1024 * 1024
+# The disk tier is pruned after this many writes (and when it grows past its cap)
+_PRUNE_EVERY = 256
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_CHUNK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class InferenceResultCache:
+    """
+    Two-tier cache of per-image inference results.
+
+    Keys are SHA-256(file bytes) + a model fingerprint, so re-uploads of the same
+    photo hit regardless of filename, and any model/threshold change misses.
+    Tier 1 is an in-process LRU; tier 2 is one JSON file per key under `cache_dir`
+    so entries survive restarts. The disk tier keeps at most `disk_max_entries`
+    files (oldest written are evicted first) and entries older than `ttl`
+    seconds are treated as misses and removed (0 disables either limit).
+    """
+
+    def __init__(self, cache_dir: str, max_entries: int = 512, disk_max_entries: int = 0, ttl: float = 0):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.disk_max_entries = disk_max_entries
+        self.ttl = ttl
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_entries = None  # estimate, refreshed by every prune
+        self._puts_since_prune = 0
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def key_for(self, path: str, fingerprint: str) -> Optional[str]:
+        try:
+            return hashlib.sha256(f"{file_sha256(path)}:{fingerprint}".encode()).hexdigest()
+        except OSError:
+            return None
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _remember(self, key: str, value: Dict[str, Any]):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return value
+
+        try:
+            path = self._disk_path(key)
+            if self.ttl and time.time() - os.path.getmtime(path) > self.ttl:
+                self._remove(path)
+                raise FileNotFoundError(path)
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+        except FileNotFoundError:
+            value = None
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable cache entry {key}: {e}")
+            value = None
+
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key, value)
+        return value
+
+    def put(self, key: str, value: Dict[str, Any]):
+        with self._lock:
+            self._remember(key, value)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{self._disk_path(key)}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(value, f)
+            # Atomic publish so concurrent readers never see a partial file
+            os.replace(tmp_path, self._disk_path(key))
+        except Exception as e:
+            logger.warning(f"Failed to persist cache entry {key}: {e}")
+            return
+
+        with self._lock:
+            if self._disk_entries is not None:
+                self._disk_entries += 1
+            self._puts_since_prune += 1
+            due = (self._disk_entries is None or self._puts_since_prune >= _PRUNE_EVERY
+                   or (self.disk_max_entries and self._disk_entries > self.disk_max_entries))
+            if due:
+                self._puts_since_prune = 0
+        if due and (self.disk_max_entries or self.ttl):
+            self.prune()
+
+    def _remove(self, path: str) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False  # already removed by another worker
+        except OSError as e:
+            logger.warning(f"Could not evict cache entry {path}: {e}")
+            return False
+
+    def prune(self):
+        """Drops expired disk entries, then the oldest ones beyond disk_max_entries."""
+        try:
+            entries = []
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    if entry.name.endswith(".json"):
+                        try:
+                            entries.append((entry.stat().st_mtime, entry.path))
+                        except FileNotFoundError:
+                            continue
+        except FileNotFoundError:
+            return
+
+        removed = 0
+        if self.ttl:
+            cutoff = time.time() - self.ttl
+            keep = []
+            for mtime, path in entries:
+                if mtime < cutoff:
+                    removed += self._remove(path)
+                else:
+                    keep.append((mtime, path))
+            entries = keep
+        if self.disk_max_entries and len(entries) > self.disk_max_entries:
+            entries.sort()
+            excess = len(entries) - self.disk_max_entries
+            for _, path in entries[:excess]:
+                removed += self._remove(path)
+            entries = entries[excess:]
+
+        with self._lock:
+            self._disk_entries = len(entries)
+            self.evicted += removed
+        if removed:
+            logger.info(f"Evicted {removed} inference cache entries from {self.cache_dir}")
@@ -0,0 +1,100 @@
+import time
+import bisect
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict
+
+# Upper bucket edges (ms) of the process-level stage histograms; the last bucket is open
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+class StageTimer:
+    """
+    Wall-clock time and counts for the stages of one inference pass.
+    A stage entered several times (e.g. one YOLO call per chunk) accumulates.
+    """
+
+    def __init__(self):
+        self.stages_ms: Dict[str, float] = defaultdict(float)
+        self.counts: Dict[str, int] = defaultdict(int)
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages_ms[name] += (time.perf_counter() - start) * 1000
+
+    def count(self, name: str, n: int = 1):
+        self.counts[name] += n
+
+    def merge(self, other: "StageTimer"):
+        for name, ms in other.stages_ms.items():
+            self.stages_ms[name] += ms
+        for name, n in other.counts.items():
+            self.counts[name] += n
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "stages_ms": {name: round(ms, 2) for name, ms in self.stages_ms.items()},
+            "total_ms": round(sum(self.stages_ms.values()), 2),
+            "counts": dict(self.counts),
+        }
+
+
+class StageHistograms:
+    """Process-level latency histograms per stage, plus running totals of the counts."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, list] = {}
+        self._totals_ms: Dict[str, float] = defaultdict(float)
+        self._samples: Dict[str, int] = defaultdict(int)
+        self._counts: Dict[str, int] = defaultdict(int)
+
+    def observe(self, stage: str, ms: float):
+        with self._lock:
+            buckets = self._buckets.setdefault(stage, [0] * (len(BUCKETS_MS) + 1))
+            buckets[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+            self._totals_ms[stage] += ms
+            self._samples[stage] += 1
+
+    def record(self, timer: StageTimer):
+        for name, ms in timer.stages_ms.items():
+            self.observe(name, ms)
+        with self._lock:
+            for name, n in timer.counts.items():
+                self._counts[name] += n
+
+    def _quantile(self, buckets: list, q: float) -> float:
+        """Upper edge of the bucket holding the q-quantile (None for the open bucket)."""
+        target = q * sum(buckets)
+        seen = 0
+        for i, n in enumerate(buckets):
+            seen += n
+            if seen >= target and n:
+                return BUCKETS_MS[i] if i < len(BUCKETS_MS) else None
+        return 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stages = {}
+            for stage, buckets in self._buckets.items():
+                samples = self._samples[stage]
+                stages[stage] = {
+                    "samples": samples,
+                    "mean_ms": round(self._totals_ms[stage] / samples, 2),
+                    "p50_ms_le": self._quantile(buckets, 0.5),
+                    "p95_ms_le": self._quantile(buckets, 0.95),
+                    # "<=edge" -> samples; the last key holds everything slower
+                    "histogram": {
+                        (f"<={BUCKETS_MS[i]}" if i < len(BUCKETS_MS) else f">{BUCKETS_MS[-1]}"): n
+                        for i, n in enumerate(buckets) if n
+                    },
+                }
+            return {"stages": stages, "counts": dict(self._counts)}
+
+
+histograms = StageHistograms()
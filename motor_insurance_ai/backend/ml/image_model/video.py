@@ -0,0 +1,197 @@
+import os
+import logging
+from typing import Any, Dict, List
+
+import cv2
+import numpy as np
+
+from .annotate import annotated_url
+from .image_io import WORKING_MAX_SIDE
+from .preprocess import blur_score, brightness
+from .quality import QUALITY_MAX_SIDE, QUALITY_BLUR_THRESHOLD, QUALITY_DARK_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+# Walk-around videos are reduced to a few keyframes that go through the normal
+# image pipeline as one claim. Frames are decoded in a single streamed pass:
+# only the sharpest frame of the current scene is held in memory.
+VIDEO_MAX_FRAMES = int(os.environ.get("IMAGE_VIDEO_MAX_FRAMES", "8"))
+# Frames per second that are actually decoded and scored; the others are only grabbed
+VIDEO_SAMPLE_FPS = float(os.environ.get("IMAGE_VIDEO_SAMPLE_FPS", "4"))
+VIDEO_MAX_SECONDS = float(os.environ.get("IMAGE_VIDEO_MAX_SECONDS", "60"))
+# Mean absolute difference (0-255) of 32x32 grayscale thumbnails: above the scene
+# threshold a new scene starts, below the duplicate threshold a keyframe is dropped
+VIDEO_SCENE_THRESHOLD = float(os.environ.get("IMAGE_VIDEO_SCENE_THRESHOLD", "18"))
+VIDEO_DUP_THRESHOLD = float(os.environ.get("IMAGE_VIDEO_DUP_THRESHOLD", "8"))
+# Uploads larger than this are rejected (413) while they are being written
+VIDEO_MAX_BYTES = int(os.environ.get("IMAGE_VIDEO_MAX_BYTES", str(200 * 1024 * 1024)))
+
+_THUMB_SIZE = (32, 32)
+
+
+class VideoError(ValueError):
+    """The upload could not be decoded as a video."""
+
+
+def _resize_max_side(frame: np.ndarray, max_side: int) -> np.ndarray:
+    h, w = frame.shape[:2]
+    if max(h, w) <= max_side:
+        return frame
+    scale = max_side / max(h, w)
+    return cv2.resize(frame, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+
+
+def _thumbnail(frame: np.ndarray) -> np.ndarray:
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(gray, _THUMB_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32)
+
+
+def _difference(a: np.ndarray, b: np.ndarray) -> float:
+    return float(np.abs(a - b).mean())
+
+
+def extract_keyframes(video_path: str, out_dir: str,
+                      max_frames: int = VIDEO_MAX_FRAMES) -> Dict[str, Any]:
+    """
+    Streams through a video and writes up to max_frames keyframes as JPEGs.
+
+    A scene starts at the first sampled frame and ends when the picture has
+    changed by more than VIDEO_SCENE_THRESHOLD; the sharpest usable frame of
+    each scene is a candidate. Candidates that are too blurry or dark for the
+    quality gate, or near-duplicates of the previous keyframe, are dropped.
+    If more than max_frames remain, they are thinned evenly over the timeline.
+
+    Returns {"frames": [{"path", "timestamp_s", "blur_score", "brightness"}],
+    "duration_s", "frames_decoded", "frames_scored", "scenes", "truncated"}.
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise VideoError("Could not open video")
+
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        if not 0 < fps < 1000:
+            fps = 30.0
+        step = max(1, int(round(fps / VIDEO_SAMPLE_FPS))) if VIDEO_SAMPLE_FPS > 0 else 1
+        max_index = int(VIDEO_MAX_SECONDS * fps) if VIDEO_MAX_SECONDS > 0 else None
+        base = os.path.splitext(os.path.basename(video_path))[0]
+
+        candidates: List[Dict[str, Any]] = []
+        scene_anchor = None
+        scene_best = None
+        scenes = 0
+        index = scored = 0
+        truncated = False
+
+        def close_scene():
+            # Write the scene's sharpest frame to disk so at most one frame is in memory
+            if scene_best is None:
+                return
+            if scene_best["blur_score"] < QUALITY_BLUR_THRESHOLD or scene_best["brightness"] < QUALITY_DARK_THRESHOLD:
+                return
+            if candidates and _difference(candidates[-1]["thumb"], scene_best["thumb"]) < VIDEO_DUP_THRESHOLD:
+                if scene_best["blur_score"] <= candidates[-1]["blur_score"]:
+                    return
+                # Same view, sharper frame: replace the previous keyframe
+                os.remove(candidates.pop()["path"])
+            path = os.path.join(out_dir, f"{base}_t{scene_best['timestamp_s']:07.2f}s.jpg")
+            cv2.imwrite(path, scene_best.pop("frame"), [cv2.IMWRITE_JPEG_QUALITY, 90])
+            scene_best["path"] = path
+            candidates.append(scene_best)
+
+        while True:
+            if max_index is not None and index >= max_index:
+                truncated = cap.grab()
+                break
+            # grab() demuxes/decodes without the colour conversion; only sampled frames are retrieved
+            if not cap.grab():
+                break
+            if index % step:
+                index += 1
+                continue
+            ok, frame = cap.retrieve()
+            if not ok or frame is None:
+                index += 1
+                continue
+
+            # Keyframes are saved at the image pipeline's working resolution
+            if WORKING_MAX_SIDE:
+                frame = _resize_max_side(frame, WORKING_MAX_SIDE)
+            # Same decode size as the upload quality gate, so the thresholds mean the same
+            small = _resize_max_side(frame, QUALITY_MAX_SIDE) if QUALITY_MAX_SIDE else frame
+            thumb = _thumbnail(small)
+            sample = {
+                "timestamp_s": round(index / fps, 2),
+                "blur_score": round(float(blur_score(small)), 2),
+                "brightness": round(float(brightness(small)), 2),
+                "thumb": thumb,
+            }
+            scored += 1
+
+            if scene_anchor is None or _difference(scene_anchor, thumb) > VIDEO_SCENE_THRESHOLD:
+                close_scene()
+                scene_anchor, scene_best = thumb, None
+                scenes += 1
+            if scene_best is None or sample["blur_score"] > scene_best["blur_score"]:
+                sample["frame"] = frame
+                scene_best = sample
+            index += 1
+        close_scene()
+    finally:
+        cap.release()
+
+    selected = _select(candidates, max_frames)
+    kept = {id(c) for c in selected}
+    for c in candidates:
+        if id(c) not in kept:
+            os.remove(c["path"])
+
+    return {
+        "frames": [{k: c[k] for k in ("path", "timestamp_s", "blur_score", "brightness")} for c in selected],
+        "duration_s": round(index / fps, 2),
+        "frames_decoded": index,
+        "frames_scored": scored,
+        "scenes": scenes,
+        "truncated": truncated,
+    }
+
+
+def _select(candidates: List[Dict[str, Any]], max_frames: int) -> List[Dict[str, Any]]:
+    """
+    Spreads the cap over the whole walk-around: the timeline of candidates is cut
+    into max_frames equal slices and the candidate nearest each slice centre is kept
+    (every candidate already passed the sharpness / brightness checks).
+    """
+    if len(candidates) <= max_frames:
+        return candidates
+    start, end = candidates[0]["timestamp_s"], candidates[-1]["timestamp_s"]
+    width = (end - start) / max_frames or 1.0
+    best = {}
+    for c in candidates:
+        slot = min(int((c["timestamp_s"] - start) / width), max_frames - 1)
+        centre = start + (slot + 0.5) * width
+        if slot not in best or abs(c["timestamp_s"] - centre) < abs(best[slot]["timestamp_s"] - centre):
+            best[slot] = c
+    return [best[slot] for slot in sorted(best)]
+
+
+def attach_frame_findings(result: Dict[str, Any], frames: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Adds `video.frames` (timestamp, has_findings, annotated URL) to a claim-level image result."""
+    damaged = set(result.get("annotated_images") or [])
+    report = []
+    for f in frames:
+        url = annotated_url(f["path"])
+        entry = {
+            "filename": os.path.basename(f["path"]),
+            "timestamp_s": f["timestamp_s"],
+            "blur_score": f["blur_score"],
+            "brightness": f["brightness"],
+            "has_findings": url in damaged,
+        }
+        if url in damaged:
+            entry["annotated_image"] = url
+        report.append(entry)
+    video = result.setdefault("video", {})
+    video["frames"] = report
+    video["finding_timestamps_s"] = [f["timestamp_s"] for f in report if f["has_findings"]]
+    return result
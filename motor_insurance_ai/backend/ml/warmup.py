@@ -0,0 +1,168 @@
+"""
+Startup warm-up of every model the claim path uses, and the readiness state behind GET /ready.
+
+Each component goes pending -> loading -> ready | failed (or skipped when it
+is not configured, e.g. no FAISS index on disk). Warm-up loads the model and
+runs one dummy call through it, so the first real claim on a fresh worker is
+served from hot models. With ML_EXECUTION_MODE=process the image models are
+warmed inside every worker process instead of the API process.
+"""
+import os
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+COMPONENTS = ("survey_model", "image_models", "sentence_transformer", "faiss_index")
+
+_lock = threading.Lock()
+_state: Dict[str, Dict[str, Any]] = {name: {"state": "pending"} for name in COMPONENTS}
+_warmup = {"enabled": False, "started_at": None, "finished_at": None, "api_import_ms": None}
+
+
+def _set(name: str, **fields):
+    with _lock:
+        _state[name].update(fields)
+
+
+def _run_step(name: str, step: Callable[[], Dict[str, Any]]):
+    _set(name, state="loading")
+    start = time.perf_counter()
+    try:
+        details = step() or {}
+    except Exception as e:
+        logger.error(f"Warm-up of {name} failed: {e}")
+        _set(name, state="failed", error=str(e), total_ms=round((time.perf_counter() - start) * 1000, 1))
+        return
+    state = details.pop("state", "ready")
+    _set(name, state=state, total_ms=round((time.perf_counter() - start) * 1000, 1), **details)
+    logger.info(f"Warm-up of {name}: {state} in {_state[name]['total_ms']:.0f} ms")
+
+
+def warm_image_models() -> Dict[str, Any]:
+    """Loads and warms the image models in the calling process (API process or ML worker)."""
+    from ml.image_model.inference import model_instance
+    return dict(model_instance.warm_up(), backend=model_instance.backend, pid=os.getpid())
+
+
+def _warm_survey():
+    from ml.Claim_model.predict import _load_pipeline
+    if _load_pipeline() is None:
+        raise RuntimeError("claim approval pipeline could not be loaded")
+
+
+def _warm_images():
+    from ml.executor import ML_EXECUTION_MODE, warm_workers
+    if ML_EXECUTION_MODE == "process":
+        workers = warm_workers(warm_image_models)
+        return {"mode": "process", "workers": workers}
+    return warm_image_models()
+
+
+def _warm_encoder():
+    from rag import retrieve
+    start = time.perf_counter()
+    model = retrieve.load_model()
+    load_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    model.encode(["vehicle damaged in a road accident"])
+    return {"load_ms": round(load_ms, 1), "encode_ms": round((time.perf_counter() - start) * 1000, 1)}
+
+
+def _warm_index():
+    from rag import retrieve
+    start = time.perf_counter()
+    retrieve.load_index()
+    load_ms = (time.perf_counter() - start) * 1000
+    if retrieve._index is None and retrieve._hnsw_index is None:
+        return {"state": "skipped", "load_ms": round(load_ms, 1),
+                "reason": "no vector index on disk; brute-force search is used"}
+    clause = retrieve.clauses[0]
+    start = time.perf_counter()
+    retrieve.retrieve_clauses("claim rejected after accident", clause["company"], clause["policy_type"])
+    return {"load_ms": round(load_ms, 1), "search_ms": round((time.perf_counter() - start) * 1000, 1)}
+
+
+def preload_models() -> Dict[str, float]:
+    """
+    Preload-before-fork (PRELOAD_MODELS=1 with `gunicorn --preload`): loads every model
+    in the master process so forked workers inherit the weights copy-on-write.
+
+    Loads only - no forward pass - because forking after torch has started its
+    OpenMP thread pool can deadlock the children; each worker still runs the usual
+    warm-up after the fork. Image models are skipped in ML_EXECUTION_MODE=process,
+    whose spawned workers load their own.
+    """
+    import gc
+    from ml.executor import ML_EXECUTION_MODE
+
+    timings = {}
+
+    def timed(name, fn):
+        start = time.perf_counter()
+        try:
+            fn()
+            timings[name] = round((time.perf_counter() - start) * 1000, 1)
+        except Exception as e:
+            logger.warning(f"Preload of {name} failed; it will load in each worker: {e}")
+
+    from ml.Claim_model.predict import _load_pipeline
+    timed("survey_model", _load_pipeline)
+    if ML_EXECUTION_MODE != "process":
+        from ml.image_model.inference import model_instance
+        timed("image_models", model_instance.preload)
+    from rag import retrieve
+    timed("sentence_transformer", retrieve.load_model)
+    timed("faiss_index", retrieve.load_index)
+
+    # Keep the collector from touching (and so un-sharing) every preloaded object in the workers
+    gc.collect()
+    gc.freeze()
+    logger.info(f"Preloaded models before fork: {timings}")
+    return timings
+
+
+def record_import_time(ms: float):
+    """Time the API process spent importing its modules (reported by /ready)."""
+    with _lock:
+        _warmup["api_import_ms"] = round(ms, 1)
+
+
+def warm_all():
+    """Warms every component in turn. Safe to call from a background thread."""
+    with _lock:
+        _warmup.update(enabled=True, started_at=time.time(), finished_at=None)
+    _run_step("survey_model", _warm_survey)
+    _run_step("image_models", _warm_images)
+    _run_step("sentence_transformer", _warm_encoder)
+    _run_step("faiss_index", _warm_index)
+    with _lock:
+        _warmup["finished_at"] = time.time()
+
+
+def start_background_warmup() -> threading.Thread:
+    thread = threading.Thread(target=warm_all, name="model-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def readiness() -> Dict[str, Any]:
+    """
+    Per-component load state and warm-up timings. `ready` is true once every
+    component is ready or skipped; with warm-up disabled models load lazily and
+    the worker always reports ready.
+    """
+    with _lock:
+        components = {name: dict(fields) for name, fields in _state.items()}
+        warmup = dict(_warmup)
+    if warmup["enabled"]:
+        ready = all(c["state"] in ("ready", "skipped") for c in components.values())
+    else:
+        ready = True
+        for c in components.values():
+            c["state"] = "lazy"
+    if warmup["started_at"] and warmup["finished_at"]:
+        warmup["duration_s"] = round(warmup["finished_at"] - warmup["started_at"], 2)
+    return {"ready": ready, "warmup": warmup, "components": components}
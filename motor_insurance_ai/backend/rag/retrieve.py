@@ -1,21 +1,12 @@
 import json
 import os
+import threading
+import importlib.util
 import numpy as np
 
-# Vector backends
-try:
-    import faiss
-    _HAS_FAISS = True
-except Exception:
-    _HAS_FAISS = False
-
-try:
-    import hnswlib
-    _HAS_HNSW = True
-except Exception:
-    _HAS_HNSW = False
-
-from sentence_transformers import SentenceTransformer
+# Vector backends (availability only; the modules are imported on first use)
+_HAS_FAISS = importlib.util.find_spec("faiss") is not None
+_HAS_HNSW = importlib.util.find_spec("hnswlib") is not None
 
 # ================= PATHS (SAFE) =================
 
@@ -51,35 +42,55 @@ SUPPORT_CONTEXT_KEYWORDS = [
     "intimation", "accident"
 ]
 
-# ================= LOAD METADATA & EMBEDDINGS =================
-
-with open(META_PATH, "r", encoding="utf-8") as f:
-    clauses = json.load(f)
-
-embeddings = np.load(EMB_PATH)
+# ================= LAZY STATE =================
+# Metadata, embeddings, the vector index and the SentenceTransformer are all
+# loaded on first use (or by the startup warm-up), not at import time.
 
-# Lazy load variable
+clauses = None
+embeddings = None
 model = None
+_index = None
+_hnsw_index = None
+_load_lock = threading.Lock()
+
 
 def load_model():
     global model
     if model is None:
-        print("Loading SentenceTransformer model...")
-        model = SentenceTransformer("all-MiniLM-L6-v2")
-        print("Model loaded.")
+        with _load_lock:
+            if model is None:
+                from sentence_transformers import SentenceTransformer
+                print("Loading SentenceTransformer model...")
+                model = SentenceTransformer("all-MiniLM-L6-v2")
+                print("Model loaded.")
     return model
 
-# ================= LOAD INDEX =================
-
-_index = None
-_hnsw_index = None
-
-if _HAS_FAISS and os.path.exists(FAISS_PATH):
-    _index = faiss.read_index(FAISS_PATH)
-
-elif _HAS_HNSW and os.path.exists(HNSW_PATH):
-    _hnsw_index = hnswlib.Index(space="l2", dim=embeddings.shape[1])
-    _hnsw_index.load_index(HNSW_PATH)
+# ================= LOAD METADATA, EMBEDDINGS & INDEX =================
+
+def load_index():
+    """Reads clause metadata, embeddings and the FAISS / HNSW index once."""
+    global clauses, embeddings, _index, _hnsw_index
+    if clauses is not None:
+        return
+    with _load_lock:
+        if clauses is not None:
+            return
+        with open(META_PATH, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        emb = np.load(EMB_PATH)
+
+        if _HAS_FAISS and os.path.exists(FAISS_PATH):
+            import faiss
+            _index = faiss.read_index(FAISS_PATH)
+
+        elif _HAS_HNSW and os.path.exists(HNSW_PATH):
+            import hnswlib
+            _hnsw_index = hnswlib.Index(space="l2", dim=emb.shape[1])
+            _hnsw_index.load_index(HNSW_PATH)
+
+        # Published last: `clauses is not None` means everything is loaded
+        embeddings = emb
+        clauses = meta
 
 # ================= HELPERS (UNCHANGED LOGIC) =================
 
@@ -138,7 +149,14 @@ def filter_supporting_context(secondary):
 
 # ================= RETRIEVAL =================
 
-def retrieve_clauses(query, company, policy_type, top_k=15):
+def encode_queries(queries, batch_size=64):
+    """Embeds many retrieval queries in one batched encoder call (bulk ingestion)."""
+    return load_model().encode(list(queries), batch_size=batch_size).astype("float32")
+
+def retrieve_clauses(query, company, policy_type, top_k=15, query_vec=None):
+    # query_vec: precomputed embedding of `query` (see encode_queries)
+    load_index()
+
     # 1. Exact Match
     valid_indices = [
         i for i, c in enumerate(clauses)
@@ -164,12 +182,13 @@ def retrieve_clauses(query, company, policy_type, top_k=15):
         return []
 
     vectors = embeddings[valid_indices]
-    if model is None:
-        load_model()
-    
-    query_vec = model.encode([query]).astype("float32")
+    if query_vec is None:
+        query_vec = load_model().encode([query]).astype("float32")
+    else:
+        query_vec = np.asarray(query_vec, dtype="float32").reshape(1, -1)
 
     if _index:
+        import faiss
         sub = faiss.IndexFlatL2(vectors.shape[1])
         sub.add(vectors)
         _, idxs = sub.search(query_vec, min(top_k, len(valid_indices)))
@@ -179,10 +198,10 @@ def retrieve_clauses(query, company, policy_type, top_k=15):
     idxs = np.argsort(dists)[:top_k]
     return [format_clause(clauses[valid_indices[i]]) for i in idxs]
 
-def get_reason_aware_clauses(query, company, policy_type):
+def get_reason_aware_clauses(query, company, policy_type, query_vec=None):
     detected = detect_rejection_reasons(query)
 
-    insurer_results = retrieve_clauses(query, company, policy_type)
+    insurer_results = retrieve_clauses(query, company, policy_type, query_vec=query_vec)
     primary, secondary = prioritize_by_reason(insurer_results, detected, query)
 
     # Increase limits
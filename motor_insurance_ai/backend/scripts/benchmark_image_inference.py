@@ -0,0 +1,303 @@
+"""
+Offline benchmark for run_image_inference.
+
+Generates synthetic claim photos at several resolutions and measures latency,
+throughput and peak RSS for 1/2/5/10-image claims across YOLO / classifier
+batch sizes and torch thread counts. Needs no network: when the weights in
+ml/image_model/models/ are missing (or with --random-weights) randomly
+initialised models with the production architectures are written to a
+scratch folder and used instead. A random localizer finds nothing, so
+--synthetic-boxes fixed boxes per image are injected after its forward pass
+to keep the classifier stages busy. Compare runs made with the same weights
+and settings only.
+
+The result cache is disabled so every repeat runs the full model stack.
+
+Usage:
+    python scripts/benchmark_image_inference.py --out bench.json
+    python scripts/benchmark_image_inference.py --claim-sizes 1,5 --threads 1,4 --yolo-batch-sizes 1,10 --repeats 5
+"""
+import sys
+import os
+import gc
+import json
+import time
+import shutil
+import platform
+import argparse
+import resource
+import tempfile
+import threading
+import statistics
+
+# Add backend directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+DEFAULT_MODELS_DIR = os.path.join(os.path.dirname(__file__), "..", "ml", "image_model", "models")
+MODEL_FILES = ("damage_localizer.pt", "damage_binary_effnet.pth", "damage_severity_effnet.pth")
+
+
+def int_list(value):
+    return [int(v) for v in value.split(",") if v]
+
+
+def parse_resolutions(value):
+    return [tuple(int(x) for x in r.lower().split("x")) for r in value.split(",") if r]
+
+
+def write_random_weights(models_dir):
+    """Random-init models with the production architectures (no download)."""
+    import torch
+    import torch.nn as nn
+    from torchvision.models import efficientnet_b0
+    from ultralytics import YOLO
+
+    torch.manual_seed(0)
+    os.makedirs(models_dir, exist_ok=True)
+    for name, num_classes in (("damage_binary_effnet.pth", 2), ("damage_severity_effnet.pth", 6)):
+        model = efficientnet_b0(weights=None)
+        model.classifier[1] = nn.Linear(model.classifier[1].in_features, num_classes)
+        torch.save(model.state_dict(), os.path.join(models_dir, name))
+    # Built from the packaged yolov8n config, so nothing is downloaded
+    YOLO("yolov8n.yaml").save(os.path.join(models_dir, "damage_localizer.pt"))
+
+
+class SyntheticBoxes:
+    """
+    Wraps the localizer: runs the real YOLO forward pass, then replaces its (empty,
+    with random weights) output by `n` fixed boxes per image so the crop, binary and
+    severity stages do representative work.
+    """
+
+    def __init__(self, yolo, n):
+        self.yolo = yolo
+        self.n = n
+
+    def __call__(self, sources, **kwargs):
+        import torch
+        results = self.yolo(sources, **kwargs)
+        for r, src in zip(results, sources):
+            h, w = src.shape[:2]
+            boxes = []
+            for i in range(self.n):
+                # Non-overlapping boxes along the diagonal, ~1/6 of the image each
+                x1, y1 = w * (0.05 + 0.9 * i / self.n), h * (0.05 + 0.9 * i / self.n)
+                boxes.append([x1, y1, x1 + w / 6, y1 + h / 6, 0.9, 0.0])
+            r.update(boxes=torch.tensor(boxes, dtype=torch.float32).reshape(-1, 6))
+        return results
+
+    def __getattr__(self, name):
+        return getattr(self.yolo, name)
+
+
+def make_synthetic_images(out_dir, resolutions, per_resolution, seed=0):
+    """Car-photo-like JPEGs: smooth gradient background with a few high-contrast blobs."""
+    rng = np.random.default_rng(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    images = {}
+    for width, height in resolutions:
+        paths = []
+        for i in range(per_resolution):
+            x = np.linspace(0, 1, width, dtype=np.float32)[None, :, None]
+            y = np.linspace(0, 1, height, dtype=np.float32)[:, None, None]
+            base = rng.uniform(40, 200, size=3).astype(np.float32)
+            pixels = base + 50 * x + 30 * y + rng.normal(0, 6, size=(height, width, 3)).astype(np.float32)
+            img = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+            draw = ImageDraw.Draw(img)
+            for _ in range(int(rng.integers(2, 6))):
+                cx, cy = rng.uniform(0.1, 0.9) * width, rng.uniform(0.1, 0.9) * height
+                r = rng.uniform(0.03, 0.12) * min(width, height)
+                draw.ellipse([cx - r, cy - r / 2, cx + r, cy + r / 2], fill=tuple(int(v) for v in rng.integers(0, 255, 3)))
+            path = os.path.join(out_dir, f"synthetic_{width}x{height}_{i}.jpg")
+            img.save(path, "JPEG", quality=90)
+            paths.append(path)
+        images[(width, height)] = paths
+    return images
+
+
+def current_rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        return None
+
+
+class PeakRSS:
+    """Samples RSS in a background thread; falls back to the process-lifetime ru_maxrss."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        if current_rss_mb() is not None:
+            self.peak = current_rss_mb()
+            self._thread = threading.Thread(target=self._sample, daemon=True)
+            self._thread.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss_mb())
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self.peak = max(self.peak, current_rss_mb())
+        else:
+            # ru_maxrss is KiB on Linux, bytes on macOS
+            scale = 2 ** 20 if sys.platform == "darwin" else 2 ** 10
+            self.peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else None
+
+
+def checked_inference(run_image_inference, claim):
+    """run_image_inference reports failures in the result; abort instead of timing them."""
+    result = run_image_inference(claim)
+    if result.get("error"):
+        sys.exit(f"Inference failed, aborting the benchmark: {result['error']}")
+    return result
+
+
+def run_case(run_image_inference, claim, repeats, warmup):
+    for _ in range(warmup):
+        checked_inference(run_image_inference, claim)
+    latencies = []
+    boxes = crops = 0
+    with PeakRSS() as rss:
+        start = time.perf_counter()
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            result = checked_inference(run_image_inference, claim)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            counts = result.get("details", {}).get("timings", {}).get("counts", {})
+            boxes, crops = counts.get("boxes", 0), counts.get("crops_classified", 0)
+        wall = time.perf_counter() - start
+    return {
+        "latency_ms": {
+            "mean": round(statistics.mean(latencies), 2),
+            "p50": round(percentile(latencies, 50), 2),
+            "p95": round(percentile(latencies, 95), 2),
+            "min": round(min(latencies), 2),
+            "max": round(max(latencies), 2),
+        },
+        "throughput_images_per_s": round(repeats * len(claim) / wall, 2),
+        "throughput_claims_per_s": round(repeats / wall, 3),
+        "peak_rss_mb": round(rss.peak, 1),
+        # From the last repeat; shows how much classifier work the weights produced
+        "boxes": boxes,
+        "crops_classified": crops,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--resolutions", default="640x480,1280x960,4032x3024", type=parse_resolutions,
+                        help="Comma-separated WxH of the synthetic photos")
+    parser.add_argument("--claim-sizes", default="1,2,5,10", type=int_list)
+    parser.add_argument("--yolo-batch-sizes", default="10", type=int_list, help="IMAGE_YOLO_BATCH_SIZE values")
+    parser.add_argument("--classifier-batch-sizes", default="32", type=int_list, help="IMAGE_CLASSIFIER_BATCH_SIZE values")
+    parser.add_argument("--threads", default=str(os.cpu_count() or 1), type=int_list, help="torch intra-op thread counts")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--random-weights", action="store_true",
+                        help="Use random-init models even if trained weights are present")
+    parser.add_argument("--synthetic-boxes", type=int, default=4,
+                        help="Boxes per image injected after YOLO when using random weights (0 = keep YOLO output)")
+    parser.add_argument("--models-dir", help="Weights folder (default: ml/image_model/models or IMAGE_MODELS_DIR)")
+    parser.add_argument("--no-ingest", action="store_true",
+                        help="Skip the upload-time working copy, so every call decodes the full-size file")
+    parser.add_argument("--keep-workdir", action="store_true", help="Keep the synthetic images / random weights")
+    parser.add_argument("--out", help="Write the JSON report here as well")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="image_bench_")
+    models_dir = args.models_dir or os.environ.get("IMAGE_MODELS_DIR") or DEFAULT_MODELS_DIR
+    random_weights = args.random_weights or not all(os.path.exists(os.path.join(models_dir, f)) for f in MODEL_FILES)
+    if random_weights:
+        models_dir = os.path.join(workdir, "models")
+        print(f"Using randomly initialised weights in {models_dir}", file=sys.stderr)
+        write_random_weights(models_dir)
+
+    # Must be set before the pipeline is imported; every repeat runs the models
+    os.environ["IMAGE_MODELS_DIR"] = models_dir
+    os.environ["IMAGE_CACHE_ENABLED"] = "0"
+    os.environ["IMAGE_TIMINGS"] = "1"
+    os.environ["IMAGE_MICRO_BATCHING"] = "0"
+
+    import torch
+    from ml.image_model import inference
+    from ml.image_model.image_io import WORKING_MAX_SIDE, ingest_image
+
+    images = make_synthetic_images(os.path.join(workdir, "images"), args.resolutions, max(args.claim_sizes))
+    if not args.no_ingest:
+        # Same as an upload through the API: large photos get their working copy up front
+        for paths in images.values():
+            for path in paths:
+                ingest_image(path)
+    load_start = time.perf_counter()
+    inference.model_instance._load_models()
+    load_ms = (time.perf_counter() - load_start) * 1000
+    if random_weights and args.synthetic_boxes:
+        inference.model_instance.yolo_model = SyntheticBoxes(inference.model_instance.yolo_model, args.synthetic_boxes)
+
+    cases = []
+    try:
+        for threads in args.threads:
+            torch.set_num_threads(threads)
+            for yolo_batch in args.yolo_batch_sizes:
+                for cls_batch in args.classifier_batch_sizes:
+                    inference.Config.YOLO_BATCH_SIZE = yolo_batch
+                    inference.Config.CLASSIFIER_BATCH_SIZE = cls_batch
+                    for resolution, paths in images.items():
+                        for claim_size in args.claim_sizes:
+                            gc.collect()
+                            case = {
+                                "threads": threads,
+                                "yolo_batch_size": yolo_batch,
+                                "classifier_batch_size": cls_batch,
+                                "resolution": f"{resolution[0]}x{resolution[1]}",
+                                "claim_images": claim_size,
+                            }
+                            case.update(run_case(inference.run_image_inference, paths[:claim_size], args.repeats, args.warmup))
+                            print(json.dumps(case), file=sys.stderr)
+                            cases.append(case)
+    finally:
+        if not args.keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "device": inference.DEVICE,
+            "backend": inference.model_instance.backend,
+            "working_max_side": WORKING_MAX_SIDE,
+            "ingested": not args.no_ingest,
+            "random_weights": random_weights,
+            "synthetic_boxes_per_image": args.synthetic_boxes if random_weights else 0,
+        },
+        "settings": {"repeats": args.repeats, "warmup": args.warmup},
+        "model_load_ms": round(load_ms, 1),
+        "cases": cases,
+    }
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
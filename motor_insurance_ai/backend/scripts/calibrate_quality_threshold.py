@@ -0,0 +1,109 @@
+"""
+Converts a blur threshold tuned on full-size photos into IMAGE_BLUR_THRESHOLD
+for the quality gate's decode size (IMAGE_QUALITY_MAX_SIDE).
+
+Laplacian variance grows when an image is downscaled. For every sample photo
+this scores blur at full size and on the gate's decode, labels the photo
+blurry or sharp with the full-size threshold (--full-threshold), and picks the
+decode-size threshold that reproduces those labels best. Each photo is also
+scored after Gaussian blurs of increasing strength (--blur-sigmas), so the
+sample covers both sides of the threshold even when it holds only sharp photos.
+
+Usage:
+    python scripts/calibrate_quality_threshold.py --images path/to/sample_folder [--out report.json]
+"""
+import sys
+import os
+import json
+import argparse
+
+# Add backend directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import cv2
+
+from ml.image_model.image_io import DecodedImage
+from ml.image_model.preprocess import blur_score, BLUR_THRESHOLD
+from ml.image_model.quality import QUALITY_MAX_SIDE
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+def _resize(img, max_side):
+    h, w = img.shape[:2]
+    if max(h, w) <= max_side:
+        return img
+    scale = max_side / max(h, w)
+    return cv2.resize(img, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+
+
+def score_pairs(paths, sigmas, max_side):
+    """(full-size score, small-decode score) for every photo and every blurred variant of it."""
+    pairs = []
+    for path in paths:
+        full = DecodedImage.open(path, max_side=0).bgr
+        for sigma in [0] + sigmas:
+            img = cv2.GaussianBlur(full, (0, 0), sigma) if sigma else full
+            pairs.append((float(blur_score(img)), float(blur_score(_resize(img, max_side)))))
+    return pairs
+
+
+def best_threshold(pairs, full_threshold):
+    """Small-decode threshold that agrees most often with the full-size verdicts."""
+    small_scores = sorted({small for _, small in pairs})
+    candidates = [(a + b) / 2 for a, b in zip(small_scores, small_scores[1:])] or small_scores
+    best, best_agree = None, -1
+    for t in candidates:
+        agree = sum((full < full_threshold) == (small < t) for full, small in pairs)
+        if agree > best_agree:
+            best, best_agree = t, agree
+    return best, best_agree
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", required=True, help="Folder of representative claim photos (full size)")
+    parser.add_argument("--limit", type=int, default=200, help="Max images to read")
+    parser.add_argument("--max-side", type=int, default=QUALITY_MAX_SIDE or 1280,
+                        help="Decode size to calibrate for (default: the gate's)")
+    parser.add_argument("--full-threshold", type=float, default=BLUR_THRESHOLD,
+                        help="Blur threshold tuned on full-size photos")
+    parser.add_argument("--blur-sigmas", default="1,2,3,5,8",
+                        help="Gaussian blurs (pixels at full size) added per photo; empty for none")
+    parser.add_argument("--out", help="Write the JSON report here as well")
+    args = parser.parse_args()
+
+    paths = sorted(
+        os.path.join(args.images, f) for f in os.listdir(args.images)
+        if f.lower().endswith(IMAGE_EXTS)
+    )[:args.limit]
+    if not paths:
+        print(f"No images found in {args.images}")
+        sys.exit(1)
+
+    sigmas = [float(s) for s in args.blur_sigmas.split(",") if s.strip()]
+    pairs = score_pairs(paths, sigmas, args.max_side)
+    blurry = sum(full < args.full_threshold for full, _ in pairs)
+    if blurry in (0, len(pairs)):
+        print("Every sample falls on the same side of the full-size threshold; add blurrier or sharper photos")
+        sys.exit(1)
+
+    threshold, agree = best_threshold(pairs, args.full_threshold)
+    report = {
+        "images": len(paths),
+        "samples": len(pairs),
+        "blurry_at_full_size": blurry,
+        "max_side": args.max_side,
+        "full_threshold": args.full_threshold,
+        "small_threshold": round(threshold, 1),
+        "agreement": round(agree / len(pairs), 3),
+    }
+    print(json.dumps(report, indent=2))
+    print(f"IMAGE_BLUR_THRESHOLD={report['small_threshold']} IMAGE_QUALITY_MAX_SIDE={args.max_side}")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Threshold sweep for the whole-image damage pre-screen (IMAGE_PRESCREEN).
+
+Scores every image of a labeled sample once with the binary classifier, runs
+the full localize + classify pipeline once with the pre-screen off, then
+reports for each candidate threshold how many images would skip localization,
+how many truly damaged images would be skipped, how many per-image verdicts
+would flip versus the full pipeline, and accuracy against the labels.
+
+The sample folder must contain `damaged/` and `undamaged/` subfolders.
+
+Usage:
+    python scripts/prescreen_report.py --images path/to/labeled_sample [--thresholds 0.05,0.1,0.2] [--out report.json]
+"""
+import sys
+import os
+import json
+import time
+import argparse
+
+# Add backend directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from ml.image_model import inference
+from ml.image_model.image_io import DecodedImage
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+LABELS = {"damaged": True, "undamaged": False}
+
+
+def collect_labeled(root, limit):
+    samples = []
+    for folder, damaged in LABELS.items():
+        folder_path = os.path.join(root, folder)
+        if not os.path.isdir(folder_path):
+            continue
+        names = sorted(f for f in os.listdir(folder_path) if f.lower().endswith(IMAGE_EXTS))[:limit]
+        samples.extend((os.path.join(folder_path, f), damaged) for f in names)
+    return samples
+
+
+def sweep(samples, scores, pipeline_damaged, thresholds):
+    rows = []
+    n = len(samples)
+    n_damaged = sum(1 for _, label in samples if label)
+    for threshold in thresholds:
+        skipped = [score < threshold for score in scores]
+        # A skipped image has no findings; everything else keeps its full-pipeline verdict
+        verdicts = [found and not skip for found, skip in zip(pipeline_damaged, skipped)]
+        rows.append({
+            "threshold": threshold,
+            "skipped": sum(skipped),
+            "skip_rate": round(sum(skipped) / n, 4),
+            "damaged_skipped": sum(1 for (_, label), skip in zip(samples, skipped) if label and skip),
+            "damaged_skip_rate": round(
+                sum(1 for (_, label), skip in zip(samples, skipped) if label and skip) / n_damaged, 4
+            ) if n_damaged else None,
+            # Images whose verdict differs from the pipeline without the pre-screen
+            "verdict_flips": sum(1 for found, v in zip(pipeline_damaged, verdicts) if found != v),
+            "accuracy": round(sum(1 for (_, label), v in zip(samples, verdicts) if label == v) / n, 4),
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", required=True, help="Folder with damaged/ and undamaged/ subfolders")
+    parser.add_argument("--thresholds", default="0.02,0.05,0.1,0.15,0.2,0.3,0.4,0.5",
+                        help="Comma-separated P(damaged) thresholds to evaluate")
+    parser.add_argument("--limit", type=int, default=500, help="Max images to read per label")
+    parser.add_argument("--out", help="Write the JSON report here as well")
+    args = parser.parse_args()
+
+    samples = collect_labeled(args.images, args.limit)
+    if not samples:
+        print(f"No labeled images found in {args.images} (expected damaged/ and undamaged/ subfolders)")
+        sys.exit(1)
+    thresholds = sorted(float(t) for t in args.thresholds.split(","))
+
+    model = inference.model_instance
+    model._load_models()
+    paths = [path for path, _ in samples]
+
+    start = time.perf_counter()
+    scores = model.prescreen_scores([DecodedImage.open(p) for p in paths])
+    prescreen_ms = (time.perf_counter() - start) * 1000 / len(paths)
+
+    # Reference run: full pipeline on every image, pre-screen off, bypassing the result cache
+    inference.Config.PRESCREEN_ENABLED = False
+    start = time.perf_counter()
+    results = model._analyze_images(paths)
+    pipeline_ms = (time.perf_counter() - start) * 1000 / len(paths)
+    pipeline_damaged = [bool(r.get("findings")) for r in results]
+
+    report = {
+        "images": len(samples),
+        "damaged": sum(1 for _, label in samples if label),
+        "undamaged": sum(1 for _, label in samples if not label),
+        "backend": model.backend,
+        "latency_ms_per_image": {"prescreen": round(prescreen_ms, 2), "full_pipeline": round(pipeline_ms, 2)},
+        "pipeline_accuracy": round(
+            sum(1 for (_, label), found in zip(samples, pipeline_damaged) if label == found) / len(samples), 4
+        ),
+        "thresholds": sweep(samples, scores, pipeline_damaged, thresholds),
+    }
+
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
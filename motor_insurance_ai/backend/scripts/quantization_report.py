@@ -0,0 +1,114 @@
+"""
+INT8 vs fp32 report for the binary/severity classifiers.
+
+Runs both precisions of the chosen backend on the same crops from a sample
+folder and reports label agreement, confidence deltas and batch latency, so
+IMAGE_CLASSIFIER_QUANTIZE can be decided per deployment. The INT8 models are
+calibrated on --calibration (default: IMAGE_QUANTIZE_CALIBRATION_DIR, else the
+sample folder). Exits with status 2 when INT8 is slower than fp32.
+
+Usage:
+    python scripts/quantization_report.py --images path/to/sample_folder [--backend onnx]
+        [--calibration path/to/calibration_folder] [--out report.json]
+"""
+import sys
+import os
+import json
+import argparse
+
+# Add backend directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import torch
+
+from ml.image_model import inference, onnx_backend, quantization
+from ml.image_model.image_io import DecodedImage
+from ml.image_model.quantization import quantize_torch_classifier, agreement_report, load_calibration_batches
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+def collect_crops(model, paths, whole_image):
+    if whole_image:
+        return [DecodedImage.open(p).to_pil() for p in paths]
+    crops = []
+    for loc in model._localize(paths):
+        crops.extend(loc["image"].crop(bbox) for bbox in loc["boxes"])
+    return crops
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", required=True, help="Folder of sample claim photos")
+    parser.add_argument("--backend", choices=["torch", "onnx"], default="torch")
+    parser.add_argument("--limit", type=int, default=200, help="Max images to read")
+    parser.add_argument("--whole-image", action="store_true",
+                        help="Classify whole images instead of YOLO crops (no localizer needed)")
+    parser.add_argument("--calibration", help="Folder of calibration photos or crops for the INT8 models")
+    parser.add_argument("--repeats", type=int, default=5, help="Timed passes per model (median is reported)")
+    parser.add_argument("--out", help="Write the JSON report here as well")
+    args = parser.parse_args()
+
+    paths = sorted(
+        os.path.join(args.images, f) for f in os.listdir(args.images)
+        if f.lower().endswith(IMAGE_EXTS)
+    )[:args.limit]
+    if not paths:
+        print(f"No images found in {args.images}")
+        sys.exit(1)
+
+    model = inference.model_instance
+    calibration_dir = args.calibration or quantization.CALIBRATION_DIR or args.images
+    if os.path.abspath(calibration_dir) == os.path.abspath(args.images):
+        print("Note: calibrating on the sample folder itself; agreement may be optimistic")
+    calibration = load_calibration_batches(model.transform, calibration_dir)
+    if not calibration:
+        print(f"No calibration images found in {calibration_dir}")
+        sys.exit(1)
+    torch_fp32 = (model._build_classifier(inference.BIN_PATH, 2).cpu(), model._build_classifier(inference.SEV_PATH, 6).cpu())
+
+    if args.backend == "onnx":
+        # Latency is compared against fp32 ONNX Runtime, not PyTorch
+        fp32 = (
+            onnx_backend.load_classifier(inference.BIN_PATH, inference.ONNX_DIR, lambda: torch_fp32[0]),
+            onnx_backend.load_classifier(inference.SEV_PATH, inference.ONNX_DIR, lambda: torch_fp32[1]),
+        )
+        int8 = (
+            onnx_backend.load_classifier(inference.BIN_PATH, inference.ONNX_DIR, lambda: torch_fp32[0],
+                                         int8=True, calibration=lambda: calibration),
+            onnx_backend.load_classifier(inference.SEV_PATH, inference.ONNX_DIR, lambda: torch_fp32[1],
+                                         int8=True, calibration=lambda: calibration),
+        )
+    else:
+        fp32 = torch_fp32
+        int8 = (
+            quantize_torch_classifier(model._build_classifier(inference.BIN_PATH, 2), calibration),
+            quantize_torch_classifier(model._build_classifier(inference.SEV_PATH, 6), calibration),
+        )
+
+    if not args.whole_image:
+        model.yolo_model = inference.YOLO(inference.YOLO_PATH)
+    crops = collect_crops(model, paths, args.whole_image)
+    if not crops:
+        print("No crops to compare (the localizer found no boxes); try --whole-image")
+        sys.exit(1)
+
+    batch = torch.stack([model.transform(c) for c in crops])
+    report = agreement_report(fp32, int8, batch, model.classes, inference.Config.CONFIDENCE_THRESHOLD,
+                              repeats=args.repeats)
+    report.update({"backend": args.backend, "images": len(paths), "source": "whole_image" if args.whole_image else "yolo_crops",
+                   "calibration_batches": len(calibration)})
+
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if not report["int8_faster"]:
+        latency = report["latency_ms"]
+        print(f"INT8 is slower than fp32 on this machine ({latency['int8']} ms vs {latency['fp32']} ms); "
+              "do not enable IMAGE_CLASSIFIER_QUANTIZE")
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
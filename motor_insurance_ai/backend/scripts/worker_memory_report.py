@@ -0,0 +1,145 @@
+"""
+Per-worker memory of the image models under the three loading strategies.
+
+    copy     every worker torch.loads its own private copy (IMAGE_MMAP_WEIGHTS=0)
+    mmap     every worker memory-maps the classifier weights (IMAGE_MMAP_WEIGHTS=1)
+    preload  the parent loads everything (ml.warmup.preload_models) and forks the
+             workers, which inherit the weights copy-on-write (PRELOAD_MODELS=1)
+
+Each mode starts N workers in a fresh parent process. Every worker is measured
+before loading, then after loading plus one warm-up pass. The second measurement
+is taken while all workers are alive, so shared pages are split between them.
+RSS counts shared pages in full for every process. PSS splits them between the
+processes that share them, so sum(PSS) is what the node actually pays.
+
+Usage:
+    python scripts/worker_memory_report.py [--workers 4] [--modes copy,mmap,preload] [--with-encoder] [--out report.json]
+"""
+import sys
+import os
+import json
+import argparse
+import subprocess
+import multiprocessing
+
+# Add backend directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+MODES = ("copy", "mmap", "preload")
+
+
+def memory_mb():
+    """RSS / PSS / shared / private of this process in MB (smaps_rollup, Linux)."""
+    fields = {}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 3 and parts[-1] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    except OSError:
+        return {"error": "/proc/self/smaps_rollup is not available on this platform"}
+    return {
+        "rss": round(fields.get("Rss", 0), 1),
+        "pss": round(fields.get("Pss", 0), 1),
+        "shared": round(fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0), 1),
+        "private": round(fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0), 1),
+    }
+
+
+def _load_models(with_encoder):
+    from ml.warmup import warm_image_models
+    timings = warm_image_models()
+    if with_encoder:
+        from rag import retrieve
+        retrieve.load_model().encode(["warm up"])
+    return timings
+
+
+def _worker(index, with_encoder, loaded, done, results):
+    before = memory_mb()
+    timings = _load_models(with_encoder)
+    loaded.wait()
+    results.put({"worker": index, "pid": os.getpid(), "before": before, "after": memory_mb(), "warmup": timings})
+    # Stay alive until every worker has been measured
+    done.wait()
+
+
+def run_mode(mode, workers, with_encoder):
+    """Runs inside a fresh interpreter (see main) so modes do not influence each other."""
+    os.environ["IMAGE_MMAP_WEIGHTS"] = "0" if mode == "copy" else "1"
+    parent_before = memory_mb()
+    if mode == "preload":
+        from ml import warmup
+        warmup.preload_models() if with_encoder else _preload_image_models()
+        ctx = multiprocessing.get_context("fork")
+    else:
+        ctx = multiprocessing.get_context("spawn")
+    parent_after = memory_mb()
+
+    loaded, done = ctx.Barrier(workers), ctx.Barrier(workers + 1)
+    results = ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(i, with_encoder, loaded, done, results)) for i in range(workers)]
+    for p in procs:
+        p.start()
+    rows = sorted((results.get() for _ in procs), key=lambda r: r["worker"])
+    done.wait()
+    for p in procs:
+        p.join()
+
+    after = [r["after"] for r in rows]
+    return {
+        "mode": mode,
+        "workers": rows,
+        "parent": {"before": parent_before, "after": parent_after},
+        "total_rss_mb": round(sum(a["rss"] for a in after), 1),
+        # What the node really pays for the workers (shared pages counted once)
+        "total_pss_mb": round(sum(a["pss"] for a in after), 1),
+        "mean_private_mb": round(sum(a["private"] for a in after) / len(after), 1),
+    }
+
+
+def _preload_image_models():
+    """preload_models() without the survey pipeline and SentenceTransformer."""
+    import gc
+    from ml.image_model.inference import model_instance
+    model_instance.preload()
+    gc.collect()
+    gc.freeze()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--with-encoder", action="store_true",
+                        help="Also load the SentenceTransformer in every worker (needs the model cached locally)")
+    parser.add_argument("--out", help="Write the JSON report here as well")
+    parser.add_argument("--run-mode", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_mode:
+        print(json.dumps(run_mode(args.run_mode, args.workers, args.with_encoder)))
+        return
+
+    report = {"workers": args.workers, "modes": {}}
+    for mode in args.modes.split(","):
+        cmd = [sys.executable, os.path.abspath(__file__), "--run-mode", mode, "--workers", str(args.workers)]
+        if args.with_encoder:
+            cmd.append("--with-encoder")
+        proc = subprocess.run(cmd, capture_output=True, text=True)
+        if proc.returncode != 0:
+            report["modes"][mode] = {"error": (proc.stderr.strip().splitlines() or ["failed"])[-1]}
+        else:
+            report["modes"][mode] = json.loads(proc.stdout.strip().splitlines()[-1])
+        summary = {k: v for k, v in report["modes"][mode].items() if k.startswith(("total", "mean", "error"))}
+        print(f"{mode:8s} {json.dumps(summary)}", file=sys.stderr)
+
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
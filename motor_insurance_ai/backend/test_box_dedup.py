@@ -0,0 +1,60 @@
+"""
+Box de-duplication (IMAGE_BOX_DEDUP) must only change results when boxes overlap.
+Runs the real localize -> dedup -> classify flow with stubbed models.
+
+    python test_box_dedup.py
+"""
+from ml.image_model import inference
+from ml.image_model.box_filter import deduplicate_boxes
+from ml.image_model.image_io import DecodedImage
+
+import numpy as np
+
+SEPARATE = [(10, 10, 60, 60), (100, 100, 180, 150), (200, 20, 260, 90)]
+OVERLAPPING = [(10, 10, 60, 60), (12, 12, 62, 62), (200, 20, 260, 90)]
+
+
+def _findings(boxes, dedup):
+    # ImageDamageModel is a singleton: the stubs shadow its methods and are removed afterwards
+    model = inference.ImageDamageModel()
+    image = DecodedImage("stub.jpg", np.zeros((300, 300, 3), dtype=np.uint8))
+    previous = inference.Config.BOX_DEDUP
+    model._localize = lambda paths, timer=None: [
+        {"image": image, "boxes": list(boxes), "scores": [0.9, 0.8, 0.7]} for _ in paths
+    ]
+    # One label per crop, derived from the crop size so every region stays distinguishable
+    model._classify_crops = lambda crops, timer=None: [("dent", crop.size[0] / 1000) for crop in crops]
+    inference.Config.BOX_DEDUP = dedup
+    try:
+        return model._analyze_images(["stub.jpg"])
+    finally:
+        inference.Config.BOX_DEDUP = previous
+        del model._localize, model._classify_crops
+
+
+def test_no_overlap_keeps_boxes():
+    kept, removed_small, removed_overlap = deduplicate_boxes(SEPARATE, [0.9, 0.8, 0.7], 0.45)
+    assert kept == SEPARATE and removed_small == removed_overlap == 0
+
+
+def test_no_overlap_results_unchanged():
+    assert _findings(SEPARATE, dedup=True) == _findings(SEPARATE, dedup=False)
+
+
+def test_overlap_collapsed():
+    with_dedup = _findings(OVERLAPPING, dedup=True)[0]
+    assert len(with_dedup["findings"]) == 2 and with_dedup["crops_removed"] == 1
+    assert len(_findings(OVERLAPPING, dedup=False)[0]["findings"]) == 3
+
+
+def test_stubs_restored():
+    _findings(SEPARATE, dedup=False)
+    model = inference.ImageDamageModel()
+    assert "_localize" not in vars(model) and "_classify_crops" not in vars(model)
+
+
+if __name__ == "__main__":
+    for test in (test_no_overlap_keeps_boxes, test_no_overlap_results_unchanged, test_overlap_collapsed,
+                 test_stubs_restored):
+        test()
+        print(f"{test.__name__}: ok")